@@ -12,15 +12,11 @@ and includes a settings configuration for easy customization of input and output
 Usage:
 - Set the 'input_file_path' and 'output_file_path' in the configuration dictionary.
 - Run the script to classify the links and save them to the specified output file.
+- Classification is vectorized (dataset_pipeline.classify_links); dataset_pipeline.py runs this step together with 02-05.
 """
 
 import pandas as pd
-
-def classify_link(row):
-    if 'APIReference' in row['LINK'] or 'API' in row['DESC']:
-        return 'API'
-    else:
-        return 'text-based'
+from dataset_pipeline import classify_links
 
 def classify_vpc_links(file_path, output_path):
     try:
@@ -35,7 +31,7 @@ def classify_vpc_links(file_path, output_path):
 
     # Apply classification
     try:
-        links_df['Type'] = links_df.apply(classify_link, axis=1)
+        links_df = classify_links(links_df)
 
         # Save the updated dataset
         links_df.to_csv(output_path, index=False)
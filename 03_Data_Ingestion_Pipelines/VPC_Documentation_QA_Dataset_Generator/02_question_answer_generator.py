@@ -8,8 +8,11 @@ OpenAIInterface class for interacting with the OpenAI API.
 
 Key Components:
 - WebScraper: Fetches and cleans webpage content.
-- DataProcessor: Processes a list of URLs and uses the WebScraper to retrieve content.
+- DataProcessor: Processes a list of URLs and uses the WebScraper to retrieve content. Scraped pages are kept in a
+  SQLite-backed ContentCache (see content_cache.py), written page by page so interrupted runs resume where they stopped.
 - OpenAIInterface: Generates question-answer pairs based on the content using the OpenAI API.
+- QAGenerationEngine (qa_generation_engine.py): Runs the OpenAI calls concurrently under request/token rate limits,
+  retries transient failures and records finished URLs in a JSONL ledger so reruns skip them.
 
 Usage:
 - Ensure necessary libraries are installed and .env file with API keys is correctly set up.
@@ -25,20 +28,33 @@ import openai
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
-import json
 import os
 from dotenv import load_dotenv
+from content_cache import ContentCache
+from qa_generation_engine import QAGenerationEngine, RateLimiter
 
 class WebScraper:
-    def __init__(self):
-        self.cache = {}
-
-    def fetch_and_clean_webpage(self, url):
-        if url in self.cache:
-            return self.cache[url]
+    def __init__(self, cache=None):
+        # Any mapping-like store with get/put works; DataProcessor attaches a persistent ContentCache.
+        self.cache = cache
+
+    def fetch_and_clean_webpage(self, url, revalidate=False):
+        entry = self.cache.get_entry(url) if self.cache is not None else None
+        if entry and not revalidate:
+            return entry['content']
+
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
 
         try:
-            response = requests.get(url)
+            response = requests.get(url, headers=headers)
+            if response.status_code == 304 and entry:
+                self.cache.touch(url)
+                return entry['content']
             if response.status_code != 200:
                 return "Failed to retrieve the webpage"
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -46,44 +62,59 @@ class WebScraper:
             for script in main_content(["script", "style"]):
                 script.decompose()
             cleaned_text = main_content.get_text(separator='\n', strip=True)
-            self.cache[url] = cleaned_text
+            if self.cache is not None:
+                self.cache.put(url, cleaned_text,
+                               etag=response.headers.get('ETag'),
+                               last_modified=response.headers.get('Last-Modified'))
             return cleaned_text
         except Exception as e:
             return f"Error fetching page: {e}"
 
 class DataProcessor:
-    def __init__(self, scraper, cache_filename='06_Data/Capstone_Data/documentation_qa_datasets/content_cache.json'):
+    def __init__(self, scraper,
+                 cache_filename='06_Data/Capstone_Data/documentation_qa_datasets/content_cache.sqlite3',
+                 legacy_cache_filename='06_Data/Capstone_Data/documentation_qa_datasets/content_cache.json',
+                 codec='zlib'):
         self.scraper = scraper
         self.cache_filename = cache_filename
+        self.legacy_cache_filename = legacy_cache_filename
+        self.codec = codec
+
+    def iter_links(self, csv_file, limit=None, revalidate=False):
+        """Yield (link, content) pairs one page at a time; each page is persisted as soon as it is fetched."""
+        return self.iter_link_frame(pd.read_csv(csv_file), limit=limit, revalidate=revalidate)
 
-    def process_links(self, csv_file, limit=None):
-        links_df = pd.read_csv(csv_file)
+    def iter_link_frame(self, links_df, limit=None, revalidate=False):
+        """Same as iter_links, for a links DataFrame that is already in memory."""
         text_links = links_df[links_df['Type'] == 'text-based']['LINK']
 
         self._load_cache()
-        results = {}
         for i, link in enumerate(text_links):
             if limit and i >= limit:
                 break
-            content = self.scraper.fetch_and_clean_webpage(link)
-            results[link] = content
+            content = self.scraper.fetch_and_clean_webpage(link, revalidate=revalidate)
             print(f"Processed {i+1}/{len(text_links)}: {link}")
+            yield link, content
 
-        self._save_cache()
-        return results
+    def process_links(self, csv_file, limit=None, revalidate=False):
+        return dict(self.iter_links(csv_file, limit=limit, revalidate=revalidate))
 
     def _load_cache(self):
-        if os.path.exists(self.cache_filename):
-            with open(self.cache_filename, 'r') as file:
-                self.scraper.cache = json.load(file)
-
-    def _save_cache(self):
-        with open(self.cache_filename, 'w') as file:
-            json.dump(self.scraper.cache, file)
+        if isinstance(self.scraper.cache, ContentCache):
+            return
+        self.scraper.cache = ContentCache(self.cache_filename, codec=self.codec)
+        # One-off migration of the old whole-file JSON cache
+        if len(self.scraper.cache) == 0 and os.path.exists(self.legacy_cache_filename):
+            imported = self.scraper.cache.import_json(self.legacy_cache_filename)
+            print(f"Imported {imported} pages from {self.legacy_cache_filename}")
 
 class OpenAIInterface:
-    def __init__(self, api_key):
+    def __init__(self, api_key, model="gpt-4-1106-preview", api_base=None):
         openai.api_key = api_key
+        if api_base:
+            # e.g. a local fake chat-completion server for offline runs
+            openai.api_base = api_base
+        self.model = model
 
     @staticmethod
     def create_qa_prompt(content):
@@ -102,14 +133,18 @@ class OpenAIInterface:
         """
         return instructions
 
+    def request_qa_response(self, prompt):
+        """Call the chat completion API and return the response text; API errors are raised to the caller."""
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[{"role": "system", "content": "Do EXACTLY as the instructions in the prompt say."},
+                      {"role": "user", "content": prompt}]
+        )
+        return response['choices'][0]['message']['content']
+
     def get_qa_response(self, prompt):
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4-1106-preview",
-                messages=[{"role": "system", "content": "Do EXACTLY as the instructions in the prompt say."},
-                          {"role": "user", "content": prompt}]
-            )
-            return response['choices'][0]['message']['content']
+            return self.request_qa_response(prompt)
         except Exception as e:
             print(f"Error in getting response: {e}")
             return None
@@ -123,7 +158,11 @@ if __name__ == "__main__":
         "max_tokens": 1000,
         "test_mode": False,  # Set to False for full run
         "test_output_file": "06_Data/Capstone_Data/documentation_qa_datasets/Test_Set_QA_Pairs_Test.txt", # Documentation_QA_Pairs_Test <- Original pipeline dataset, replaced temp. to create the test dataset
-        "test_limit": 5  # Number of links to process in test mode
+        "test_limit": 5,  # Number of links to process in test mode
+        "max_workers": 8,  # Concurrent chat completion requests
+        "requests_per_minute": 500,  # Keep both limits at or below the account's OpenAI quota
+        "tokens_per_minute": 300000,
+        "max_retries": 5  # Attempts per URL for rate-limit / timeout / 5xx errors
     }
 
     # Load API key and create instances
@@ -131,22 +170,20 @@ if __name__ == "__main__":
     openai_key = os.getenv("OPENAI_KEY")
     scraper = WebScraper()
     processor = DataProcessor(scraper)
-    openai_interface = OpenAIInterface(openai_key)
-
-    # Process links and get QA pairs
+    openai_interface = OpenAIInterface(openai_key, api_base=os.getenv("OPENAI_API_BASE"))
+    rate_limiter = RateLimiter(config['requests_per_minute'], config['tokens_per_minute'])
+    engine = QAGenerationEngine(openai_interface, rate_limiter,
+                                max_workers=config['max_workers'],
+                                max_retries=config['max_retries'],
+                                completion_tokens=config['max_tokens'])
+
+    # Process links and get QA pairs; URLs already recorded in the JSONL ledger are skipped
     limit = config['test_limit'] if config['test_mode'] else None
-    processed_contents = processor.process_links(config['input_file_path'], limit=limit)
     output_file = config['test_output_file'] if config['test_mode'] else config['output_file_path']
+    jsonl_file = os.path.splitext(output_file)[0] + ".jsonl"
 
-    for url, content in processed_contents.items():
-        prompt = OpenAIInterface.create_qa_prompt(content)
-        qa_response = openai_interface.get_qa_response(prompt)
-
-        with open(output_file, "a") as file:
-            file.write(f"URL: {url}\nQ&A:\n{qa_response}\n\n")
-        print(f"Processed URL: {url}")
-
-    print(f"Output saved to {output_file}")
-
-
+    pages = processor.iter_links(config['input_file_path'], limit=limit)
+    summary = engine.run(pages, jsonl_file, text_output_path=output_file)
 
+    print(f"Generated {summary['ok']}, failed {summary['failed']}, skipped {summary['skipped']} (already done)")
+    print(f"Output saved to {output_file} and {jsonl_file}")
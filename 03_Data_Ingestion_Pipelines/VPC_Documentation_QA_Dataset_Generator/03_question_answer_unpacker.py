@@ -3,7 +3,8 @@ QA Pair Parser
 
 This script parses a text file containing URL, questions, and answers into a DataFrame. 
 It processes lines starting with 'URL:', 'QUESTION:', and 'ANSWER:', extracting relevant information. 
-Lines with 'NOT ENOUGH INFORMATION' are also handled. The resulting DataFrame consists of columns for URL, 
+Lines with 'NOT ENOUGH INFORMATION' are also handled, and answers spanning several lines are kept whole (the file is
+streamed by dataset_pipeline.iter_qa_records). The resulting DataFrame consists of columns for URL, 
 Question, and Answer. The script is designed to handle errors gracefully and includes a configuration 
 dictionary for easy adjustment of file paths and encoding settings.
 
@@ -13,11 +14,11 @@ Usage:
 """
 
 import pandas as pd
+from dataset_pipeline import parse_qa_file
 
 def parse_text_to_df_revised(file_path, encoding):
     try:
-        with open(file_path, 'r', encoding=encoding) as file:
-            lines = file.readlines()
+        return parse_qa_file(file_path, encoding)
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
         return pd.DataFrame(columns=['URL', 'Question', 'Answer'])
@@ -25,27 +26,6 @@ def parse_text_to_df_revised(file_path, encoding):
         print(f"Error reading file '{file_path}': {e}")
         return pd.DataFrame(columns=['URL', 'Question', 'Answer'])
 
-    data = []
-    current_url = ''
-
-    for line in lines:
-        line = line.strip()
-        if line.startswith('URL:'):
-            current_url = line.split('URL:')[1].strip()
-        elif line.startswith('QUESTION:'):
-            question = line.split('QUESTION:')[1].strip()
-            answer = ''
-            no_info_flag = False
-        elif line.startswith('ANSWER:'):
-            answer = line.split('ANSWER:')[1].strip()
-            data.append([current_url, question, answer])
-        elif line == 'NOT ENOUGH INFORMATION':
-            no_info_flag = True
-            data.append([current_url, '', 'NOT ENOUGH INFORMATION'])
-
-    df = pd.DataFrame(data, columns=['URL', 'Question', 'Answer'])
-    return df
-
 # Main Execution
 if __name__ == "__main__":
     # Configuration Dictionary
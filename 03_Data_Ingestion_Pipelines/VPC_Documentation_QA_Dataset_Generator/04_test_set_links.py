@@ -12,6 +12,7 @@ Usage:
 """
 
 import pandas as pd
+from dataset_pipeline import select_insufficient_links
 
 def filter_insufficient_data(file_path, output_path):
     try:
@@ -25,17 +26,8 @@ def filter_insufficient_data(file_path, output_path):
         return
 
     try:
-        # Filtering rows with missing or insufficient information
-        filtered_data = data[(data['Question'].isna()) | (data['Answer'] == 'NOT ENOUGH INFORMATION')]
-
-        # Extracting only the 'URL' column and creating a copy
-        urls_to_output = filtered_data[['URL']].copy()
-
-        # Renaming 'URL' column to 'LINK'
-        urls_to_output.rename(columns={'URL': 'LINK'}, inplace=True)
-
-        # Adding a 'Type' column with all values set to 'text-based'
-        urls_to_output['Type'] = 'text-based'
+        # Rows with a missing question or 'NOT ENOUGH INFORMATION', as LINK / Type ('text-based')
+        urls_to_output = select_insufficient_links(data)
 
         # Saving the URLs with the 'Type' column to a CSV file
         urls_to_output.to_csv(output_path, index=False)
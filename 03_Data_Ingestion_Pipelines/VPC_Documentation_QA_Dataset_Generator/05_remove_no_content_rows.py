@@ -11,17 +11,22 @@ Input:
 
 Output:
 - A new CSV file containing filtered question-answer pairs, saved to 'output_file_path'.
+
+The filter itself lives in dataset_pipeline.remove_no_content_rows, which dataset_pipeline.py also runs in-process.
 """
 
 import pandas as pd
+from dataset_pipeline import remove_no_content_rows
 
-# Load the provided CSV file
-file_path = '06_Data/Capstone_Data/documentation_qa_datasets/Final_TEST_Question_Answer_Pairs.csv'
-df = pd.read_csv(file_path)
+# Main Execution
+if __name__ == "__main__":
+    # Load the provided CSV file
+    file_path = '06_Data/Capstone_Data/documentation_qa_datasets/Final_TEST_Question_Answer_Pairs.csv'
+    df = pd.read_csv(file_path)
 
-# Filter out rows where any column contains 'NOT ENOUGH CONTENT'
-filtered_df = df[df["Answer"] != "NOT ENOUGH INFORMATION"]
+    # Filter out rows where any column contains 'NOT ENOUGH CONTENT'
+    filtered_df = remove_no_content_rows(df)
 
-# Save the filtered DataFrame to a new CSV file
-output_file_path = '06_Data/Capstone_Data/documentation_qa_datasets/Final_FILTERED_TEST_Question_Answer_Pairs.csv'
-filtered_df.to_csv(output_file_path, index=False)
+    # Save the filtered DataFrame to a new CSV file
+    output_file_path = '06_Data/Capstone_Data/documentation_qa_datasets/Final_FILTERED_TEST_Question_Answer_Pairs.csv'
+    filtered_df.to_csv(output_file_path, index=False)
@@ -0,0 +1,366 @@
+"""
+Incremental Dataset Build Runner
+
+This script rebuilds the documentation QA dataset as a small DAG of stages and only redoes work whose inputs
+changed. Every stage is fingerprinted from its code version, its parameters and the content hash of its inputs;
+outputs are cached as Parquet files keyed by that fingerprint, so an unchanged stage is loaded instead of run.
+
+Stages:
+- classify: VPC_Documentation_Links.csv -> links labelled 'API' / 'text-based'.
+- scrape: fetches text-based pages into the ContentCache. Only uncached pages are fetched; with --refresh every
+  page is re-checked with a conditional request (ETag / Last-Modified) and only changed pages are downloaded.
+  Output: URL + content hash per page.
+- generate: one GPT-4 call per page whose (content hash, model, prompt) key has never been answered before.
+  Responses are stored by that key, so pages with unchanged (or identical) content are never sent again.
+- unpack: URL / Question / Answer rows parsed from the responses.
+- filter: rows without 'NOT ENOUGH INFORMATION'.
+
+A nightly run with --refresh therefore costs a conditional GET per page plus one GPT-4 call per page that
+actually changed upstream. --dry-run prints what would rebuild without fetching or calling anything.
+
+A stage that could not finish every row (a failed fetch, a page without a response) reports the count in
+df.attrs["incomplete"]. The count is recorded in the index and such an entry is never treated as up to date, so the
+missing rows are retried on the next run even though the stage's inputs did not change.
+
+Usage:
+- python 03_Data_Ingestion_Pipelines/VPC_Documentation_QA_Dataset_Generator/build_runner.py [--dry-run] [--refresh]
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+from content_cache import ContentCache
+from dataset_pipeline import classify_links, iter_qa_records, load_generator_script, remove_no_content_rows
+
+DATA_DIR = "06_Data/Capstone_Data/documentation_qa_datasets"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def frame_hash(df):
+    """Content hash of a DataFrame (column names + values, ignoring the index)."""
+    digest = hashlib.sha256(json.dumps(list(df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    One node of the build graph.
+
+    func(context, inputs) returns the stage's output DataFrame, where inputs maps each dependency name to its
+    output; it sets df.attrs["incomplete"] to the number of rows it had to leave out. plan(context, inputs)
+    describes the row-level work a run would do; inputs is None when an upstream stage would itself rebuild during
+    a dry run.
+    """
+
+    def __init__(self, name, func, deps=(), params=None, sources=(), version=1, plan=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.sources = tuple(sources)
+        self.version = version
+        self.plan = plan
+
+    def fingerprint(self, dep_hashes):
+        payload = {
+            "stage": self.name,
+            "version": self.version,
+            "params": self.params,
+            "deps": dep_hashes,
+            "sources": {path: file_hash(path) for path in self.sources},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class BuildRunner:
+    def __init__(self, stages, cache_dir, context=None):
+        self.stages = stages
+        self.cache_dir = cache_dir
+        self.context = context
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def _cached(self, stage, fingerprint):
+        entry = self.index.get(stage.name, {}).get(fingerprint)
+        if entry and not entry.get("incomplete") and os.path.exists(os.path.join(self.cache_dir, entry["path"])):
+            return entry
+        return None
+
+    def run(self, dry_run=False, force=()):
+        """Run (or with dry_run, plan) every stage in order. Returns {stage name: output DataFrame or None}."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        outputs, output_hashes = {}, {}
+
+        for stage in self.stages:
+            if any(output_hashes.get(dep) is None for dep in stage.deps):
+                # Only reachable in a dry run: an upstream stage would rebuild, so its output is unknown
+                outputs[stage.name] = output_hashes[stage.name] = None
+                plan = stage.plan(self.context, None) if stage.plan else ""
+                print(f"[{stage.name}] would rebuild (upstream changed) {plan}".rstrip())
+                continue
+
+            fingerprint = stage.fingerprint({dep: output_hashes[dep] for dep in stage.deps})
+            entry = None if stage.name in force else self._cached(stage, fingerprint)
+            inputs = {dep: outputs[dep] for dep in stage.deps}
+
+            if entry:
+                outputs[stage.name] = pd.read_parquet(os.path.join(self.cache_dir, entry["path"]))
+                output_hashes[stage.name] = entry["output_hash"]
+                print(f"[{stage.name}] up to date ({fingerprint[:12]})")
+                continue
+
+            if dry_run:
+                outputs[stage.name] = output_hashes[stage.name] = None
+                plan = stage.plan(self.context, inputs) if stage.plan else ""
+                print(f"[{stage.name}] would rebuild {plan}".rstrip())
+                continue
+
+            start = time.perf_counter()
+            df = stage.func(self.context, inputs)
+            incomplete = int(df.attrs.get("incomplete", 0))
+            df = df.reset_index(drop=True)
+            path = f"{stage.name}-{fingerprint[:16]}.parquet"
+            df.to_parquet(os.path.join(self.cache_dir, path), index=False)
+            outputs[stage.name] = df
+            output_hashes[stage.name] = frame_hash(df)
+            self.index.setdefault(stage.name, {})[fingerprint] = {
+                "path": path,
+                "output_hash": output_hashes[stage.name],
+                "rows": len(df),
+                "incomplete": incomplete,
+                "built_at": time.time(),
+            }
+            self._save_index()
+            note = f" ({incomplete} incomplete, rebuilt on the next run)" if incomplete else ""
+            print(f"[{stage.name}] rebuilt {len(df)} rows in {time.perf_counter() - start:.2f}s{note}")
+
+        return outputs
+
+
+class BuildContext:
+    """Shared state for the row-level stages: page cache, response store and generation settings."""
+
+    def __init__(self, config):
+        self.config = config
+        self.content_cache = ContentCache(config["content_cache"])
+        self.responses_path = os.path.join(config["cache_dir"], "qa_responses.jsonl")
+        self._generator = None
+        self._responses = None
+
+    @property
+    def generator(self):
+        if self._generator is None:
+            self._generator = load_generator_script()
+        return self._generator
+
+    @functools.cached_property
+    def prompt_hash(self):
+        # Any edit to the QA prompt template invalidates every stored response
+        template = self.generator.OpenAIInterface.create_qa_prompt("")
+        return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+    def response_key(self, content_hash):
+        payload = f"{self.config['model']}|{self.prompt_hash}|{content_hash}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def responses(self):
+        """Stored responses, response key -> QA text, loaded on first use."""
+        if self._responses is None:
+            self._responses = {}
+            if os.path.exists(self.responses_path):
+                with open(self.responses_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        self._responses[record["key"]] = record["qa_response"]
+        return self._responses
+
+    def store_responses(self, records):
+        with open(self.responses_path, "a", encoding="utf-8") as f:
+            for key, qa_response in records:
+                f.write(json.dumps({"key": key, "qa_response": qa_response}) + "\n")
+                self.responses[key] = qa_response
+
+
+# Stage implementations
+
+def run_classify(context, inputs):
+    return classify_links(pd.read_csv(context.config["links_csv"]))
+
+
+def plan_classify(context, inputs):
+    return f"from {context.config['links_csv']}"
+
+
+def _text_links(links_df):
+    return links_df[links_df['Type'] == 'text-based'][['LINK']]
+
+
+def run_scrape(context, inputs):
+    config = context.config
+    generator = context.generator
+    processor = generator.DataProcessor(generator.WebScraper(context.content_cache))
+    rows, failed = [], 0
+    for url, _ in processor.iter_link_frame(inputs["classify"], revalidate=config["refresh"]):
+        digest = context.content_cache.get_hash(url)
+        if digest is None:
+            failed += 1  # the fetch failed and nothing was cached; retried on the next run
+            continue
+        rows.append((url, digest))
+    if failed:
+        print(f"[scrape] {failed} pages could not be fetched")
+    df = pd.DataFrame(rows, columns=["URL", "content_hash"])
+    df.attrs["incomplete"] = failed
+    return df
+
+
+def plan_scrape(context, inputs):
+    if inputs is None:
+        return ""
+    links = _text_links(inputs["classify"])["LINK"]
+    missing = sum(url not in context.content_cache for url in links)
+    revalidated = len(links) - missing if context.config["refresh"] else 0
+    return f"({missing} pages to fetch, {revalidated} to revalidate)"
+
+
+def run_generate(context, inputs):
+    config = context.config
+    pages = inputs["scrape"].copy()
+    pages["key"] = [context.response_key(digest) for digest in pages["content_hash"]]
+
+    todo = pages[~pages["key"].isin(list(context.responses))].drop_duplicates("key")
+    print(f"[generate] {len(todo)} of {len(pages)} pages need a new QA response")
+    if len(todo):
+        from dotenv import load_dotenv
+        from qa_generation_engine import QAGenerationEngine, RateLimiter
+
+        load_dotenv()
+        openai_interface = context.generator.OpenAIInterface(
+            os.getenv("OPENAI_KEY"), model=config["model"], api_base=os.getenv("OPENAI_API_BASE"))
+        engine = QAGenerationEngine(openai_interface,
+                                    RateLimiter(config["requests_per_minute"], config["tokens_per_minute"]),
+                                    max_workers=config["max_workers"])
+        # The engine's ledger skips finished URLs, so it is scoped to this exact set of pending keys: an interrupted
+        # run resumes from it, while a later change to a page gets a fresh ledger
+        todo_hash = hashlib.sha256("".join(sorted(todo["key"])).encode("utf-8")).hexdigest()
+        ledger_path = os.path.join(config["cache_dir"], f"generate-{todo_hash[:16]}.jsonl")
+        todo_pages = ((url, context.content_cache.get(url)) for url in todo["URL"])
+        engine.run(todo_pages, ledger_path)
+
+        key_by_url = dict(zip(todo["URL"], todo["key"]))
+        records = []
+        with open(ledger_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a line torn by an interrupted write; that page is simply generated again
+        context.store_responses(
+            (key_by_url[record["url"]], record["qa_response"]) for record in records
+            if record["status"] == "ok" and record["url"] in key_by_url
+            and context.response_key(record["content_hash"]) == key_by_url[record["url"]]
+        )
+
+    pages["qa_response"] = pages["key"].map(context.responses)
+    missing = pages["qa_response"].isna().sum()
+    if missing:
+        print(f"[generate] {missing} pages still have no response; they are retried on the next run")
+    df = pages[pages["qa_response"].notna()][["URL", "content_hash", "qa_response"]]
+    df.attrs["incomplete"] = int(missing)
+    return df
+
+
+def plan_generate(context, inputs):
+    if inputs is None:
+        # Upstream pages may change; estimate from what is cached now
+        links = _text_links(run_classify(context, None))["LINK"]
+        hashes = [context.content_cache.get_hash(url) for url in links]
+        todo = {h for h in hashes if h is None or context.response_key(h) not in context.responses}
+        return f"(at least {len(todo)} GPT-4 calls; more if pages change)"
+    keys = {context.response_key(digest) for digest in inputs["scrape"]["content_hash"]}
+    return f"({len(keys - context.responses.keys())} GPT-4 calls)"
+
+
+def run_unpack(context, inputs):
+    records = []
+    for url, qa_response in zip(inputs["generate"]["URL"], inputs["generate"]["qa_response"]):
+        records.extend(iter_qa_records(f"URL: {url}\nQ&A:\n{qa_response}".splitlines()))
+    return pd.DataFrame(records, columns=["URL", "Question", "Answer"])
+
+
+def run_filter(context, inputs):
+    return remove_no_content_rows(inputs["unpack"])
+
+
+def build_stages(config):
+    params = {"refresh": time.strftime("%Y-%m-%dT%H:%M:%S")} if config["refresh"] else {}
+    return [
+        Stage("classify", run_classify, sources=[config["links_csv"]], plan=plan_classify),
+        Stage("scrape", run_scrape, deps=["classify"], params=params, plan=plan_scrape),
+        Stage("generate", run_generate, deps=["scrape"], params={"model": config["model"]}, plan=plan_generate),
+        Stage("unpack", run_unpack, deps=["generate"]),
+        Stage("filter", run_filter, deps=["unpack"]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally rebuild the documentation QA dataset.")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would rebuild and exit")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-check every cached page upstream (conditional requests) before generating")
+    parser.add_argument("--force", nargs="*", default=[], help="Stage names to rebuild regardless of the cache")
+    parser.add_argument("--cache-dir", default=os.path.join(DATA_DIR, "build_cache"))
+    args = parser.parse_args()
+
+    config = {
+        "cache_dir": args.cache_dir,
+        "refresh": args.refresh,
+        "links_csv": os.path.join(DATA_DIR, "VPC_Documentation_Links.csv"),
+        "content_cache": os.path.join(DATA_DIR, "content_cache.sqlite3"),
+        "qa_csv": os.path.join(DATA_DIR, "Final_Question_Answer_Pairs.csv"),
+        "filtered_qa_csv": os.path.join(DATA_DIR, "Final_FILTERED_Question_Answer_Pairs.csv"),
+        "model": "gpt-4-1106-preview",
+        "max_workers": 8,
+        "requests_per_minute": 500,
+        "tokens_per_minute": 300000,
+    }
+    os.makedirs(config["cache_dir"], exist_ok=True)
+
+    context = BuildContext(config)
+    runner = BuildRunner(build_stages(config), config["cache_dir"], context)
+    outputs = runner.run(dry_run=args.dry_run, force=args.force)
+
+    if not args.dry_run:
+        outputs["unpack"].to_csv(config["qa_csv"], index=False)
+        outputs["filter"].to_csv(config["filtered_qa_csv"], index=False)
+        print(f"Saved {config['qa_csv']} and {config['filtered_qa_csv']}")
+
+
+if __name__ == "__main__":
+    main()
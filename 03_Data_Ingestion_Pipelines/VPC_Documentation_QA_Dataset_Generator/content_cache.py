@@ -0,0 +1,171 @@
+"""
+Content Cache
+
+This module provides a persistent key-value store for scraped webpage content. It replaces the single
+'content_cache.json' file, which had to be read into memory in full and was only written once at the end
+of a run. Entries live in an embedded SQLite database running in WAL mode and are keyed by URL.
+
+Each entry stores:
+- the cleaned page text (optionally compressed with one of the CODECS below)
+- a SHA-256 hash of the text, so later stages can tell whether a page actually changed
+- the time the page was fetched
+- the HTTP validators (ETag / Last-Modified) returned by the server, for conditional re-fetching
+
+Pages are written as soon as they are fetched and read back only when asked for, so memory stays flat as the
+link list grows and an interrupted run resumes from wherever it stopped.
+
+Usage:
+- cache = ContentCache('06_Data/Capstone_Data/documentation_qa_datasets/content_cache.sqlite3')
+- cache.put(url, text, etag=..., last_modified=...)
+- cache.get(url) returns the text, or None if the URL has not been fetched yet.
+- cache.import_json(path) migrates an existing 'content_cache.json' into the store.
+"""
+
+import hashlib
+import json
+import lzma
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Compression codecs: name -> (compress, decompress). The codec is stored with every row, so switching
+# codecs never invalidates entries written under a previous setting.
+CODECS = {
+    "none": (lambda data: data, lambda data: data),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    codec TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+)
+"""
+
+
+def content_hash(content):
+    """Return the SHA-256 hex digest of a page's text."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ContentCache:
+    def __init__(self, db_path, codec="zlib"):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}'. Choose one of: {', '.join(CODECS)}")
+        self.db_path = db_path
+        self.codec = codec
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def get(self, url):
+        """Return the cached text for a URL, or None if it is not cached."""
+        entry = self.get_entry(url)
+        return entry["content"] if entry else None
+
+    def get_entry(self, url):
+        """Return the full cache entry for a URL as a dict, or None if it is not cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, codec, content_hash, fetched_at, etag, last_modified FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        content, codec, digest, fetched_at, etag, last_modified = row
+        decompress = CODECS[codec][1]
+        return {
+            "url": url,
+            "content": decompress(content).decode("utf-8"),
+            "content_hash": digest,
+            "fetched_at": fetched_at,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+
+    def get_hash(self, url):
+        """Return the content hash for a URL without decompressing its text."""
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, url, content, etag=None, last_modified=None, fetched_at=None):
+        """Store (or replace) a page and commit immediately."""
+        compress = CODECS[self.codec][0]
+        record = (
+            url,
+            compress(content.encode("utf-8")),
+            self.codec,
+            content_hash(content),
+            fetched_at if fetched_at is not None else time.time(),
+            etag,
+            last_modified,
+        )
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", record)
+            self._conn.commit()
+
+    def touch(self, url, fetched_at=None):
+        """Mark a cached page as freshly validated (e.g. after an HTTP 304) without rewriting its text."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET fetched_at = ? WHERE url = ?",
+                (fetched_at if fetched_at is not None else time.time(), url),
+            )
+            self._conn.commit()
+
+    def urls(self):
+        """Iterate over the cached URLs."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM pages ORDER BY url").fetchall()
+        for (url,) in rows:
+            yield url
+
+    def import_json(self, json_path):
+        """Migrate a legacy 'content_cache.json' file (URL -> text) into the store. Returns the entry count."""
+        with open(json_path, "r") as file:
+            legacy = json.load(file)
+        fetched_at = os.path.getmtime(json_path)
+        compress = CODECS[self.codec][0]
+        records = [
+            (url, compress(text.encode("utf-8")), self.codec, content_hash(text), fetched_at, None, None)
+            for url, text in legacy.items()
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+            self._conn.commit()
+        return len(records)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __contains__(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,208 @@
+"""
+QA Dataset Pipeline
+
+This script chains steps 01-05 of the QA dataset generator in a single process. DataFrames are handed from one
+stage to the next in memory, every stage's output is checkpointed as a Parquet (Arrow) file in the work
+directory, and the CSV files the rest of the project reads are exported once at the end.
+
+Stages (same order as the README: 01 -> 02 -> 03 -> 04 -> 02 -> 03 -> 05):
+- classify: vectorized replacement for '01_link_classifier.py'.
+- generate: scrape pages and generate QA pairs ('02_question_answer_generator.py'), or reuse existing output.
+- parse: streaming parser for the 'URL: / QUESTION: / ANSWER:' text format ('03_question_answer_unpacker.py').
+  Answers that span several lines are kept whole instead of being cut at the first line break.
+- insufficient: links whose page produced no QA pair ('04_test_set_links.py').
+- remove_no_content: drops 'NOT ENOUGH INFORMATION' rows ('05_remove_no_content_rows.py').
+
+The numbered scripts keep working as before; they are now thin wrappers around the functions below.
+
+Usage:
+- python 03_Data_Ingestion_Pipelines/VPC_Documentation_QA_Dataset_Generator/dataset_pipeline.py
+- Add --generate to call the scraper and OpenAI for both passes instead of reusing the existing QA text files.
+"""
+
+import argparse
+import importlib.util
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = "06_Data/Capstone_Data/documentation_qa_datasets"
+NOT_ENOUGH_INFORMATION = "NOT ENOUGH INFORMATION"
+QA_COLUMNS = ['URL', 'Question', 'Answer']
+
+
+def classify_links(links_df):
+    """Label every link 'API' (LINK contains 'APIReference' or DESC contains 'API') or 'text-based', vectorized."""
+    is_api = (links_df['LINK'].str.contains('APIReference', regex=False, na=False)
+              | links_df['DESC'].str.contains('API', regex=False, na=False))
+    classified = links_df.copy()
+    classified['Type'] = np.where(is_api, 'API', 'text-based')
+    return classified
+
+
+def iter_qa_records(lines):
+    """
+    Stream (url, question, answer) tuples from the lines of a QA text file.
+
+    An answer runs from its 'ANSWER:' line up to the next 'URL:', 'QUESTION:' or 'NOT ENOUGH INFORMATION' line,
+    so multi-line answers are kept; blank lines inside an answer are preserved, trailing ones are dropped.
+    """
+    url = ''
+    question = ''
+    answer_lines = None
+
+    def finish_answer():
+        while answer_lines and not answer_lines[-1]:
+            answer_lines.pop()
+        return url, question, '\n'.join(answer_lines)
+
+    for raw_line in lines:
+        line = raw_line.strip()
+        is_marker = (line.startswith('URL:') or line.startswith('QUESTION:') or line.startswith('ANSWER:')
+                     or line == NOT_ENOUGH_INFORMATION)
+        if answer_lines is not None:
+            if not is_marker:
+                answer_lines.append(line)
+                continue
+            yield finish_answer()
+            answer_lines = None
+
+        if line.startswith('URL:'):
+            url = line.split('URL:')[1].strip()
+        elif line.startswith('QUESTION:'):
+            question = line.split('QUESTION:')[1].strip()
+        elif line.startswith('ANSWER:'):
+            answer_lines = [line.split('ANSWER:')[1].strip()]
+        elif line == NOT_ENOUGH_INFORMATION:
+            yield url, '', NOT_ENOUGH_INFORMATION
+
+    if answer_lines is not None:
+        yield finish_answer()
+
+
+def parse_qa_file(file_path, encoding):
+    """Parse a QA text file into a URL / Question / Answer DataFrame without reading it into memory first."""
+    with open(file_path, 'r', encoding=encoding) as file:
+        return pd.DataFrame(list(iter_qa_records(file)), columns=QA_COLUMNS)
+
+
+def _missing_question(qa_df):
+    # Empty questions come back as NaN once a CSV round trip has happened, and as '' when parsed in-process
+    return qa_df['Question'].isna() | (qa_df['Question'] == '')
+
+
+def select_insufficient_links(qa_df):
+    """Links whose page produced no usable QA pair, in the Test_Set_Links.csv layout (LINK, Type)."""
+    insufficient = qa_df[_missing_question(qa_df) | (qa_df['Answer'] == NOT_ENOUGH_INFORMATION)]
+    links = insufficient[['URL']].rename(columns={'URL': 'LINK'})
+    links['Type'] = 'text-based'
+    return links.reset_index(drop=True)
+
+
+def remove_no_content_rows(qa_df):
+    """Drop rows whose answer is 'NOT ENOUGH INFORMATION'."""
+    return qa_df[qa_df['Answer'] != NOT_ENOUGH_INFORMATION]
+
+
+def load_generator_script():
+    # '02_question_answer_generator.py' starts with a digit, so it cannot be imported by name
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '02_question_answer_generator.py')
+    spec = importlib.util.spec_from_file_location('question_answer_generator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_qa_text(links_df, output_file, config):
+    """Run the scraper and QA generation engine over the text-based links of links_df."""
+    from dotenv import load_dotenv
+    from qa_generation_engine import QAGenerationEngine, RateLimiter
+
+    generator = load_generator_script()
+    load_dotenv()
+    processor = generator.DataProcessor(generator.WebScraper())
+    openai_interface = generator.OpenAIInterface(os.getenv("OPENAI_KEY"), api_base=os.getenv("OPENAI_API_BASE"))
+    engine = QAGenerationEngine(openai_interface,
+                                RateLimiter(config['requests_per_minute'], config['tokens_per_minute']),
+                                max_workers=config['max_workers'])
+    jsonl_file = os.path.splitext(output_file)[0] + ".jsonl"
+    summary = engine.run(processor.iter_link_frame(links_df), jsonl_file, text_output_path=output_file)
+    print(f"Generated {summary['ok']}, failed {summary['failed']}, skipped {summary['skipped']}")
+    return output_file
+
+
+class DatasetPipeline:
+    def __init__(self, config):
+        self.config = config
+        self.work_dir = config['work_dir']
+        self.timings = {}
+
+    def _checkpoint(self, name, df):
+        df.to_parquet(os.path.join(self.work_dir, f"{name}.parquet"), index=False)
+
+    def _stage(self, name, func, *args):
+        start = time.perf_counter()
+        df = func(*args)
+        self.timings[name] = time.perf_counter() - start
+        self._checkpoint(name, df)
+        print(f"[{name}] {len(df)} rows in {self.timings[name]:.3f}s")
+        return df
+
+    def _qa_pairs(self, name, links_df, text_file):
+        if self.config['generate']:
+            generate_qa_text(links_df, text_file, self.config)
+        return self._stage(name, parse_qa_file, text_file, self.config['encoding'])
+
+    def run(self):
+        config = self.config
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        links = self._stage('classified_links', classify_links, pd.read_csv(config['links_csv']))
+        qa_pairs = self._qa_pairs('qa_pairs', links, config['qa_text'])
+        test_links = self._stage('test_set_links', select_insufficient_links, qa_pairs)
+        test_qa_pairs = self._qa_pairs('test_qa_pairs', test_links, config['test_qa_text'])
+        filtered = self._stage('filtered_test_qa_pairs', remove_no_content_rows, test_qa_pairs)
+
+        # Export the CSVs the rest of the project reads, once, at the end
+        links.to_csv(config['classified_links_csv'], index=False)
+        qa_pairs.to_csv(config['qa_csv'], index=False)
+        test_links.to_csv(config['test_links_csv'], index=False)
+        test_qa_pairs.to_csv(config['test_qa_csv'], index=False)
+        filtered.to_csv(config['filtered_test_qa_csv'], index=False)
+        return filtered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the QA dataset (steps 01-05) in a single pass.")
+    parser.add_argument("--generate", action="store_true",
+                        help="Scrape and call OpenAI for both passes instead of reusing the existing QA text files")
+    parser.add_argument("--work-dir", default=os.path.join(DATA_DIR, "pipeline"),
+                        help="Directory for the Parquet stage checkpoints")
+    args = parser.parse_args()
+
+    config = {
+        "generate": args.generate,
+        "work_dir": args.work_dir,
+        "encoding": "ISO-8859-1",
+        "links_csv": os.path.join(DATA_DIR, "VPC_Documentation_Links.csv"),
+        "classified_links_csv": os.path.join(DATA_DIR, "Classified_VPC_Links.csv"),
+        "qa_text": os.path.join(DATA_DIR, "Documentation_QA_Pairs.txt"),
+        "qa_csv": os.path.join(DATA_DIR, "Final_Question_Answer_Pairs.csv"),
+        "test_links_csv": os.path.join(DATA_DIR, "Test_Set_Links.csv"),
+        "test_qa_text": os.path.join(DATA_DIR, "Test_Set_QA_Pairs.txt"),
+        "test_qa_csv": os.path.join(DATA_DIR, "Final_TEST_Question_Answer_Pairs.csv"),
+        "filtered_test_qa_csv": os.path.join(DATA_DIR, "Final_FILTERED_TEST_Question_Answer_Pairs.csv"),
+        "max_workers": 8,
+        "requests_per_minute": 500,
+        "tokens_per_minute": 300000,
+    }
+
+    start = time.perf_counter()
+    filtered = DatasetPipeline(config).run()
+    print(f"Built {len(filtered)} filtered test QA pairs in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Concurrent QA Generation Engine
+
+This module drives question-answer generation for many pages at once while staying inside the OpenAI quota.
+It replaces the sequential loop in '02_question_answer_generator.py', which waited for one chat completion
+before starting the next and re-opened the output file for every result.
+
+Key Components:
+- RateLimiter: Token-bucket limiter for requests per minute and tokens per minute.
+- CompletionLedger: Reads the JSONL results file to find URLs that already have a QA response.
+- ResultWriter: Single background thread that owns the output files and appends one record at a time.
+- QAGenerationEngine: Runs prompts on a bounded thread pool, retries transient API errors with exponential
+  backoff and hands every finished result to the writer.
+
+Output:
+- A JSONL file with one record per URL: url, content_hash, status, qa_response (or error), attempts, completed_at.
+- Optionally the legacy 'URL: ... Q&A: ...' text file read by '03_question_answer_unpacker.py'.
+
+Reruns read the JSONL file first and skip every URL whose status is 'ok', so an interrupted run picks up where
+it stopped. Pointing OpenAIInterface at a different api_base (e.g. a local fake chat-completion server) is
+enough to exercise the whole engine offline.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a character-based estimate
+    tiktoken = None
+
+try:
+    from openai import error as openai_error
+    TRANSIENT_ERRORS = (
+        openai_error.RateLimitError,
+        openai_error.APIError,
+        openai_error.Timeout,
+        openai_error.ServiceUnavailableError,
+        openai_error.APIConnectionError,
+        openai_error.TryAgain,
+    )
+except ImportError:
+    TRANSIENT_ERRORS = ()
+TRANSIENT_ERRORS = TRANSIENT_ERRORS + (ConnectionError, TimeoutError)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding_for(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:  # unknown model, or the encoding file cannot be downloaded
+        return None
+
+
+def estimate_tokens(text, model="gpt-4"):
+    """Estimate the number of tokens in a prompt."""
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """Token-bucket limiter for requests per minute (RPM) and tokens per minute (TPM)."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens=0):
+        """Block until one request and 'tokens' tokens fit in the budget, then consume them."""
+        if self.tpm:
+            # A single request larger than the whole bucket would otherwise wait forever
+            tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                request_ok = not self.rpm or self._requests >= 1
+                tokens_ok = not self.tpm or self._tokens >= tokens
+                if request_ok and tokens_ok:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+                waits = []
+                if not request_ok:
+                    waits.append((1 - self._requests) * 60.0 / self.rpm)
+                if not tokens_ok:
+                    waits.append((tokens - self._tokens) * 60.0 / self.tpm)
+            time.sleep(max(waits))
+
+
+class CompletionLedger:
+    """Set of URLs that already have a successful record in the JSONL results file."""
+
+    def __init__(self, jsonl_path):
+        self.jsonl_path = jsonl_path
+        self.completed = set()
+        if os.path.exists(jsonl_path):
+            with open(jsonl_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn final line from an interrupted run
+                    if record.get("status") == "ok":
+                        self.completed.add(record["url"])
+
+    def is_done(self, url):
+        return url in self.completed
+
+    def mark_done(self, url):
+        self.completed.add(url)
+
+
+class ResultWriter:
+    """Single writer thread: the only code that touches the output files."""
+
+    _STOP = object()
+
+    def __init__(self, jsonl_path, text_output_path=None):
+        self.jsonl_path = jsonl_path
+        self.text_output_path = text_output_path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="qa-result-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def write(self, record):
+        self._queue.put(record)
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        directory = os.path.dirname(self.jsonl_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        text_file = open(self.text_output_path, "a") if self.text_output_path else None
+        try:
+            with open(self.jsonl_path, "a", encoding="utf-8") as jsonl_file:
+                while True:
+                    record = self._queue.get()
+                    if record is self._STOP:
+                        break
+                    jsonl_file.write(json.dumps(record) + "\n")
+                    jsonl_file.flush()
+                    if text_file and record["status"] == "ok":
+                        text_file.write(f"URL: {record['url']}\nQ&A:\n{record['qa_response']}\n\n")
+                        text_file.flush()
+        finally:
+            if text_file:
+                text_file.close()
+
+
+class QAGenerationEngine:
+    def __init__(self, openai_interface, rate_limiter=None, max_workers=8, max_retries=5,
+                 backoff_base=1.0, backoff_max=60.0, completion_tokens=1000):
+        self.openai_interface = openai_interface
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.completion_tokens = completion_tokens
+
+    def _generate(self, url, content):
+        prompt = self.openai_interface.create_qa_prompt(content)
+        reserved = estimate_tokens(prompt) + self.completion_tokens
+        record = {
+            "url": url,
+            "content_hash": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            "model": self.openai_interface.model,
+        }
+        for attempt in range(1, self.max_retries + 1):
+            self.rate_limiter.acquire(reserved)
+            try:
+                record.update(status="ok", qa_response=self.openai_interface.request_qa_response(prompt))
+                break
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    record.update(status="failed", error=f"{type(e).__name__}: {e}")
+                    break
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+            except Exception as e:
+                record.update(status="failed", error=f"{type(e).__name__}: {e}")
+                break
+        record.update(attempts=attempt, completed_at=time.time())
+        return record
+
+    def run(self, pages, jsonl_path, text_output_path=None):
+        """
+        Generate QA pairs for an iterable of (url, content) pairs.
+
+        Pages are pulled lazily, with at most 2 * max_workers prompts in flight, so the page iterator can
+        stream from the scraper cache. Returns a summary dict with ok / failed / skipped counts.
+        """
+        ledger = CompletionLedger(jsonl_path)
+        writer = ResultWriter(jsonl_path, text_output_path).start()
+        in_flight = threading.BoundedSemaphore(self.max_workers * 2)
+        summary = {"ok": 0, "failed": 0, "skipped": 0}
+        summary_lock = threading.Lock()
+
+        def on_done(future):
+            try:
+                record = future.result()
+            except Exception as e:
+                print(f"Error in generation worker: {e}")
+                in_flight.release()
+                return
+            try:
+                writer.write(record)
+                with summary_lock:
+                    summary[record["status"]] += 1
+                if record["status"] == "ok":
+                    ledger.mark_done(record["url"])
+                print(f"[{record['status']}] {record['url']}")
+            finally:
+                in_flight.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for url, content in pages:
+                    if ledger.is_done(url):
+                        with summary_lock:
+                            summary["skipped"] += 1
+                        continue
+                    in_flight.acquire()
+                    pool.submit(self._generate, url, content).add_done_callback(on_done)
+        finally:
+            writer.close()
+        return summary
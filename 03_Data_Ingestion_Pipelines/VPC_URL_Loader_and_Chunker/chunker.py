@@ -0,0 +1,170 @@
+"""
+Parallel Chunking Engine
+
+This module holds the chunking step of 'input_pipeline.ipynb' in importable form and runs it across all cores.
+Each saved page is split into chunks, normalized, and written to '<chunks_dir>/<DESC>_<j>.txt'; the chunk
+manifest is written to 'chunking.yml' in the same layout the notebook produced (link, chunks, summary per page).
+
+Key Components:
+- normalize_text: One precompiled regex pass that gives exactly the result of the notebook's four 're.sub' passes
+  in 'process_text' ('/n' -> 'b', newlines dropped, '¶' -> space, whitespace runs collapsed to one space).
+- make_text_splitter: The notebook's 1000-character RecursiveCharacterTextSplitter, or a token-aware variant that
+  measures chunk size in tiktoken tokens.
+- chunk_corpus: Chunks every page on a process pool and writes the chunk files and manifest. Output does not
+  depend on the number of workers or the order in which they finish.
+
+Usage:
+- Save raw page text as '<pages_dir>/<DESC>.txt', where DESC matches the DESC column of the links CSV.
+- python 03_Data_Ingestion_Pipelines/VPC_URL_Loader_and_Chunker/chunker.py \\
+      --pages-dir data/pages --output-dir 06_Data/Capstone_Data [--splitter tokens --chunk-size 256]
+"""
+
+import argparse
+import csv
+import os
+import re
+import time
+from multiprocessing import Pool
+
+import yaml
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+DEFAULT_LINKS_CSV = "06_Data/Capstone_Data/documentation_qa_datasets/VPC_Documentation_Links.csv"
+
+# A '/n' literal, or any run of whitespace and pilcrows. Matched in a single scan of the text.
+_NORMALIZE_PATTERN = re.compile(r"/n|[\s¶]+")
+
+
+def _normalize_match(match):
+    token = match.group(0)
+    if token == "/n":
+        # The notebook rewrote '/n' to a newline followed by 'b' and then deleted the newline
+        return "b"
+    if token.strip("\n\r"):
+        # The run still holds a space, tab, pilcrow, ... once its newlines are removed
+        return " "
+    return ""
+
+
+def normalize_text(text):
+    """Normalize one chunk of text in a single regex pass."""
+    return _NORMALIZE_PATTERN.sub(_normalize_match, text)
+
+
+def process_text(chunked_text):
+    """Normalize a list of chunks (drop-in replacement for the notebook's process_text)."""
+    return [normalize_text(text) for text in chunked_text]
+
+
+def make_text_splitter(splitter="characters", chunk_size=1000, chunk_overlap=0, encoding_name="cl100k_base"):
+    """
+    Build a text splitter.
+
+    - 'characters': chunk_size counts characters (the notebook's settings, chunk_size=1000).
+    - 'tokens': chunk_size counts tiktoken tokens of 'encoding_name'.
+    """
+    common = {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "is_separator_regex": True,
+        "keep_separator": False,
+    }
+    if splitter == "characters":
+        return RecursiveCharacterTextSplitter(length_function=len, **common)
+    if splitter == "tokens":
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(encoding_name=encoding_name, **common)
+    raise ValueError(f"Unknown splitter '{splitter}'. Use 'characters' or 'tokens'.")
+
+
+def chunk_page(text, text_splitter):
+    """Split and normalize the text of a single page."""
+    return process_text(text_splitter.split_text(text))
+
+
+# Per-process state, set once by the pool initializer rather than pickled with every task
+_worker = {}
+
+
+def _init_worker(splitter_kwargs, pages_dir, chunks_dir):
+    _worker["splitter"] = make_text_splitter(**splitter_kwargs)
+    _worker["pages_dir"] = pages_dir
+    _worker["chunks_dir"] = chunks_dir
+
+
+def _chunk_saved_page(desc):
+    with open(os.path.join(_worker["pages_dir"], f"{desc}.txt"), "r", encoding="utf-8") as f:
+        text = f.read()
+    chunks = chunk_page(text, _worker["splitter"])
+    names = []
+    for j, chunk in enumerate(chunks):
+        name = f"{desc}_{j}.txt"
+        with open(os.path.join(_worker["chunks_dir"], name), "w", encoding="utf-8") as f:
+            f.write(chunk)
+        names.append(name)
+    return desc, names
+
+
+def read_link_mapping(links_csv_path):
+    """Map DESC -> LINK from the documentation links CSV."""
+    with open(links_csv_path, mode="r", encoding="utf-8") as csvfile:
+        return {row["DESC"]: row["LINK"] for row in csv.DictReader(csvfile)}
+
+
+def chunk_corpus(pages_dir, output_dir, links_csv_path=DEFAULT_LINKS_CSV, workers=None, **splitter_kwargs):
+    """
+    Chunk every '<DESC>.txt' page in pages_dir on a process pool.
+
+    Writes '<output_dir>/chunks/<DESC>_<j>.txt' and '<output_dir>/chunking.yml', removes chunk files left over
+    from a previous run, and returns the manifest dict.
+    """
+    chunks_dir = os.path.join(output_dir, "chunks")
+    os.makedirs(chunks_dir, exist_ok=True)
+
+    link_mapping = read_link_mapping(links_csv_path)
+    descs = sorted(name[:-len(".txt")] for name in os.listdir(pages_dir) if name.endswith(".txt"))
+
+    manifest = {}
+    with Pool(processes=workers, initializer=_init_worker,
+              initargs=(splitter_kwargs, pages_dir, chunks_dir)) as pool:
+        for desc, names in pool.imap_unordered(_chunk_saved_page, descs, chunksize=8):
+            manifest[desc] = {
+                "link": link_mapping.get(desc, "No link found"),
+                "chunks": names,
+                "summary": f"{desc}.txt",
+            }
+
+    # Pages that now produce fewer chunks must not leave stale files behind
+    written = {name for entry in manifest.values() for name in entry["chunks"]}
+    for name in os.listdir(chunks_dir):
+        if name.endswith(".txt") and name not in written:
+            os.remove(os.path.join(chunks_dir, name))
+
+    # yaml.dump sorts keys, so the manifest is identical however the workers were scheduled
+    with open(os.path.join(output_dir, "chunking.yml"), "w") as f:
+        yaml.dump(manifest, f)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk saved documentation pages on all cores.")
+    parser.add_argument("--pages-dir", required=True, help="Directory of raw page text saved as '<DESC>.txt'")
+    parser.add_argument("--output-dir", default="06_Data/Capstone_Data",
+                        help="Directory that receives 'chunks/' and 'chunking.yml'")
+    parser.add_argument("--links-csv", default=DEFAULT_LINKS_CSV, help="CSV with DESC and LINK columns")
+    parser.add_argument("--splitter", choices=["characters", "tokens"], default="characters")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=0)
+    parser.add_argument("--encoding", default="cl100k_base", help="tiktoken encoding for --splitter tokens")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = chunk_corpus(args.pages_dir, args.output_dir, links_csv_path=args.links_csv, workers=args.workers,
+                            splitter=args.splitter, chunk_size=args.chunk_size,
+                            chunk_overlap=args.chunk_overlap, encoding_name=args.encoding)
+    n_chunks = sum(len(entry["chunks"]) for entry in manifest.values())
+    print(f"Chunked {len(manifest)} pages into {n_chunks} chunks in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
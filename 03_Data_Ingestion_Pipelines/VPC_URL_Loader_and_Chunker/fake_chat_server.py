@@ -0,0 +1,128 @@
+"""
+Fake Chat-Completion Server
+
+Local stand-in for the OpenAI chat-completion endpoint, so the summarizer (and '02_question_answer_generator.py'
+through OPENAI_API_BASE) can run offline. It answers 'POST /v1/chat/completions' in the OpenAI response format:
+
+- The reply is the first words of the text between the first and last double quote of the last message (the
+  summarization prompts quote the text), cut to the request's max_tokens.
+- Prompts longer than 'context_tokens' (estimated at 4 characters per token) are rejected with the same
+  400 'context_length_exceeded' error the real API returns.
+- 'latency_ms' delays every reply, and 'error_rate' answers that share of requests with a 429 rate-limit error,
+  to exercise concurrency and retries.
+
+Usage:
+- python 03_Data_Ingestion_Pipelines/VPC_URL_Loader_and_Chunker/fake_chat_server.py --port 8001 --latency-ms 500
+- server = start_fake_chat_server(latency_ms=200); api_base = server.api_base; ...; server.shutdown()
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def estimate_prompt_tokens(text):
+    return len(text) // 4 + 1
+
+
+def fake_reply(prompt, max_tokens=None):
+    """First words of the quoted text in the prompt (or of the whole prompt), at most ~max_tokens long."""
+    start, end = prompt.find('"'), prompt.rfind('"')
+    text = prompt[start + 1:end] if 0 <= start < end else prompt
+    words = text.split()[:min(60, int((max_tokens or 256) * 0.75))]
+    return " ".join(words) or "Empty page."
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and random.random() < server.error_rate:
+            with server.lock:
+                server.stats["rate_limited"] += 1
+            self._send(429, {"error": {"message": "Rate limit reached (fake server)", "type": "requests",
+                                       "code": "rate_limit_exceeded"}})
+            return
+        messages = request.get("messages", [])
+        prompt_tokens = sum(estimate_prompt_tokens(message.get("content", "")) for message in messages)
+        max_tokens = request.get("max_tokens")
+        if prompt_tokens + (max_tokens or 0) > server.context_tokens:
+            with server.lock:
+                server.stats["context_exceeded"] += 1
+            self._send(400, {"error": {
+                "message": f"This model's maximum context length is {server.context_tokens} tokens. However, you "
+                           f"requested {prompt_tokens + (max_tokens or 0)} tokens. Please reduce the length.",
+                "type": "invalid_request_error", "param": "messages", "code": "context_length_exceeded"}})
+            return
+        content = fake_reply(messages[-1].get("content", "") if messages else "", max_tokens)
+        completion_tokens = estimate_prompt_tokens(content)
+        self._send(200, {
+            "id": f"chatcmpl-fake-{server.stats['requests']}", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+def make_fake_chat_server(host="127.0.0.1", port=0, latency_ms=0, context_tokens=16385, error_rate=0.0):
+    server = ThreadingHTTPServer((host, port), FakeChatHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.context_tokens = context_tokens
+    server.error_rate = error_rate
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "rate_limited": 0, "context_exceeded": 0}
+    server.api_base = f"http://{host}:{server.server_address[1]}/v1"
+    return server
+
+
+def start_fake_chat_server(**kwargs):
+    """Serve on a background thread; returns the server ('api_base', 'stats', 'shutdown()')."""
+    server = make_fake_chat_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="fake-chat-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI chat-completion endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--context-tokens", type=int, default=16385)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    args = parser.parse_args()
+    server = make_fake_chat_server(args.host, args.port, args.latency_ms, args.context_tokens, args.error_rate)
+    print(f"Fake chat completions at {server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Concurrent Page Summarization Engine
+
+Replaces the one-page-at-a-time 'summarize_with_stuff' loop of 'input_pipeline.ipynb', which failed on every page
+longer than the model's context window (MAX_TOKEN = 16385 for gpt-3.5-turbo-16k).
+
+Key Components:
+- PageSummarizer: Summarizes one page. A page whose prompt fits the context window gets the notebook's single
+  "stuff" call. A longer page is split into token-sized pieces that are summarized in parallel (map). The piece
+  summaries are then merged into one (reduce), collapsing them in rounds while they do not fit together. If the API
+  still reports 'context_length_exceeded' (token counts are estimates when tiktoken is unavailable), the text is
+  split again with half the budget.
+- SummaryCache: JSONL file of finished summaries keyed by a hash of the page content, model, prompts and length
+  limits. It is also the progress record: every summary is appended as soon as it is done. A rerun, or a page
+  whose content is unchanged, costs no calls.
+- SummarizationEngine: Bounded thread pool over pages ('max_pages' at a time). All chat calls share a second pool
+  ('max_concurrent_requests'), go through the requests/tokens per minute limiter of 'qa_generation_engine.py'
+  and are retried with exponential backoff on rate-limit, timeout and 5xx errors.
+- iter_pages: Pages from a '<DESC>.txt' directory (as saved by the notebook) or rebuilt from the chunk archive.
+
+Summaries are written to '<output_dir>/summaries/<DESC>.txt' (the notebook's layout) through a temporary file,
+so an interrupted run never leaves a half-written summary.
+
+Usage:
+- python 03_Data_Ingestion_Pipelines/VPC_URL_Loader_and_Chunker/summarizer.py --pages-dir data/pages
+- Offline: start 'fake_chat_server.py' and add --api-base http://127.0.0.1:8001/v1
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+from dotenv import load_dotenv
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PIPELINE_DIR, "VPC_Documentation_QA_Dataset_Generator"))
+from qa_generation_engine import TRANSIENT_ERRORS, RateLimiter, estimate_tokens  # noqa: E402
+
+DEFAULT_OUTPUT_DIR = "06_Data/Capstone_Data"
+DEFAULT_PACK = "06_Data/Capstone_Data/chunks.pack"
+DEFAULT_MODEL = "gpt-3.5-turbo-16k"
+MAX_TOKEN = 16385  # max token length for OpenAI gpt-3.5-turbo-16k
+
+# The notebook's prompt, used for whole pages and for the pieces of long pages
+SUMMARIZE_PROMPT = """Write a concise summary of the following:
+"{text}"
+"""
+COMBINE_PROMPT = """The following are summaries of consecutive parts of one documentation page. Write a concise \
+summary of the whole page:
+"{text}"
+"""
+SUMMARY_SEPARATOR = "\n\n"
+
+
+class ContextLengthExceeded(Exception):
+    pass
+
+
+def is_context_length_error(error):
+    return (getattr(error, "code", None) == "context_length_exceeded"
+            or "maximum context length" in str(error))
+
+
+class ChatClient:
+    """openai ChatCompletion calls with rate limiting and retries."""
+
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, api_base=None, rate_limiter=None, max_retries=5,
+                 backoff_base=1.0, backoff_max=60.0, request_timeout=120):
+        self.api_key = api_key
+        self.model = model
+        self.api_base = api_base
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self.stats = {"calls": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._lock = threading.Lock()
+
+    def complete(self, prompt, max_tokens):
+        self.rate_limiter.acquire(estimate_tokens(prompt, self.model) + max_tokens)
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = openai.ChatCompletion.create(
+                    model=self.model, temperature=0, max_tokens=max_tokens,
+                    messages=[{"role": "user", "content": prompt}],
+                    api_key=self.api_key, api_base=self.api_base, request_timeout=self.request_timeout)
+                break
+            except openai.error.InvalidRequestError as e:
+                if is_context_length_error(e):
+                    raise ContextLengthExceeded(str(e)) from None
+                raise
+            except TRANSIENT_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats["retries"] += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                self.rate_limiter.acquire(estimate_tokens(prompt, self.model) + max_tokens)
+        usage = response.get("usage", {})
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+        return response["choices"][0]["message"]["content"].strip()
+
+
+class PageSummarizer:
+    def __init__(self, client, call_pool, context_tokens=MAX_TOKEN, max_summary_tokens=512, safety_margin=0.05):
+        self.client = client
+        self.call_pool = call_pool
+        self.context_tokens = context_tokens
+        self.max_summary_tokens = max_summary_tokens
+        template_tokens = max(self.count(SUMMARIZE_PROMPT), self.count(COMBINE_PROMPT))
+        # Tokens left for the text itself once the template, the reply and a margin for estimate errors are taken
+        self.text_budget = int((context_tokens - max_summary_tokens - template_tokens) * (1 - safety_margin))
+        if self.text_budget < 2 * max_summary_tokens:
+            raise ValueError("Context window too small for the summary length; lower max_summary_tokens")
+
+    def count(self, text):
+        return estimate_tokens(text, self.client.model)
+
+    def split(self, text, budget):
+        splitter = RecursiveCharacterTextSplitter(chunk_size=budget, chunk_overlap=0, length_function=self.count)
+        return splitter.split_text(text)
+
+    def summarize(self, text):
+        """Return (summary, stats) for one page; stats has the strategy and the number of chat calls."""
+        stats = {"strategy": "stuff", "calls": 0, "rounds": 0}
+        if self.count(text) <= self.text_budget:
+            try:
+                stats["calls"] += 1
+                return self._call(SUMMARIZE_PROMPT, text).result(), stats
+            except ContextLengthExceeded:
+                budget = self.text_budget // 2
+        else:
+            budget = self.text_budget
+        stats["strategy"] = "map_reduce"
+        return self._reduce(self._map(text, budget, stats), stats), stats
+
+    def _call(self, template, text):
+        return self.call_pool.submit(self.client.complete, template.format(text=text), self.max_summary_tokens)
+
+    def _map(self, text, budget, stats):
+        """Summaries of the pieces of text, in order; all pieces are sent at once."""
+        pieces = self.split(text, budget)
+        futures = [self._call(SUMMARIZE_PROMPT, piece) for piece in pieces]
+        stats["calls"] += len(futures)
+        summaries = []
+        for piece, future in zip(pieces, futures):
+            try:
+                summaries.append(future.result())
+            except ContextLengthExceeded:
+                if budget < 2 * self.max_summary_tokens:
+                    raise
+                summaries.extend(self._map(piece, budget // 2, stats))
+        return summaries
+
+    def _reduce(self, summaries, stats):
+        # Collapse groups of summaries that fit in one prompt until they all fit, then combine them once
+        while len(summaries) > 1 and self.count(SUMMARY_SEPARATOR.join(summaries)) > self.text_budget:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                tokens = self.count(summary) + 1
+                if group and size + tokens > self.text_budget:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += tokens
+            groups.append(group)
+            stats["rounds"] += 1
+            futures = [self._call(COMBINE_PROMPT, SUMMARY_SEPARATOR.join(group)) for group in groups]
+            stats["calls"] += len(futures)
+            summaries = [future.result() for future in futures]
+        if len(summaries) == 1:
+            return summaries[0]
+        stats["rounds"] += 1
+        stats["calls"] += 1
+        return self._call(COMBINE_PROMPT, SUMMARY_SEPARATOR.join(summaries)).result()
+
+
+class SummaryCache:
+    """Finished summaries keyed by content hash, appended to a JSONL file as they complete."""
+
+    def __init__(self, path):
+        self.path = path
+        self.summaries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn final line from an interrupted run
+                    if record.get("status") == "ok":
+                        self.summaries[record["key"]] = record["summary"]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def get(self, key):
+        return self.summaries.get(key)
+
+    def append(self, record):
+        with self._lock:
+            if record["status"] == "ok":
+                self.summaries[record["key"]] = record["summary"]
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def iter_pages(pages_dir=None, pack_path=DEFAULT_PACK):
+    """Yield (DESC, page text): saved pages if pages_dir is given, else pages rebuilt from the chunk archive."""
+    if pages_dir:
+        for name in sorted(os.listdir(pages_dir)):
+            if name.endswith(".txt"):
+                with open(os.path.join(pages_dir, name), "r", encoding="utf-8") as f:
+                    yield name[:-len(".txt")], f.read()
+        return
+    sys.path.insert(0, os.path.dirname(PIPELINE_DIR))
+    from retrieval.chunk_archive import ChunkArchive
+    with ChunkArchive(pack_path) as archive:
+        for key in archive.pages():
+            yield key, "\n\n".join(archive.page_chunks(key))
+
+
+def write_summary(summaries_dir, desc, summary):
+    path = os.path.join(summaries_dir, f"{desc}.txt")
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(summary)
+    os.replace(temporary, path)
+
+
+class SummarizationEngine:
+    def __init__(self, client, max_pages=8, max_concurrent_requests=16, context_tokens=MAX_TOKEN,
+                 max_summary_tokens=512):
+        self.client = client
+        self.max_pages = max_pages
+        self.max_concurrent_requests = max_concurrent_requests
+        self.context_tokens = context_tokens
+        self.max_summary_tokens = max_summary_tokens
+
+    def cache_key(self, text):
+        settings = json.dumps([self.client.model, SUMMARIZE_PROMPT, COMBINE_PROMPT, self.context_tokens,
+                               self.max_summary_tokens])
+        return hashlib.sha256((settings + "\0" + text).encode("utf-8")).hexdigest()
+
+    def run(self, pages, output_dir=DEFAULT_OUTPUT_DIR, cache_path=None):
+        """
+        Summarize an iterable of (DESC, text) pages into '<output_dir>/summaries/'.
+
+        Pages are pulled lazily with at most 2 * max_pages in flight. Returns a summary dict with counts
+        (ok / cached / failed / map_reduce), chat call statistics and the elapsed time.
+        """
+        summaries_dir = os.path.join(output_dir, "summaries")
+        os.makedirs(summaries_dir, exist_ok=True)
+        cache = SummaryCache(cache_path or os.path.join(output_dir, "summary_cache.jsonl"))
+        counts = {"ok": 0, "cached": 0, "failed": 0, "map_reduce": 0}
+        counts_lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.max_pages * 2)
+        start = time.perf_counter()
+
+        call_pool = ThreadPoolExecutor(max_workers=self.max_concurrent_requests, thread_name_prefix="summary-call")
+        summarizer = PageSummarizer(self.client, call_pool, self.context_tokens, self.max_summary_tokens)
+
+        def summarize_page(desc, text, key):
+            record = {"key": key, "desc": desc, "content_hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                      "model": self.client.model}
+            try:
+                summary, stats = summarizer.summarize(text)
+                write_summary(summaries_dir, desc, summary)
+                record.update(status="ok", summary=summary, **stats)
+            except Exception as e:
+                record.update(status="failed", error=f"{type(e).__name__}: {e}")
+            record["completed_at"] = time.time()
+            cache.append(record)
+            with counts_lock:
+                counts[record["status"]] += 1
+                counts["map_reduce"] += record.get("strategy") == "map_reduce"
+            print(f"[{record['status']}] {desc}" + (f" ({record['calls']} calls)" if record["status"] == "ok" else
+                                                     f": {record['error']}"))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_pages, thread_name_prefix="summary-page") as page_pool:
+                for desc, text in pages:
+                    key = self.cache_key(text)
+                    cached = cache.get(key)
+                    if cached is not None:
+                        if not os.path.exists(os.path.join(summaries_dir, f"{desc}.txt")):
+                            write_summary(summaries_dir, desc, cached)
+                        counts["cached"] += 1
+                        continue
+                    in_flight.acquire()
+                    page_pool.submit(summarize_page, desc, text, key).add_done_callback(
+                        lambda _: in_flight.release())
+        finally:
+            call_pool.shutdown()
+            cache.close()
+        return dict(counts, **self.client.stats, seconds=round(time.perf_counter() - start, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize documentation pages concurrently.")
+    parser.add_argument("--pages-dir", default=None,
+                        help="Directory of raw page text saved as '<DESC>.txt' (default: rebuild pages from --pack)")
+    parser.add_argument("--pack", default=DEFAULT_PACK, help="Chunk archive used when --pages-dir is not given")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directory that receives 'summaries/'")
+    parser.add_argument("--cache", default=None, help="Summary cache (default: <output-dir>/summary_cache.jsonl)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--context-tokens", type=int, default=MAX_TOKEN, help="Context window of the model")
+    parser.add_argument("--max-summary-tokens", type=int, default=512)
+    parser.add_argument("--max-pages", type=int, default=8, help="Pages summarized at the same time")
+    parser.add_argument("--max-concurrent-requests", type=int, default=16, help="Chat calls in flight")
+    parser.add_argument("--requests-per-minute", type=int, default=3500)
+    parser.add_argument("--tokens-per-minute", type=int, default=180000)
+    parser.add_argument("--api-base", default=os.getenv("OPENAI_API_BASE"),
+                        help="Chat completion endpoint, e.g. a local fake_chat_server.py")
+    parser.add_argument("--limit", type=int, default=None, help="Only summarize the first N pages")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = ChatClient(api_key=os.getenv("OPENAI_KEY") or os.getenv("OPENAI_API_KEY") or "fake", model=args.model,
+                        api_base=args.api_base,
+                        rate_limiter=RateLimiter(args.requests_per_minute, args.tokens_per_minute))
+    engine = SummarizationEngine(client, max_pages=args.max_pages,
+                                 max_concurrent_requests=args.max_concurrent_requests,
+                                 context_tokens=args.context_tokens, max_summary_tokens=args.max_summary_tokens)
+    pages = iter_pages(args.pages_dir, args.pack)
+    if args.limit:
+        pages = (page for _, page in zip(range(args.limit), pages))
+    result = engine.run(pages, args.output_dir, args.cache)
+    print(f"Summarized {result['ok']} pages ({result['map_reduce']} with map-reduce), reused {result['cached']} "
+          f"cached, {result['failed']} failed; {result['calls']} chat calls in {result['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
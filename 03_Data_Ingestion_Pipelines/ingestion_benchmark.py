@@ -0,0 +1,544 @@
+"""
+End-to-End Ingestion Benchmark
+
+Times the whole path from the documentation link list to a queryable vector index, so we know which stage stops
+scaling before the corpus grows. The real pipeline code runs unchanged against three local stand-in servers:
+
+- site server: serves every page of a synthetic corpus as HTML (scripts, styles and navigation included, so the
+  scraper has something to strip). Pages are rendered on request from the packed chunk archive.
+- embedding server: OpenAI-compatible '/v1/embeddings' endpoint returning deterministic hashing vectors
+  (1536 dimensions by default, like text-embedding-ada-002), with an optional fixed latency per request.
+- vector server: Pinecone-style '/vectors/upsert', '/query' and '/describe_index_stats' over an in-memory matrix.
+
+Synthetic corpora are the existing chunked corpus ('chunks.pack', built from 'chunks/') scaled 1x, 10x and 100x:
+copy n of a page has its own link and DESC and its paragraphs rotated by n, so every copy is a distinct page of
+the same size.
+
+Stages (each runs in its own process, so 'peak_rss_mb' is the peak of that stage and its worker processes alone):
+- scrape: 'DataProcessor' / 'WebScraper' of '02_question_answer_generator.py' fetch every link into a fresh
+  content cache; the page text is saved as 'pages/<DESC>.txt', as 'input_pipeline.ipynb' does.
+- chunk: 'chunker.chunk_corpus' writes 'chunks/' and 'chunking.yml'.
+- pack: 'retrieval.chunk_archive' packs the chunks into 'chunks.pack'.
+- embed: 'DocumentProcessor' of '04_Embedding_Storage/01_embed.py' reads the archive and every document is
+  embedded with the same openai.Embedding.create call as 'get_embedding' (one document per request, unless
+  --embed-batch-size is raised). Vectors go to a memory-mapped 'vectors.npy' instead of 01_embed's 'vectors.json'.
+- upsert: 'create_vector' records are upserted in batches of 100, as 'upload_embeddings' does.
+'EmbeddingManager' itself is not used by these two stages: its constructor connects to the hosted Pinecone project
+and 'upload_embeddings' goes through the pinecone client, which cannot be pointed at a local server. The stages
+reproduce its requests instead (the same embedding call and upsert payloads), so a change to EmbeddingManager's
+batching or request pattern has to be mirrored here to show up in the benchmark.
+- query: the test-set questions are embedded and searched; the run fails if the index is missing vectors.
+
+Output: one JSON file per run ('results_<time>.json' with per-stage seconds, items/s, MB/s and peak RSS, the
+throughput of each stage relative to the smallest scale, and the servers' peak RSS), plus one summary line per
+run appended to 'history.jsonl' for trend tracking.
+
+Usage:
+- python 03_Data_Ingestion_Pipelines/ingestion_benchmark.py [--scales 1 10 100] [--embed-latency-ms 0]
+  [--embed-batch-size 1] [--dimensions 1536] [--workers N] [--keep-work-dir]
+"""
+
+import argparse
+import contextlib
+import csv
+import html
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Pipe, Process
+
+import numpy as np
+import pandas as pd
+import requests
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(PIPELINE_DIR)
+GENERATOR_DIR = os.path.join(PIPELINE_DIR, "VPC_Documentation_QA_Dataset_Generator")
+CHUNKER_DIR = os.path.join(PIPELINE_DIR, "VPC_URL_Loader_and_Chunker")
+for path in (REPO_ROOT, GENERATOR_DIR, CHUNKER_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from retrieval.chunk_archive import DEFAULT_DATA_DIR, ChunkArchive, convert_chunk_directory  # noqa: E402
+from retrieval.embedders import HashingEmbedder  # noqa: E402
+
+DEFAULT_SOURCE_PACK = os.path.join(DEFAULT_DATA_DIR, "chunks.pack")
+DEFAULT_QA_CSV = os.path.join(DEFAULT_DATA_DIR, "documentation_qa_datasets",
+                              "Final_FILTERED_TEST_Question_Answer_Pairs.csv")
+DEFAULT_OUTPUT_DIR = os.path.join(DEFAULT_DATA_DIR, "ingestion_benchmark")
+STAGES = ["scrape", "chunk", "pack", "embed", "upsert", "query"]
+EMBEDDING_MODEL = "text-embedding-ada-002"
+UPSERT_BATCH_SIZE = 100  # EmbeddingManager.upload_embeddings
+
+
+def load_script(path, name):
+    # The numbered scripts start with a digit, so they cannot be imported by name
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process or any of its finished children, in MB (Linux reports KB)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# Stand-in servers
+# ---------------------------------------------------------------------------------------------------------------
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive clients stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def send_body(self, body, content_type="application/json", status=200, headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_body({"requests": self.server.requests, "peak_rss_mb": peak_rss_mb()})
+        else:
+            self.server.requests += 1
+            self.handle_get()
+
+    def do_POST(self):
+        self.server.requests += 1
+        self.handle_post()
+
+    def handle_get(self):
+        self.send_body({"error": "not found"}, status=404)
+
+    def handle_post(self):
+        self.send_body({"error": "not found"}, status=404)
+
+
+class SiteHandler(_JSONHandler):
+    """GET /docs/<copy>/<page>.html renders copy <copy> of page <page> of the source archive."""
+
+    def handle_get(self):
+        try:
+            _, _, copy, name = self.path.split("/", 3)
+            copy, page = int(copy), int(name[:-len(".html")])
+            key = self.server.keys[page]
+        except (ValueError, IndexError):
+            self.send_body(b"<html><body>Not found</body></html>", "text/html", status=404)
+            return
+        texts = self.server.archive.page_chunks(key)
+        shift = copy % len(texts) if texts else 0
+        paragraphs = "".join(f"<p>{html.escape(text)}</p>" for text in texts[shift:] + texts[:shift])
+        title = html.escape(key.strip() + (f" (copy {copy})" if copy else ""))
+        body = (f"<html><head><title>{title}</title><style>p {{margin: 0}}</style>"
+                f"<script>window.pageId = {page};</script></head><body><nav><a href='/'>Home</a></nav>"
+                f"<main><h1>{title}</h1>{paragraphs}</main><footer>Stand-in documentation site</footer>"
+                f"</body></html>").encode("utf-8")
+        self.send_body(body, "text/html; charset=utf-8",
+                       headers={"ETag": f'"{copy}-{page}"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+
+class EmbeddingHandler(_JSONHandler):
+    """POST /v1/embeddings in the OpenAI response format."""
+
+    def handle_post(self):
+        request = self.read_json()
+        inputs = request.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        vectors = self.server.embedder.embed_documents(inputs)
+        tokens = sum(len(text.split()) for text in inputs)
+        self.send_body({"object": "list", "model": request.get("model", EMBEDDING_MODEL),
+                        "data": [{"object": "embedding", "index": i, "embedding": vector.tolist()}
+                                 for i, vector in enumerate(vectors)],
+                        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+
+class VectorHandler(_JSONHandler):
+    """Pinecone-style upsert, query and stats over one in-memory namespace."""
+
+    def handle_get(self):
+        if self.path == "/describe_index_stats":
+            self.send_body(self.server.store.describe())
+        else:
+            super().handle_get()
+
+    def handle_post(self):
+        request = self.read_json()
+        if self.path == "/vectors/upsert":
+            self.send_body({"upsertedCount": self.server.store.upsert(request["vectors"])})
+        elif self.path == "/query":
+            self.send_body({"matches": self.server.store.query(request["vector"], request.get("topK", 4),
+                                                               request.get("includeMetadata", False))})
+        else:
+            super().handle_post()
+
+
+class VectorStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._ids = []
+        self._metadata = []
+        self._positions = {}
+
+    def upsert(self, records):
+        with self._lock:
+            for record in records:
+                values = np.asarray(record["values"], dtype=np.float32)
+                if self._vectors is None:
+                    self._vectors = np.zeros((1024, len(values)), dtype=np.float32)
+                position = self._positions.get(record["id"])
+                if position is None:
+                    position = len(self._ids)
+                    if position == len(self._vectors):
+                        # Double the capacity so appends stay amortized O(1)
+                        self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                    self._positions[record["id"]] = position
+                    self._ids.append(record["id"])
+                    self._metadata.append(None)
+                self._vectors[position] = values
+                self._metadata[position] = record.get("metadata")
+            return len(records)
+
+    def query(self, vector, top_k, include_metadata):
+        with self._lock:
+            if not self._ids:
+                return []
+            scores = self._vectors[:len(self._ids)] @ np.asarray(vector, dtype=np.float32)
+            best = np.argsort(-scores)[:top_k]
+            return [dict({"id": self._ids[i], "score": float(scores[i])},
+                         **({"metadata": self._metadata[i]} if include_metadata else {}))
+                    for i in best]
+
+    def describe(self):
+        with self._lock:
+            dimension = 0 if self._vectors is None else self._vectors.shape[1]
+            return {"dimension": dimension, "totalVectorCount": len(self._ids)}
+
+
+def _serve(kind, options, connection):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), {"site": SiteHandler, "embedding": EmbeddingHandler,
+                                                    "vector": VectorHandler}[kind])
+    server.daemon_threads = True
+    server.requests = 0
+    if kind == "site":
+        server.archive = ChunkArchive(options["source_pack"])
+        server.keys = server.archive.pages()
+    elif kind == "embedding":
+        server.embedder = HashingEmbedder(dimensions=options["dimensions"])
+        server.latency = options["latency_ms"] / 1000
+    else:
+        server.store = VectorStore()
+    connection.send(server.server_address[1])
+    server.serve_forever()
+
+
+class StandInServer:
+    """One stand-in server in its own process, so its CPU and memory do not count against the pipeline."""
+
+    def __init__(self, kind, **options):
+        self.kind = kind
+        receiver, sender = Pipe(duplex=False)
+        self.process = Process(target=_serve, args=(kind, options, sender), name=f"stand-in-{kind}", daemon=True)
+        self.process.start()
+        sender.close()  # only the child's end stays open, so recv() sees EOF if the child dies
+        try:
+            self.port = receiver.recv()
+        except EOFError:
+            self.process.join()
+            raise RuntimeError(f"Stand-in {kind} server exited with code {self.process.exitcode} "
+                               f"before it started listening") from None
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    def stats(self):
+        return requests.get(self.url + "/stats").json()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# Synthetic corpus and pipeline stages
+# ---------------------------------------------------------------------------------------------------------------
+
+def write_links_csv(source_pack, scale, site_url, path):
+    """Links CSV (DESC, LINK, Type) of the synthetic corpus: 'scale' copies of every source page."""
+    with ChunkArchive(source_pack) as archive:
+        keys = archive.pages()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["DESC", "LINK", "Type"])
+        for copy in range(scale):
+            for page, key in enumerate(keys):
+                writer.writerow([key + (f" copy{copy}" if copy else ""), f"{site_url}/docs/{copy}/{page}.html",
+                                 "text-based"])
+    return len(keys) * scale
+
+
+def stage_scrape(work_dir, config):
+    generator = load_script(os.path.join(GENERATOR_DIR, "02_question_answer_generator.py"),
+                            "question_answer_generator")
+    links = pd.read_csv(os.path.join(work_dir, "links.csv"), keep_default_na=False)
+    desc_of = dict(zip(links["LINK"], links["DESC"]))
+    pages_dir = os.path.join(work_dir, "pages")
+    os.makedirs(pages_dir, exist_ok=True)
+    processor = generator.DataProcessor(generator.WebScraper(),
+                                        cache_filename=os.path.join(work_dir, "content_cache.sqlite3"),
+                                        legacy_cache_filename=os.path.join(work_dir, "content_cache.json"))
+    pages = size = 0
+    # DataProcessor prints a progress line per page
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for link, content in processor.iter_link_frame(links):
+            with open(os.path.join(pages_dir, desc_of[link] + ".txt"), "w", encoding="utf-8") as f:
+                f.write(content)
+            pages += 1
+            size += len(content.encode("utf-8"))
+    processor.scraper.cache.close()
+    return {"items": pages, "unit": "pages", "bytes": size}
+
+
+def stage_chunk(work_dir, config):
+    from chunker import chunk_corpus
+    manifest = chunk_corpus(os.path.join(work_dir, "pages"), work_dir,
+                            links_csv_path=os.path.join(work_dir, "links.csv"), workers=config["workers"])
+    chunks_dir = os.path.join(work_dir, "chunks")
+    size = sum(os.path.getsize(os.path.join(chunks_dir, name)) for name in os.listdir(chunks_dir))
+    return {"items": sum(len(entry["chunks"]) for entry in manifest.values()), "unit": "chunks", "bytes": size}
+
+
+def stage_pack(work_dir, config):
+    pack_path = os.path.join(work_dir, "chunks.pack")
+    _, chunks = convert_chunk_directory(os.path.join(work_dir, "chunks"), os.path.join(work_dir, "chunking.yml"),
+                                        pack_path)
+    return {"items": chunks, "unit": "chunks", "bytes": os.path.getsize(pack_path)}
+
+
+def _load_documents(work_dir):
+    embed_script = load_script(os.path.join(REPO_ROOT, "04_Embedding_Storage", "01_embed.py"), "embed")
+    processor = embed_script.DocumentProcessor(os.path.join(work_dir, "links.csv"), os.path.join(work_dir, "chunks"),
+                                               archive_path=os.path.join(work_dir, "chunks.pack"))
+    return embed_script, processor.process_documents()
+
+
+def stage_embed(work_dir, config):
+    import openai
+    _, documents = _load_documents(work_dir)
+    vectors = np.lib.format.open_memmap(os.path.join(work_dir, "vectors.npy"), mode="w+", dtype=np.float32,
+                                        shape=(len(documents), config["dimensions"]))
+    batch_size = config["embed_batch_size"]
+    size = 0
+    for start in range(0, len(documents), batch_size):
+        batch = [text.replace("\n", " ") for text, _ in documents[start:start + batch_size]]
+        response = openai.Embedding.create(input=batch, model=EMBEDDING_MODEL, api_key="stand-in",
+                                           api_base=config["embedding_url"] + "/v1")
+        for item in response["data"]:
+            vectors[start + item["index"]] = item["embedding"]
+        size += sum(len(text.encode("utf-8")) for text in batch)
+    vectors.flush()
+    return {"items": len(documents), "unit": "documents", "bytes": size, "requests": -(-len(documents) // batch_size)}
+
+
+def stage_upsert(work_dir, config):
+    embed_script, documents = _load_documents(work_dir)
+    vectors = np.load(os.path.join(work_dir, "vectors.npy"), mmap_mode="r")
+    session = requests.Session()
+    size = 0
+    for start in range(0, len(documents), UPSERT_BATCH_SIZE):
+        batch = [embed_script.create_vector(i, vectors[i], documents[i])
+                 for i in range(start, min(start + UPSERT_BATCH_SIZE, len(documents)))]
+        body = json.dumps({"vectors": batch}).encode("utf-8")
+        response = session.post(config["vector_url"] + "/vectors/upsert", data=body,
+                                headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+        size += len(body)
+    return {"items": len(documents), "unit": "vectors", "bytes": size}
+
+
+def stage_query(work_dir, config):
+    import openai
+    questions = pd.read_csv(config["qa_csv"])["Question"].dropna().tolist()
+    session = requests.Session()
+    stats = session.get(config["vector_url"] + "/describe_index_stats").json()
+    expected = len(np.load(os.path.join(work_dir, "vectors.npy"), mmap_mode="r"))
+    if stats["totalVectorCount"] != expected:
+        raise RuntimeError(f"Index holds {stats['totalVectorCount']} vectors, expected {expected}")
+    for question in questions:
+        response = openai.Embedding.create(input=[question], model=EMBEDDING_MODEL, api_key="stand-in",
+                                           api_base=config["embedding_url"] + "/v1")
+        session.post(config["vector_url"] + "/query",
+                     json={"vector": response["data"][0]["embedding"], "topK": 4,
+                           "includeMetadata": True}).raise_for_status()
+    return {"items": len(questions), "unit": "queries", "bytes": 0, "indexed_vectors": stats["totalVectorCount"]}
+
+
+STAGE_FUNCTIONS = {"scrape": stage_scrape, "chunk": stage_chunk, "pack": stage_pack, "embed": stage_embed,
+                   "upsert": stage_upsert, "query": stage_query}
+
+
+def _run_stage_in_child(name, work_dir, config, connection):
+    try:
+        start = time.perf_counter()
+        result = STAGE_FUNCTIONS[name](work_dir, config)
+        result["seconds"] = time.perf_counter() - start
+        result["peak_rss_mb"] = peak_rss_mb()
+        connection.send(("ok", result))
+    except Exception as e:
+        connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_stage(name, work_dir, config):
+    """Run one stage in a fresh process and return its measurements."""
+    receiver, sender = Pipe(duplex=False)
+    process = Process(target=_run_stage_in_child, args=(name, work_dir, config, sender), name=f"stage-{name}")
+    process.start()
+    sender.close()  # only the child's end stays open, so recv() sees EOF if the child dies
+    try:
+        status, result = receiver.recv()
+    except EOFError:
+        # Killed (e.g. by the OOM killer) or crashed outside Python before it could report
+        status, result = "error", "process exited without a result"
+    process.join()
+    if status != "ok" and process.exitcode:
+        result = f"{result} (exit code {process.exitcode})"
+    if status != "ok":
+        raise RuntimeError(f"Stage {name} failed: {result}")
+    seconds = result["seconds"]
+    result["seconds"] = round(seconds, 3)
+    result["items_per_second"] = round(result["items"] / seconds, 2) if seconds else None
+    result["mb_per_second"] = round(result["bytes"] / 2 ** 20 / seconds, 2) if seconds else None
+    return result
+
+
+def run_scale(scale, config, work_root):
+    """Build the index for one corpus scale from scratch and return the run's measurements."""
+    work_dir = os.path.join(work_root, f"scale-{scale}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    servers = {"site": StandInServer("site", source_pack=config["source_pack"]),
+               "embedding": StandInServer("embedding", dimensions=config["dimensions"],
+                                          latency_ms=config["embed_latency_ms"]),
+               "vector": StandInServer("vector")}
+    try:
+        pages = write_links_csv(config["source_pack"], scale, servers["site"].url, os.path.join(work_dir, "links.csv"))
+        config = dict(config, embedding_url=servers["embedding"].url, vector_url=servers["vector"].url)
+        stages = {}
+        start = time.perf_counter()
+        for name in STAGES:
+            stages[name] = run_stage(name, work_dir, config)
+            print(f"  scale {scale}x  {name:<7} {stages[name]['items']:>8} {stages[name]['unit']:<9} "
+                  f"{stages[name]['seconds']:>9.2f}s {stages[name]['items_per_second']:>10.1f}/s "
+                  f"{stages[name]['peak_rss_mb']:>8.1f} MB")
+        wall = time.perf_counter() - start
+        server_stats = {kind: server.stats() for kind, server in servers.items()}
+    finally:
+        for server in servers.values():
+            server.stop()
+    return {"scale": scale, "pages": pages, "chunks": stages["pack"]["items"], "wall_seconds": round(wall, 3),
+            "peak_rss_mb": max(stage["peak_rss_mb"] for stage in stages.values()), "stages": stages,
+            "servers": server_stats}
+
+
+def add_scaling(runs):
+    """Throughput of every stage relative to the smallest scale (1.0 = scales linearly)."""
+    base = runs[0]["stages"]
+    for run in runs:
+        for name, stage in run["stages"].items():
+            reference = base[name]["items_per_second"]
+            if reference and stage["items_per_second"] is not None:
+                stage["throughput_vs_base"] = round(stage["items_per_second"] / reference, 3)
+    return runs
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=REPO_ROOT).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(report, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(report["created_at"]))
+    path = os.path.join(output_dir, f"results_{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    summary = {key: report[key] for key in ("created_at", "commit", "config")}
+    summary["runs"] = [{"scale": run["scale"], "chunks": run["chunks"], "wall_seconds": run["wall_seconds"],
+                        "peak_rss_mb": run["peak_rss_mb"],
+                        "items_per_second": {name: stage["items_per_second"] for name, stage in run["stages"].items()}}
+                       for run in report["runs"]]
+    with open(os.path.join(output_dir, "history.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(summary) + "\n")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion from the link list to a queryable index.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Corpus size multipliers")
+    parser.add_argument("--source-pack", default=DEFAULT_SOURCE_PACK, help="Chunk archive the corpus is built from")
+    parser.add_argument("--qa-csv", default=DEFAULT_QA_CSV, help="Questions for the query stage")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions of the stand-in server")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0,
+                        help="Extra latency per embedding request, to model the real API")
+    parser.add_argument("--embed-batch-size", type=int, default=1,
+                        help="Documents per embedding request (01_embed.py sends one)")
+    parser.add_argument("--workers", type=int, default=None, help="Chunker worker processes (default: all cores)")
+    parser.add_argument("--work-dir", default=None, help="Where corpora are built (default: a temporary directory)")
+    parser.add_argument("--keep-work-dir", action="store_true")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    config = {"source_pack": args.source_pack, "qa_csv": args.qa_csv, "dimensions": args.dimensions,
+              "embed_latency_ms": args.embed_latency_ms, "embed_batch_size": args.embed_batch_size,
+              "workers": args.workers}
+    work_root = args.work_dir or tempfile.mkdtemp(prefix="ingestion-benchmark-")
+    report = {"created_at": time.time(), "commit": git_commit(),
+              "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+              "config": {key: value for key, value in config.items() if key != "workers"}
+              | {"workers": args.workers or os.cpu_count()},
+              "runs": []}
+    try:
+        for scale in sorted(args.scales):
+            print(f"Scale {scale}x")
+            report["runs"].append(run_scale(scale, config, work_root))
+    finally:
+        if not args.keep_work_dir:
+            shutil.rmtree(work_root, ignore_errors=True)
+    add_scaling(report["runs"])
+    path = write_results(report, args.output_dir)
+    for run in report["runs"]:
+        print(f"Scale {run['scale']}x: {run['pages']} pages, {run['chunks']} chunks, {run['wall_seconds']:.1f}s "
+              f"wall, peak RSS {run['peak_rss_mb']:.0f} MB")
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ and uploads these embeddings to a Pinecone index for efficient similarity search
 
 Key Components:
 - EmbeddingManager: Manages the process of generating embeddings with OpenAI and handling Pinecone operations.
-- DocumentProcessor: Reads documents and associated metadata, preparing them for embedding generation.
+- DocumentProcessor: Reads documents and associated metadata, preparing them for embedding generation. Reads the
+  packed chunk archive (retrieval/chunk_archive.py) when it exists instead of walking the chunks folder.
 - generate_and_upload_embeddings: Generates embeddings for a list of documents and uploads them to Pinecone.
 
 Usage:
@@ -20,15 +21,19 @@ Note:
 """
 
 import os
+import sys
 import csv
-from openai import OpenAI
-
-client = OpenAI(api_key=self.openai_api_key)
+import openai
 import pinecone
 from dotenv import load_dotenv
 import logging
 import json
 
+# Make the repository-level 'retrieval' package importable when run as a script from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval.chunk_archive import ChunkArchive
+from retrieval.shards import partition_of
+
 # Configuration and initialization
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -38,14 +43,18 @@ class EmbeddingManager:
         """Initialize EmbeddingManager with Pinecone and OpenAI API keys."""
         self.pinecone_key = os.getenv("PINECONE_KEY")
         self.openai_api_key = os.getenv("OPENAI_KEY")
-        
+        openai.api_key = self.openai_api_key
+        if os.getenv("OPENAI_API_BASE"):
+            # e.g. the stand-in embedding server of 03_Data_Ingestion_Pipelines/ingestion_benchmark.py
+            openai.api_base = os.getenv("OPENAI_API_BASE")
+
         pinecone.init(api_key=self.pinecone_key, environment='gcp-starter')
         self.index_name = "document-embeddings"
         self.ensure_index_exists()
 
     def get_embedding(self, text, model="text-embedding-ada-002"):
         text = text.replace("\n", " ")
-        return client.embeddings.create(input=[text], model=model)['data'][0]['embedding']
+        return openai.Embedding.create(input=[text], model=model)['data'][0]['embedding']
 
     def ensure_index_exists(self):
         if self.index_name not in pinecone.list_indexes():
@@ -97,11 +106,12 @@ class EmbeddingManager:
                 logging.error("No valid vectors in batch for upload.")
 
 class DocumentProcessor:
-    def __init__(self, links_csv_path, folder_path):
-        """Initialize DocumentProcessor with paths to links CSV and documents folder."""
+    def __init__(self, links_csv_path, folder_path, archive_path=None):
+        """Initialize DocumentProcessor with paths to links CSV and documents folder, or a packed chunk archive."""
         self.links_csv_path = links_csv_path
         self.folder_path = folder_path
-        self.link_mapping = self.read_link_mapping()
+        self.archive_path = archive_path
+        self.link_mapping = {} if archive_path else self.read_link_mapping()
 
     def read_link_mapping(self):
         link_mapping = {}
@@ -117,6 +127,8 @@ class DocumentProcessor:
             return {}
 
     def process_documents(self):
+        if self.archive_path:
+            return self.process_archive()
         document_metadata = []
         for root, dirs, files in os.walk(self.folder_path):
             for filename in files:
@@ -129,6 +141,15 @@ class DocumentProcessor:
                         document_metadata.append((full_text, link))
         return document_metadata
 
+    def process_archive(self):
+        """Read every chunk from the packed archive; links come from its manifest instead of the CSV."""
+        document_metadata = []
+        with ChunkArchive(self.archive_path) as archive:
+            for _, _, link, content in archive.iter_chunks():
+                full_text = "SOURCE LINK: " + link + " " + "CONTENT: " + content
+                document_metadata.append((full_text, link))
+        return document_metadata
+
 def generate_and_upload_embeddings(document_processor, embedding_manager, test_documents):
     """Generate embeddings for test documents and upload them to Pinecone."""
     embeddings = [embedding_manager.get_embedding(doc[0]) for doc in test_documents]
@@ -144,19 +165,24 @@ def generate_and_upload_embeddings(document_processor, embedding_manager, test_d
 def create_vector(index, embedding, document):
     """Create a vector data structure from a document and its embedding."""
     text, link = document
+    # Partition labels let queries be restricted to a doc type / service with a Pinecone metadata filter
+    doc_type, service = partition_of(link)
     return {
         'id': str(index),
         'values': [float(value) for value in embedding],
-        'metadata': {'text': text, 'link': link}
+        'metadata': {'text': text, 'link': link, 'doc_type': doc_type, 'service': service}
     }
 
 if __name__ == "__main__":
     # Paths to your links CSV file and document folder
     links_csv_path = "06_Data/Capstone_Data/documentation_qa_datasets/VPC_Documentation_Links.csv"
     folder_path = "06_Data/Capstone_Data/chunks/"
+    # Packed archive built with `python -m retrieval.chunk_archive`; used instead of folder_path when present
+    archive_path = "06_Data/Capstone_Data/chunks.pack"
 
     # Create instances of DocumentProcessor and EmbeddingManager
-    document_processor = DocumentProcessor(links_csv_path, folder_path)
+    document_processor = DocumentProcessor(links_csv_path, folder_path,
+                                           archive_path=archive_path if os.path.exists(archive_path) else None)
     embedding_manager = EmbeddingManager()
 
     # Process documents to get test documents
@@ -1,4 +1,5 @@
 import os
+import sys
 import torch
 import pandas as pd
 from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
@@ -6,26 +7,16 @@ from peft import PeftModel
 from openai import OpenAI
 import pinecone
 from dotenv import load_dotenv
-from tqdm import tqdm
+from evaluation_runner import EvaluationRunner, config_key, load_results
+from cpu_inference import prepare_cpu_model
+from llm_chat_model import RAG_PROMPT_TEMPLATE
+from merged_model import WEIGHTS_NAME, format_report, load_merged_model
+from prefix_cache import PrefixCachedChatModel
+from speculative_decoding import SpeculativeChatModel
 
-class CustomLLMChatModel:
-    def __init__(self, model, tokenizer):
-        self.model = model
-        self.tokenizer = tokenizer
-
-    def generate_answer(self, prompt, use_sampling=False, temperature=1.0, top_p=None):
-        model_input = self.tokenizer(prompt, return_tensors="pt").to("cuda")
-        self.model.eval()
-        with torch.no_grad():
-            generation_args = {
-                "max_new_tokens": 500,
-                "do_sample": use_sampling,
-                "temperature": temperature if use_sampling else 1.0,
-                "top_p": top_p if use_sampling else None
-            }
-            output = self.model.generate(**model_input, **generation_args)[0]
-            raw_output = self.tokenizer.decode(output, skip_special_tokens=True)
-            return raw_output.split("### ANSWER:")[-1].strip()
+# Make the repository-level 'retrieval' package importable when run as a script from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval.adaptive_topk import estimate_tokens
 
 class OpenAIEmbedding:
     def __init__(self, api_key, model="text-embedding-ada-002"):
@@ -38,13 +29,22 @@ class OpenAIEmbedding:
         return res.data[0].embedding
 
 class PineconeManager:
-    def __init__(self, api_key, environment, index_name):
+    def __init__(self, api_key, environment, index_name, policy=None):
         pinecone.init(api_key=api_key, environment=environment)
         self.index = pinecone.Index(index_name)
+        self.policy = policy
 
     def query_index(self, vector, top_k=3):
         return self.index.query(vector=vector, top_k=top_k, include_metadata=True)
 
+    def query_context(self, vector):
+        # With an adaptive top-k policy, a pool of candidates is cut where the scores fall off instead of a fixed 3
+        if self.policy is None:
+            return self.query_index(vector)['matches']
+        matches = self.query_index(vector, top_k=self.policy.pool_size)['matches']
+        return self.policy.select(matches, [match['score'] for match in matches],
+                                  [estimate_tokens(match['metadata']['text']) for match in matches])
+
 def load_environment_variables():
     load_dotenv()
     return {
@@ -52,52 +52,91 @@ def load_environment_variables():
         "openai_key": os.getenv("OPENAI_KEY")
     }
 
-def initialize_models(base_model, tokenizer, env_vars):
-    custom_llm_model = CustomLLMChatModel(base_model, tokenizer)
+def initialize_models(base_model, tokenizer, env_vars, speculative_draft=None, retrieval_policy=None):
+    if speculative_draft is None:
+        # Every test-set prompt starts with the same instructions; their key/value states are computed only once
+        custom_llm_model = PrefixCachedChatModel(base_model, tokenizer)
+    elif isinstance(speculative_draft, int):
+        # Draft with the fine-tuned model's own first layers
+        custom_llm_model = SpeculativeChatModel(base_model, tokenizer, draft_layers=speculative_draft)
+    else:
+        # A small model with the Llama-2 tokenizer drafts, the fine-tuned model verifies
+        draft_model = AutoModelForCausalLM.from_pretrained(speculative_draft, torch_dtype=base_model.dtype)
+        draft_model = draft_model.to(base_model.device)
+        custom_llm_model = SpeculativeChatModel(base_model, tokenizer, draft_model=draft_model)
     openai_embedding = OpenAIEmbedding(api_key=env_vars["openai_key"])
-    pinecone_manager = PineconeManager(api_key=env_vars["pinecone_key"], environment="gcp-starter", index_name="document-embeddings")
+    pinecone_manager = PineconeManager(api_key=env_vars["pinecone_key"], environment="gcp-starter", index_name="document-embeddings",
+                                       policy=retrieval_policy)
     return custom_llm_model, openai_embedding, pinecone_manager
 
 def main():
     # Set CUDA devices
     os.environ["CUDA_VISIBLE_DEVICES"] = "0,1,2,4,5,6,7"
+    generation_batch_size = 8  # prompts per model.generate call; lower it if a bucket runs out of GPU memory
+    retrieval_workers = 4  # concurrent embedding + Pinecone requests
+    checkpoint_path = '06_Data/Capstone_Data/llm_testing_results/lora_plus_rag_testing_output.jsonl'
+    cpu_threads = None  # torch threads when running without CUDA; None uses torch's default
+    # Greedy answers drafted by a small model and verified by the fine-tuned one (same answers, fewer big-model
+    # passes): a model path such as "TinyLlama/TinyLlama-1.1B-intermediate-step-1431k-3T", or a number of the
+    # fine-tuned model's own layers to draft with. None generates in batches with the prefix cache instead.
+    speculative_draft = None
+    # Context chunks per question cut at the score fall-off (retrieval/adaptive_topk.py) instead of a fixed top 3.
+    # AdaptiveTopK's defaults are tuned for the hashing embedder and keep every chunk of ada-002's narrow score band,
+    # so this stays a plain top 3 (None) until 'python -m retrieval.adaptive_topk tune --embedder openai
+    # --baseline-k 3' has been run; then set e.g. AdaptiveTopK(max_k=3, method=..., threshold=...) from its choice.
+    retrieval_policy = None
 
     # Model and Tokenizer Initialization
-    base_model_id = "NousResearch/Llama-2-7b-hf"
-    bnb_config = BitsAndBytesConfig(
-        load_in_4bit=True, bnb_4bit_use_double_quant=True, bnb_4bit_quant_type="nf4", bnb_4bit_compute_dtype=torch.bfloat16)
-    base_model = AutoModelForCausalLM.from_pretrained(
-        base_model_id, quantization_config=bnb_config, device_map="auto", trust_remote_code=True)
-    tokenizer = AutoTokenizer.from_pretrained(base_model_id, add_bos_token=True, trust_remote_code=True)
-    path_llm_model = "08_Lora_and_Rag/00_trained_lora_model/lora_finetuning/llama2-7b-AmazonVPC-finetune/checkpoint-500"
-    ft_model = PeftModel.from_pretrained(base_model, path_llm_model)
+    merged_model_dir = "08_Lora_and_Rag/00_trained_lora_model/merged"
+    if os.path.exists(os.path.join(merged_model_dir, WEIGHTS_NAME)):
+        # Adapter already merged by 'merged_model.py export': memory-map it instead of quantizing + wrapping again
+        if torch.cuda.is_available():
+            ft_model, tokenizer, report = load_merged_model(merged_model_dir, device="cuda")
+        else:
+            # CPU-only node: float32 weights with the Linear layers dynamically quantized to int8
+            ft_model, tokenizer, report = load_merged_model(merged_model_dir, device="cpu")
+            ft_model = prepare_cpu_model(ft_model, quantize=True, num_threads=cpu_threads)
+        print(format_report(report))
+        model_path = merged_model_dir
+    else:
+        base_model_id = "NousResearch/Llama-2-7b-hf"
+        bnb_config = BitsAndBytesConfig(
+            load_in_4bit=True, bnb_4bit_use_double_quant=True, bnb_4bit_quant_type="nf4", bnb_4bit_compute_dtype=torch.bfloat16)
+        base_model = AutoModelForCausalLM.from_pretrained(
+            base_model_id, quantization_config=bnb_config, device_map="auto", trust_remote_code=True)
+        tokenizer = AutoTokenizer.from_pretrained(base_model_id, add_bos_token=True, trust_remote_code=True)
+        path_llm_model = "08_Lora_and_Rag/00_trained_lora_model/lora_finetuning/llama2-7b-AmazonVPC-finetune/checkpoint-500"
+        ft_model = PeftModel.from_pretrained(base_model, path_llm_model)
+        model_path = path_llm_model
 
     # Load environment variables and initialize models
     env_vars = load_environment_variables()
-    custom_llm_model, openai_embedding, pinecone_manager = initialize_models(ft_model, tokenizer, env_vars)
+    custom_llm_model, openai_embedding, pinecone_manager = initialize_models(ft_model, tokenizer, env_vars,
+                                                                             speculative_draft, retrieval_policy)
 
     # Read CSV File
     test_df = pd.read_csv('06_Data/Capstone_Data/documentation_qa_datasets/Final_FILTERED_TEST_Question_Answer_Pairs.csv')
     test_subset = test_df.sample(frac=1)  # Select 100% of data for full run
 
-    for idx, row in tqdm(test_subset.iterrows(), total=test_subset.shape[0], desc="Processing Questions"):
-        question = row['Question']
+    def retrieve_context(question):
         question_vector = openai_embedding.text_to_vector(question)
-        query_results = pinecone_manager.query_index(question_vector)
-        context = ' '.join([match['metadata']['text'] for match in query_results['matches']])
-        full_prompt = f"""
-        Context: The following API reference information has been retrieved based on the user's question. Pay attention to function names, parameters, and any mentioned errors. Use this information to provide a technically accurate answer.
-
-        Instructions: ONLY OUTPUT A ONE PARAGRAPH ANSWER.
-
-        Retrieved API Information: {context}
-        
-        QUESTION: {question}
-        
-        ANSWER:
-        """
-        llm_answer = custom_llm_model.generate_answer(full_prompt)
-        test_df.loc[idx, 'llm_answer'] = llm_answer
+        return ' '.join([match['metadata']['text'] for match in pinecone_manager.query_context(question_vector)])
+
+    # Retrieval for upcoming questions runs on a thread pool while the model generates; every answer is appended
+    # to the checkpoint as soon as it is done, so an interrupted run resumes where it stopped. Answers from a run
+    # with a different model, prompt or retrieval setup are not resumed from.
+    run_config = {"model": model_path, "prompt_template": RAG_PROMPT_TEMPLATE,
+                  "retrieval_policy": retrieval_policy.settings() if retrieval_policy else {"top_k": 3},
+                  "embedding_model": openai_embedding.model, "speculative_draft": speculative_draft,
+                  "max_new_tokens": custom_llm_model.max_new_tokens}
+    runner = EvaluationRunner(retrieve_context, custom_llm_model, checkpoint_path,
+                              batch_size=generation_batch_size, retrieval_workers=retrieval_workers, config=run_config)
+    summary = runner.run((int(idx), row['Question']) for idx, row in test_subset.iterrows())
+    print(f"Answered {summary['ok']}, failed {summary['failed']}, resumed past {summary['skipped']}")
+    if isinstance(custom_llm_model, SpeculativeChatModel):
+        print(f"Draft acceptance {custom_llm_model.acceptance_rate():.0%}, "
+              f"{custom_llm_model.tokens_per_target_pass():.2f} tokens per fine-tuned model pass")
+    test_df['llm_answer'] = test_df.index.map(load_results(checkpoint_path, config_key(run_config)))
 
     # Save Results to New CSV
     test_df.to_csv('06_Data/Capstone_Data/llm_testing_results/lora_plus_rag_testing_output.csv', index=False)
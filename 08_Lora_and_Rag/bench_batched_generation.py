@@ -0,0 +1,80 @@
+"""
+Batched Generation Benchmark
+
+Compares one-prompt-at-a-time generation (the old test-set loop) with length-bucketed batch generation on a tiny,
+locally built Llama model (see 'tiny_models.py'), so it runs on a laptop CPU in well under a minute.
+
+Prompts are real: test-set questions with a variable number of chunks from the packed chunk archive as context,
+wrapped in the same prompt as '01_lora_and_rag_answer_generator.py'. Both paths decode greedily, and the script
+reports how many batched answers match the sequential ones exactly.
+
+Usage:
+- python 08_Lora_and_Rag/bench_batched_generation.py [--prompts 32 --batch-size 8 --max-new-tokens 32]
+"""
+
+import argparse
+import os
+import random
+import time
+
+import pandas as pd
+import torch
+
+from llm_chat_model import CustomLLMChatModel, build_rag_prompt
+from tiny_models import REPO_ROOT, build_tiny_llama, build_tiny_tokenizer, load_corpus_texts
+
+TEST_CSV = os.path.join(REPO_ROOT, "06_Data", "Capstone_Data", "documentation_qa_datasets",
+                        "Final_FILTERED_TEST_Question_Answer_Pairs.csv")
+
+
+def build_prompts(chunks, n_prompts, max_context_chunks, seed=0):
+    rng = random.Random(seed)
+    questions = pd.read_csv(TEST_CSV)['Question'].dropna().tolist()
+    prompts = []
+    for i in range(n_prompts):
+        context = ' '.join(rng.sample(chunks, rng.randint(1, max_context_chunks)))
+        prompts.append(build_rag_prompt(context, questions[i % len(questions)]))
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs. batched generation on a tiny model.")
+    parser.add_argument("--prompts", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--max-context-chunks", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads (default: torch's choice)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    chunks = load_corpus_texts(limit=2000)
+    tokenizer = build_tiny_tokenizer(chunks)
+    model = build_tiny_llama(tokenizer)
+    chat_model = CustomLLMChatModel(model, tokenizer, device="cpu", max_new_tokens=args.max_new_tokens)
+    prompts = build_prompts(chunks, args.prompts, args.max_context_chunks)
+    lengths = [len(ids) for ids in tokenizer(prompts)["input_ids"]]
+    print(f"{len(prompts)} prompts, {min(lengths)}-{max(lengths)} tokens, up to {args.max_new_tokens} new tokens each")
+
+    # Answers that end at EOS generate fewer than max_new_tokens tokens; the model counts the real number
+    start = time.perf_counter()
+    sequential = [chat_model.generate_answer(prompt) for prompt in prompts]
+    sequential_time = time.perf_counter() - start
+    sequential_tokens = chat_model.generated_tokens
+
+    start = time.perf_counter()
+    batched = chat_model.generate_answers(prompts, batch_size=args.batch_size)
+    batched_time = time.perf_counter() - start
+    batched_tokens = chat_model.generated_tokens - sequential_tokens
+
+    matches = sum(a == b for a, b in zip(sequential, batched))
+    print(f"Sequential: {sequential_time:.2f}s ({sequential_tokens / sequential_time:.1f} tokens/s, "
+          f"{sequential_tokens} tokens)")
+    print(f"Batched:    {batched_time:.2f}s ({batched_tokens / batched_time:.1f} tokens/s, {batched_tokens} tokens), "
+          f"batch size {args.batch_size}")
+    print(f"Speedup: {sequential_time / batched_time:.2f}x; identical answers: {matches}/{len(prompts)}")
+
+
+if __name__ == "__main__":
+    main()
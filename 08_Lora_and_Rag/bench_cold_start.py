@@ -0,0 +1,100 @@
+"""
+Cold Start Check and Benchmark
+
+Builds a small Llama model and a LoRA adapter for it locally (see 'tiny_models.py'), then compares the two ways of
+getting the fine-tuned model ready:
+
+- adapter path: 'from_pretrained' on the base model + 'PeftModel.from_pretrained' on the adapter (the old startup).
+- merged path: 'load_merged_model' on the artifact written by 'export_merged_model'.
+
+The merged model must produce the same logits as base + adapter (within float tolerance) and the same greedy
+answers; the script exits with status 1 otherwise. Everything runs on CPU in a temporary directory.
+
+Usage:
+- python 08_Lora_and_Rag/bench_cold_start.py [--hidden-size 512 --layers 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import torch
+from peft import LoraConfig, PeftModel, get_peft_model
+from transformers import AutoModelForCausalLM
+
+from llm_chat_model import CustomLLMChatModel, build_rag_prompt
+from merged_model import export_merged_model, format_report, load_merged_model
+from tiny_models import build_tiny_llama, build_tiny_tokenizer, load_corpus_texts
+
+
+def build_local_checkpoint(work_dir, hidden_size, num_layers):
+    """Save a tiny base model and a LoRA adapter with non-zero weights; return their directories."""
+    chunks = load_corpus_texts(limit=2000)
+    tokenizer = build_tiny_tokenizer(chunks)
+    base = build_tiny_llama(tokenizer, hidden_size=hidden_size, num_layers=num_layers,
+                            intermediate_size=hidden_size * 8 // 3)
+    base_dir = os.path.join(work_dir, "base")
+    base.save_pretrained(base_dir)
+    tokenizer.save_pretrained(base_dir)
+
+    lora_config = LoraConfig(r=8, lora_alpha=16, target_modules=["q_proj", "k_proj", "v_proj", "o_proj"],
+                             lora_dropout=0.0, task_type="CAUSAL_LM")
+    adapted = get_peft_model(base, lora_config)
+    torch.manual_seed(1)
+    with torch.no_grad():
+        for name, parameter in adapted.named_parameters():
+            if "lora_B" in name:
+                # lora_B starts at zero, which would make the adapter a no-op and the check meaningless
+                parameter.normal_(std=0.05)
+    adapter_dir = os.path.join(work_dir, "adapter")
+    adapted.save_pretrained(adapter_dir)
+    return base_dir, adapter_dir, chunks
+
+
+def load_with_adapter(base_dir, adapter_dir):
+    start = time.perf_counter()
+    base = AutoModelForCausalLM.from_pretrained(base_dir, torch_dtype=torch.float32)
+    model = PeftModel.from_pretrained(base, adapter_dir).eval()
+    return model, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark loading the merged LoRA artifact on CPU.")
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        base_dir, adapter_dir, chunks = build_local_checkpoint(work_dir, args.hidden_size, args.layers)
+        merged_dir = os.path.join(work_dir, "merged")
+        export_seconds = export_merged_model(base_dir, adapter_dir, merged_dir, dtype=torch.float32)
+        print(f"Exported merged artifact in {export_seconds:.2f}s")
+
+        adapter_model, adapter_seconds = load_with_adapter(base_dir, adapter_dir)
+        merged_model, tokenizer, report = load_merged_model(merged_dir)
+        print(f"Base + adapter load: {adapter_seconds:.2f}s")
+        print(f"Merged mmap load:    {format_report(report)}")
+        print(f"Startup speedup: {adapter_seconds / report['total']:.1f}x")
+
+        prompts = [build_rag_prompt(chunks[i][:300], f"What is described in section {i}?") for i in range(4)]
+        input_ids = tokenizer(prompts[0], return_tensors="pt")["input_ids"]
+        with torch.no_grad():
+            expected = adapter_model(input_ids=input_ids).logits
+            actual = merged_model(input_ids=input_ids).logits
+        max_diff = (expected - actual).abs().max().item()
+        expected_answers = CustomLLMChatModel(adapter_model, tokenizer, device="cpu",
+                                              max_new_tokens=args.max_new_tokens).generate_answers(prompts)
+        answers = CustomLLMChatModel(merged_model, tokenizer, device="cpu",
+                                     max_new_tokens=args.max_new_tokens).generate_answers(prompts)
+        matches = sum(a == b for a, b in zip(expected_answers, answers))
+        print(f"Max logit difference: {max_diff:.2e}; identical greedy answers: {matches}/{len(prompts)}")
+        if max_diff > 1e-3 or matches != len(prompts):
+            print("Merged model does not match base + adapter")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+CPU Inference Benchmark
+
+Measures generation throughput (tokens/sec) on CPU for a small locally built Llama model (see 'tiny_models.py')
+saved as a merged artifact and loaded through 'cpu_inference.load_cpu_chat_model':
+
+- float32: the unquantized CPU baseline.
+- int8: nn.Linear layers dynamically quantized to int8.
+- onnx (--onnx): the exported forward pass run with onnxruntime, if 'onnx' and 'onnxruntime' are installed.
+
+Each configuration is run for every thread count given with --threads. The random model's answers are noise, so
+the agreement between int8 and float32 answers is reported for information only.
+
+Usage:
+- python 08_Lora_and_Rag/bench_cpu_inference.py [--threads 1 4 --prompts 8 --max-new-tokens 32 --onnx]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from cpu_inference import OnnxGreedyGenerator, configure_threads, export_onnx, load_cpu_chat_model
+from llm_chat_model import build_rag_prompt
+from merged_model import save_merged_model
+from tiny_models import build_tiny_llama, build_tiny_tokenizer, load_corpus_texts
+
+
+def weight_megabytes(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    # Dynamically quantized Linear layers keep their int8 weights in packed params, not in parameters()
+    for module in model.modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            tensors += [module.weight()] + ([module.bias()] if module.bias() is not None else [])
+    return sum(t.numel() * t.element_size() for t in tensors) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark float32 vs int8 (and optionally ONNX) CPU generation.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[torch.get_num_threads()])
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--onnx", action="store_true", help="Also export to ONNX and run it with onnxruntime")
+    args = parser.parse_args()
+
+    chunks = load_corpus_texts(limit=2000)
+    tokenizer = build_tiny_tokenizer(chunks)
+    model = build_tiny_llama(tokenizer, hidden_size=args.hidden_size, num_layers=args.layers,
+                             intermediate_size=args.hidden_size * 8 // 3)
+    prompts = [build_rag_prompt(chunks[i][:600], f"What does section {i} describe?") for i in range(args.prompts)]
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        save_merged_model(model, tokenizer, model_dir)
+        for threads in args.threads:
+            configure_threads(threads)
+            results = {}
+            for name, quantize in (("float32", False), ("int8", True)):
+                chat_model, report = load_cpu_chat_model(model_dir, quantize=quantize,
+                                                         max_new_tokens=args.max_new_tokens)
+                start = time.perf_counter()
+                results[name] = chat_model.generate_answers(prompts, batch_size=args.batch_size)
+                seconds = time.perf_counter() - start
+                # Answers that hit EOS early generate fewer than max_new_tokens tokens
+                new_tokens = chat_model.generated_tokens
+                print(f"[{threads} threads] {name:8s} {new_tokens / seconds:8.1f} tokens/s ({new_tokens} tokens, "
+                      f"{seconds:.2f}s, weights {weight_megabytes(chat_model.model):.0f} MB, "
+                      f"loaded in {report['total']:.2f}s)")
+            matches = sum(a == b for a, b in zip(results["float32"], results["int8"]))
+            print(f"[{threads} threads] int8 answers identical to float32: {matches}/{len(prompts)}")
+
+            if args.onnx:
+                try:
+                    onnx_path = export_onnx(model, os.path.join(model_dir, "model.onnx"))
+                    generator = OnnxGreedyGenerator(onnx_path, tokenizer, num_threads=threads)
+                except ImportError as e:
+                    print(f"Skipping ONNX: {e}")
+                    continue
+                start = time.perf_counter()
+                for prompt in prompts:
+                    generator.generate_answer(prompt, max_new_tokens=args.max_new_tokens)
+                seconds = time.perf_counter() - start
+                new_tokens = generator.generated_tokens
+                print(f"[{threads} threads] onnx     {new_tokens / seconds:8.1f} tokens/s ({new_tokens} tokens, "
+                      f"{seconds:.2f}s, no KV cache, one prompt at a time)")
+
+
+if __name__ == "__main__":
+    main()
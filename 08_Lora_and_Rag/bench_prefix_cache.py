@@ -0,0 +1,70 @@
+"""
+Prefix Cache Check and Benchmark
+
+Generates answers for the same test-set prompts with CustomLLMChatModel and PrefixCachedChatModel on a tiny local
+Llama model (see 'tiny_models.py') and compares them. Greedy answers must be identical, one prompt at a time and
+in batches; the script exits with status 1 if any answer differs. It also reports the time saved by not
+prefilling the shared instruction block.
+
+Usage:
+- python 08_Lora_and_Rag/bench_prefix_cache.py [--prompts 24 --batch-size 8 --max-new-tokens 16]
+"""
+
+import argparse
+import sys
+import time
+
+import torch
+
+from bench_batched_generation import build_prompts
+from llm_chat_model import CustomLLMChatModel
+from prefix_cache import PrefixCachedChatModel
+from tiny_models import build_tiny_llama, build_tiny_tokenizer, load_corpus_texts
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the prompt-prefix KV cache on a tiny model.")
+    parser.add_argument("--prompts", type=int, default=24)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    parser.add_argument("--max-context-chunks", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads (default: torch's choice)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    chunks = load_corpus_texts(limit=2000)
+    tokenizer = build_tiny_tokenizer(chunks)
+    model = build_tiny_llama(tokenizer)
+    uncached = CustomLLMChatModel(model, tokenizer, device="cpu", max_new_tokens=args.max_new_tokens)
+    cached, setup_time = timed(PrefixCachedChatModel, model, tokenizer, device="cpu",
+                               max_new_tokens=args.max_new_tokens)
+    prompts = build_prompts(chunks, args.prompts, args.max_context_chunks)
+    print(f"{len(prompts)} prompts, cached prefix of {len(cached.prefix_ids)} tokens "
+          f"(computed once in {setup_time * 1000:.1f}ms)")
+
+    all_match = True
+    for batch_size in (1, args.batch_size):
+        expected, uncached_time = timed(uncached.generate_answers, prompts, batch_size=batch_size)
+        answers, cached_time = timed(cached.generate_answers, prompts, batch_size=batch_size)
+        matches = sum(a == b for a, b in zip(expected, answers))
+        all_match = all_match and matches == len(prompts)
+        print(f"batch size {batch_size}: uncached {uncached_time:.2f}s, cached {cached_time:.2f}s "
+              f"({uncached_time / cached_time:.2f}x), identical answers {matches}/{len(prompts)}")
+
+    print(f"Prompts served from the cache: {cached.stats['cached_prompts']}, "
+          f"without it: {cached.stats['uncached_prompts']}")
+    if not all_match:
+        print("Cached and uncached answers differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
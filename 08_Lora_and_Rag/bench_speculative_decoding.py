@@ -0,0 +1,96 @@
+"""
+Speculative Decoding Check and Benchmark
+
+Generates greedy answers for test-set prompts with CustomLLMChatModel (one prompt at a time) and with
+SpeculativeChatModel, for two drafts: the target's own first layers (layer-skip) and a separate two-layer model.
+Answers must be identical; the script exits with status 1 if any differs. For every draft and draft length it
+reports the time, speedup, acceptance rate and tokens generated per target forward pass.
+
+A randomly initialized model agrees with no draft, so both models are first trained for a few hundred steps on the
+chunk corpus (see 'train_tiny_llama'); the target with an extra early-exit loss at the draft layer, which is what
+makes its first layers a usable draft. The speedup depends on the acceptance rate and on how much cheaper the draft
+is than the target, so it is larger for Llama-2-7b with a small draft than for the tiny models.
+
+Usage:
+- python 08_Lora_and_Rag/bench_speculative_decoding.py [--prompts 12 --num-draft-tokens 2 3 --hidden-size 512]
+"""
+
+import argparse
+import sys
+import time
+
+import torch
+
+from bench_batched_generation import build_prompts
+from llm_chat_model import CustomLLMChatModel
+from speculative_decoding import SpeculativeChatModel
+from tiny_models import build_tiny_llama, build_tiny_tokenizer, load_corpus_texts, train_tiny_llama
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def best_of(repeats, func, *args, **kwargs):
+    """Run func repeats times; returns the first result and the fastest time (CPU timings are noisy)."""
+    runs = [timed(func, *args, **kwargs) for _ in range(repeats)]
+    return runs[0][0], min(elapsed for _, elapsed in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark speculative decoding on tiny models.")
+    parser.add_argument("--prompts", type=int, default=12)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--max-context-chunks", type=int, default=1)
+    parser.add_argument("--hidden-size", type=int, default=256, help="Target width; larger targets gain more")
+    parser.add_argument("--target-layers", type=int, default=8)
+    parser.add_argument("--draft-layers", type=int, default=2, help="Target layers used by the layer-skip draft")
+    parser.add_argument("--num-draft-tokens", type=int, nargs="+", default=[2, 3, 5])
+    parser.add_argument("--train-steps", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per configuration; the fastest counts")
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads (default: torch's choice)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    chunks = load_corpus_texts(limit=2000)
+    tokenizer = build_tiny_tokenizer(chunks)
+    target = build_tiny_llama(tokenizer, hidden_size=args.hidden_size, num_layers=args.target_layers,
+                              num_heads=max(args.hidden_size // 64, 1), intermediate_size=args.hidden_size * 8 // 3)
+    (target, target_loss), target_time = timed(train_tiny_llama, target, tokenizer, chunks, steps=args.train_steps,
+                                               early_exit_layer=args.draft_layers)
+    draft = build_tiny_llama(tokenizer, hidden_size=128, num_layers=2, intermediate_size=344, seed=1)
+    (draft, draft_loss), draft_time = timed(train_tiny_llama, draft, tokenizer, chunks, steps=args.train_steps)
+    print(f"Trained target ({args.target_layers} layers of width {args.hidden_size}, loss {target_loss:.2f}) in "
+          f"{target_time:.0f}s and draft (2 small layers, loss {draft_loss:.2f}) in {draft_time:.0f}s")
+
+    prompts = build_prompts(chunks, args.prompts, args.max_context_chunks)
+    plain = CustomLLMChatModel(target, tokenizer, device="cpu", max_new_tokens=args.max_new_tokens)
+    expected, plain_time = best_of(args.repeats, plain.generate_answers, prompts, batch_size=1)
+    print(f"{len(prompts)} prompts, plain greedy: {plain_time:.2f}s")
+
+    drafts = {f"layer-skip ({args.draft_layers} layers)": {"draft_layers": args.draft_layers},
+              "separate 2-layer model": {"draft_model": draft}}
+    all_match = True
+    for name, draft_kwargs in drafts.items():
+        for num_draft_tokens in args.num_draft_tokens:
+            speculative = SpeculativeChatModel(target, tokenizer, device="cpu", max_new_tokens=args.max_new_tokens,
+                                               num_draft_tokens=num_draft_tokens, **draft_kwargs)
+            answers, speculative_time = best_of(args.repeats, speculative.generate_answers, prompts)
+            matches = sum(a == b for a, b in zip(expected, answers))
+            all_match = all_match and matches == len(prompts)
+            print(f"{name}, {num_draft_tokens} draft tokens: {speculative_time:.2f}s "
+                  f"({plain_time / speculative_time:.2f}x), acceptance {speculative.acceptance_rate():.0%}, "
+                  f"{speculative.tokens_per_target_pass():.2f} tokens per target pass, "
+                  f"identical answers {matches}/{len(prompts)}")
+
+    if not all_match:
+        print("Speculative and plain greedy answers differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
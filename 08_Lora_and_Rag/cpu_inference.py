@@ -0,0 +1,125 @@
+"""
+CPU Inference
+
+The test-set and serving code loaded the model with bitsandbytes 4-bit quantization, which only runs on CUDA. This
+module prepares the fine-tuned model for CPU-only machines instead:
+
+Key Components:
+- configure_threads: Set torch's intra-op (and optionally inter-op) thread counts, e.g. one per physical core.
+- prepare_cpu_model: Move a model to CPU in float32 and replace every nn.Linear with a dynamically quantized int8
+  linear layer (weights stored as int8, activations quantized on the fly). The Llama layers are almost all Linear,
+  so this cuts weight memory by about 4x and speeds up generation.
+- load_cpu_chat_model: Load the merged artifact from 'merged_model.py', prepare it for CPU and wrap it in
+  CustomLLMChatModel (or PrefixCachedChatModel).
+- export_onnx / OnnxGreedyGenerator: Optional ONNX path. Exports the model's forward pass (input IDs and attention
+  mask -> logits) and runs greedy decoding on it with onnxruntime. Requires the 'onnx' and 'onnxruntime' packages.
+
+Usage:
+- chat_model, report = load_cpu_chat_model('08_Lora_and_Rag/00_trained_lora_model/merged', num_threads=8)
+- python 08_Lora_and_Rag/bench_cpu_inference.py   (tokens/sec, float32 vs int8, on a tiny local model)
+"""
+
+import inspect
+import time
+
+import torch
+
+from llm_chat_model import CustomLLMChatModel
+from merged_model import load_merged_model
+
+
+def configure_threads(num_threads=None, interop_threads=None):
+    """Set torch's CPU thread counts; None leaves torch's default. Returns the intra-op thread count in use."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        # Must happen before any inter-op parallel work has started in this process
+        torch.set_num_interop_threads(interop_threads)
+    return torch.get_num_threads()
+
+
+def quantize_linear_layers(model):
+    """Replace every nn.Linear in model with a dynamically quantized int8 version, in place."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def prepare_cpu_model(model, quantize=True, num_threads=None):
+    """Move a model to CPU for inference, in float32, optionally with int8 dynamic quantization."""
+    configure_threads(num_threads)
+    # float16 matrix multiplication is slow (or missing) on most CPUs
+    model = model.to(device="cpu", dtype=torch.float32).eval()
+    if quantize:
+        model = quantize_linear_layers(model)
+    return model
+
+
+def load_cpu_chat_model(model_dir, quantize=True, num_threads=None, chat_model_class=CustomLLMChatModel,
+                        **chat_kwargs):
+    """Load a merged model artifact for CPU inference. Returns (chat_model, report)."""
+    model, tokenizer, report = load_merged_model(model_dir, device="cpu")
+    start = time.perf_counter()
+    model = prepare_cpu_model(model, quantize=quantize, num_threads=num_threads)
+    report["prepare_cpu"] = time.perf_counter() - start
+    report["total"] += report["prepare_cpu"]
+    return chat_model_class(model, tokenizer, device="cpu", **chat_kwargs), report
+
+
+class _LogitsOnly(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+
+def export_onnx(model, output_path, opset_version=17):
+    """Export the float32 forward pass (input_ids, attention_mask -> logits) with dynamic batch and length."""
+    try:
+        import onnx  # noqa: F401  (torch.onnx.export needs it to serialize the graph)
+    except ImportError as e:
+        raise ImportError("ONNX export needs the 'onnx' package: pip install onnx onnxruntime") from e
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    dynamic = {0: "batch", 1: "sequence"}
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False  # the TorchScript exporter handles the dynamic_axes below
+    torch.onnx.export(_LogitsOnly(model.to(dtype=torch.float32).eval()), (dummy, torch.ones_like(dummy)),
+                      output_path, input_names=["input_ids", "attention_mask"], output_names=["logits"],
+                      dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "logits": dynamic},
+                      opset_version=opset_version, **export_kwargs)
+    return output_path
+
+
+class OnnxGreedyGenerator:
+    """
+    Greedy decoding on an exported ONNX model with onnxruntime.
+
+    The export has no key/value cache inputs, so every step re-runs the whole sequence; it is meant for comparing
+    runtimes and for short answers, not as a replacement for CustomLLMChatModel.
+    """
+
+    def __init__(self, onnx_path, tokenizer, num_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = tokenizer
+        self.generated_tokens = 0
+
+    def generate_answer(self, prompt, max_new_tokens=32):
+        import numpy as np
+
+        input_ids = np.array([self.tokenizer(prompt)["input_ids"]], dtype=np.int64)
+        prompt_length = input_ids.shape[1]
+        for _ in range(max_new_tokens):
+            logits = self.session.run(["logits"], {"input_ids": input_ids,
+                                                   "attention_mask": np.ones_like(input_ids)})[0]
+            next_token = int(logits[0, -1].argmax())
+            input_ids = np.concatenate([input_ids, [[next_token]]], axis=1)
+            if next_token == self.tokenizer.eos_token_id:
+                break
+        self.generated_tokens += input_ids.shape[1] - prompt_length
+        return self.tokenizer.decode(input_ids[0, prompt_length:], skip_special_tokens=True).strip()
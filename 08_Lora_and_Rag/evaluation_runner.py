@@ -0,0 +1,153 @@
+"""
+Pipelined Evaluation Runner
+
+Runs the LoRA + RAG test set as a producer/consumer pipeline instead of embed -> Pinecone query -> generate one
+row at a time:
+
+- Producer: a thread pool retrieves the context of upcoming questions (OpenAI embedding + Pinecone query) while
+  the model is busy. Up to 'prefetch' retrievals are in flight, so the GPU/CPU does not wait on the network.
+- Consumer: the calling thread takes retrieved rows as they finish, builds their prompts and generates them in
+  batches of 'batch_size' with CustomLLMChatModel.generate_answers.
+- Checkpoint: every finished row is appended to a JSONL file right away. A restarted run reads that file and
+  skips every row whose status is 'ok'; rows that failed are retried.
+- Configuration: every record carries a hash of the run's 'config' (model, prompt template, retrieval settings,
+  ...). Records written under a different configuration are ignored, so changing any of them reruns every row
+  instead of mixing answers from two setups in one CSV.
+
+Each record holds row_id, question, config_key, status, llm_answer (or error), retrieval_seconds and
+generation_seconds. 'load_results' turns the checkpoint into a row_id -> answer mapping for the final CSV.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_chat_model import build_rag_prompt
+
+
+def config_key(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_checkpoint(checkpoint_path, config_key=None):
+    """
+    Return the latest record per row_id from a checkpoint file (empty if it does not exist yet).
+
+    With config_key, records written under any other configuration are left out.
+    """
+    records = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a torn final line from an interrupted run
+                if config_key is None or record.get("config_key") == config_key:
+                    records[record["row_id"]] = record
+    return records
+
+
+def load_results(checkpoint_path, config_key=None):
+    """Map row_id -> llm_answer for every row that completed successfully (under config_key, if given)."""
+    return {row_id: record["llm_answer"] for row_id, record in read_checkpoint(checkpoint_path, config_key).items()
+            if record["status"] == "ok"}
+
+
+class EvaluationRunner:
+    def __init__(self, retrieve_context, chat_model, checkpoint_path, batch_size=8, retrieval_workers=4,
+                 prefetch=None, build_prompt=build_rag_prompt, config=None):
+        self.retrieve_context = retrieve_context
+        self.chat_model = chat_model
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.retrieval_workers = retrieval_workers
+        self.prefetch = prefetch or max(2 * batch_size, 2 * retrieval_workers)
+        self.build_prompt = build_prompt
+        self.config_key = config_key(config or {})
+
+    def _retrieve(self, row_id, question):
+        start = time.perf_counter()
+        try:
+            context = self.retrieve_context(question)
+            return {"row_id": row_id, "question": question, "config_key": self.config_key, "context": context,
+                    "retrieval_seconds": time.perf_counter() - start}
+        except Exception as e:
+            return {"row_id": row_id, "question": question, "config_key": self.config_key, "status": "failed",
+                    "error": f"retrieval: {type(e).__name__}: {e}",
+                    "retrieval_seconds": time.perf_counter() - start}
+
+    def _generate(self, batch):
+        start = time.perf_counter()
+        try:
+            answers = self.chat_model.generate_answers([self.build_prompt(item.pop("context"), item["question"])
+                                                        for item in batch], batch_size=self.batch_size)
+        except Exception as e:
+            for item in batch:
+                item.update(status="failed", error=f"generation: {type(e).__name__}: {e}")
+            return batch
+        elapsed = time.perf_counter() - start
+        for item, answer in zip(batch, answers):
+            item.update(status="ok", llm_answer=answer, generation_seconds=elapsed / len(batch))
+        return batch
+
+    def run(self, rows):
+        """
+        Evaluate an iterable of (row_id, question) pairs.
+
+        row_id must be JSON-serializable and stable across runs (e.g. the test CSV's index). Returns a summary
+        dict with ok / failed / skipped counts.
+        """
+        done = {row_id for row_id, record in read_checkpoint(self.checkpoint_path, self.config_key).items()
+                if record["status"] == "ok"}
+        summary = {"ok": 0, "failed": 0, "skipped": 0}
+        pending_rows = []
+        for row_id, question in rows:
+            if row_id in done:
+                summary["skipped"] += 1
+            else:
+                pending_rows.append((row_id, question))
+        pending_rows.reverse()  # popped from the end, so rows are submitted in their original order
+
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        def write(records, checkpoint):
+            for record in records:
+                checkpoint.write(json.dumps(record) + "\n")
+                summary[record["status"]] += 1
+            checkpoint.flush()
+
+        pool = ThreadPoolExecutor(max_workers=self.retrieval_workers)
+        in_flight = set()
+        retrieved = []
+        try:
+            with open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+                while pending_rows or in_flight or retrieved:
+                    while pending_rows and len(in_flight) + len(retrieved) < self.prefetch:
+                        in_flight.add(pool.submit(self._retrieve, *pending_rows.pop()))
+
+                    # Wait for retrieval only when there is not a full batch to generate yet
+                    if in_flight and len(retrieved) < self.batch_size:
+                        finished, in_flight = wait(in_flight, timeout=None if not retrieved else 0,
+                                                   return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            item = future.result()
+                            if item.get("status") == "failed":
+                                write([item], checkpoint)
+                            else:
+                                retrieved.append(item)
+                        if len(retrieved) < self.batch_size and (pending_rows or in_flight) and finished:
+                            continue
+
+                    if retrieved:
+                        batch, retrieved = retrieved[:self.batch_size], retrieved[self.batch_size:]
+                        write(self._generate(batch), checkpoint)
+                        print(f"Evaluated {summary['ok'] + summary['failed']} rows "
+                              f"({summary['failed']} failed, {summary['skipped']} skipped)")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return summary
@@ -0,0 +1,198 @@
+"""
+Batched LLM Chat Model
+
+This module holds CustomLLMChatModel, the wrapper '01_lora_and_rag_answer_generator.py' uses to generate answers
+with the LoRA fine-tuned model. It lives in its own module so the answer generator and the benchmarks can share it.
+
+Key Components:
+- CustomLLMChatModel.generate_answer: One prompt, one answer (same output as before).
+- CustomLLMChatModel.generate_answers: Many prompts at once. Prompts are tokenized once, sorted into buckets of
+  similar length, left-padded and generated with one 'model.generate' call per bucket. Answers come back in the
+  order of the input prompts.
+- build_rag_prompt: The context + question prompt of the test-set run.
+- StopOnSequences: Stopping criterion that ends a sequence as soon as its generated text contains a stop string.
+
+The model runs on whatever device it was loaded on (GPU, 'device_map="auto"', or CPU); nothing is hard-coded to CUDA.
+"""
+
+import torch
+import transformers
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+ANSWER_MARKER = "### ANSWER:"
+
+# The prompt used for the LoRA + RAG test-set run. The indentation is part of the prompt the model was evaluated
+# with, and '02_lora_and_rag_output_format.py' splits raw outputs on 'ANSWER:\n        \n        '.
+RAG_PROMPT_TEMPLATE = (
+    "\n        Context: The following API reference information has been retrieved based on the user's question. "
+    "Pay attention to function names, parameters, and any mentioned errors. Use this information to provide a "
+    "technically accurate answer.\n\n        Instructions: ONLY OUTPUT A ONE PARAGRAPH ANSWER.\n\n        "
+    "Retrieved API Information: {context}\n        \n        QUESTION: {question}\n        \n        ANSWER:\n        "
+)
+
+
+def build_rag_prompt(context, question):
+    return RAG_PROMPT_TEMPLATE.format(context=context, question=question)
+
+
+# From transformers 4.39 on, stopping criteria return one flag per sequence; before that a single bool
+_PER_SEQUENCE_STOPPING = tuple(int(part) for part in transformers.__version__.split(".")[:2]) >= (4, 39)
+
+
+class StopOnSequences(StoppingCriteria):
+    """Stop each sequence once the text generated after its prompt contains one of the stop strings."""
+
+    def __init__(self, tokenizer, stop_sequences, prompt_length, lookback_tokens=None):
+        self.tokenizer = tokenizer
+        self.stop_sequences = list(stop_sequences)
+        self.prompt_length = prompt_length
+        # Only the tail of the generated text has to be decoded to spot a newly completed stop string
+        self.lookback_tokens = lookback_tokens or max(len(tokenizer.encode(s, add_special_tokens=False))
+                                                      for s in self.stop_sequences) + 4
+        self.done = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.done is None:
+            self.done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        generated = input_ids[:, self.prompt_length:]
+        tails = self.tokenizer.batch_decode(generated[:, -self.lookback_tokens:], skip_special_tokens=True)
+        for row, tail in enumerate(tails):
+            if not self.done[row] and any(stop in tail for stop in self.stop_sequences):
+                self.done[row] = True
+        if _PER_SEQUENCE_STOPPING:
+            return self.done.clone()
+        return bool(self.done.all())
+
+
+def length_buckets(lengths, batch_size, max_batch_tokens=None):
+    """
+    Group indices into batches of similar length.
+
+    Indices are sorted by length, so each batch pads to the length of its own longest prompt. A batch is closed
+    when it holds batch_size prompts or when padding it further would exceed max_batch_tokens.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets, current = [], []
+    for i in order:
+        longest = max(lengths[i], lengths[current[-1]]) if current else lengths[i]
+        too_big = max_batch_tokens and current and longest * (len(current) + 1) > max_batch_tokens
+        if len(current) == batch_size or too_big:
+            buckets.append(current)
+            current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def truncate_at_stop(text, stop_sequences):
+    """Cut text at the first occurrence of any stop string."""
+    cut = len(text)
+    for stop in stop_sequences:
+        position = text.find(stop)
+        if position != -1:
+            cut = min(cut, position)
+    return text[:cut]
+
+
+class CustomLLMChatModel:
+    def __init__(self, model, tokenizer, device=None, max_new_tokens=500, stop_sequences=None,
+                 answer_marker=ANSWER_MARKER):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device if device is not None else model.device
+        self.max_new_tokens = max_new_tokens
+        self.stop_sequences = list(stop_sequences or [])
+        self.answer_marker = answer_marker
+        # Tokens actually generated so far (up to and including each answer's EOS), for throughput measurements
+        self.generated_tokens = 0
+        if self.tokenizer.pad_token is None:
+            # Llama tokenizers ship without a pad token; padded positions are masked out anyway
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model.eval()
+
+    def _generation_args(self, use_sampling, temperature, top_p, max_new_tokens):
+        args = {
+            "max_new_tokens": max_new_tokens or self.max_new_tokens,
+            "do_sample": use_sampling,
+            "pad_token_id": self.tokenizer.pad_token_id,
+        }
+        if use_sampling:
+            args.update(temperature=temperature, top_p=top_p)
+        return args
+
+    def _pad_left(self, token_lists):
+        width = max(len(ids) for ids in token_lists)
+        pad_id = self.tokenizer.pad_token_id
+        input_ids = torch.full((len(token_lists), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(token_lists), width), dtype=torch.long)
+        for row, ids in enumerate(token_lists):
+            input_ids[row, width - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, width - len(ids):] = 1
+        return input_ids.to(self.device), attention_mask.to(self.device)
+
+    def _prepare_bucket(self, token_lists):
+        """Model inputs for one bucket of tokenized prompts."""
+        input_ids, attention_mask = self._pad_left(token_lists)
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+    def _generated_length(self, generated):
+        # A row that finished early is padded up to the longest row of its batch
+        finished = (generated == self.tokenizer.eos_token_id).nonzero()
+        return int(finished[0, 0]) + 1 if len(finished) else len(generated)
+
+    def _decode(self, sequence, prompt_length, stop_sequences):
+        generated = sequence[prompt_length:]
+        if stop_sequences:
+            generated_text = self.tokenizer.decode(generated, skip_special_tokens=True)
+            if truncate_at_stop(generated_text, stop_sequences) != generated_text:
+                # Keep the fewest generated tokens whose text still reaches the stop string
+                low, high = 1, len(generated)
+                while low < high:
+                    middle = (low + high) // 2
+                    text = self.tokenizer.decode(generated[:middle], skip_special_tokens=True)
+                    if truncate_at_stop(text, stop_sequences) != text:
+                        high = middle
+                    else:
+                        low = middle + 1
+                generated = generated[:low]
+        raw_output = self.tokenizer.decode(sequence[:prompt_length].tolist() + generated.tolist(),
+                                           skip_special_tokens=True)
+        if stop_sequences:
+            # The stop string sits in the last decoded tokens; drop it and anything after it
+            cuts = [raw_output.rfind(stop) for stop in stop_sequences]
+            cuts = [cut for cut in cuts if cut != -1]
+            if cuts:
+                raw_output = raw_output[:min(cuts)]
+        return raw_output.split(self.answer_marker)[-1].strip()
+
+    def generate_answers(self, prompts, batch_size=8, max_batch_tokens=None, use_sampling=False, temperature=1.0,
+                         top_p=None, max_new_tokens=None, stop_sequences=None):
+        """
+        Generate answers for a list of prompts, batch_size prompts per 'model.generate' call.
+
+        Returns the answers in the same order as prompts.
+        """
+        stop_sequences = self.stop_sequences if stop_sequences is None else list(stop_sequences)
+        token_lists = self.tokenizer(list(prompts))["input_ids"]
+        lengths = [len(ids) for ids in token_lists]
+        generation_args = self._generation_args(use_sampling, temperature, top_p, max_new_tokens)
+
+        answers = [None] * len(token_lists)
+        for bucket in length_buckets(lengths, batch_size, max_batch_tokens):
+            model_inputs = self._prepare_bucket([token_lists[i] for i in bucket])
+            prompt_length = model_inputs["input_ids"].shape[1]
+            stopping = None
+            if stop_sequences:
+                stopping = StoppingCriteriaList([StopOnSequences(self.tokenizer, stop_sequences, prompt_length)])
+            with torch.no_grad():
+                outputs = self.model.generate(**model_inputs, stopping_criteria=stopping, **generation_args)
+            for row, i in enumerate(bucket):
+                self.generated_tokens += self._generated_length(outputs[row, prompt_length:])
+                answers[i] = self._decode(outputs[row].cpu(), prompt_length, stop_sequences)
+        return answers
+
+    def generate_answer(self, prompt, use_sampling=False, temperature=1.0, top_p=None, max_new_tokens=None,
+                        stop_sequences=None):
+        return self.generate_answers([prompt], batch_size=1, use_sampling=use_sampling, temperature=temperature,
+                                     top_p=top_p, max_new_tokens=max_new_tokens, stop_sequences=stop_sequences)[0]
@@ -0,0 +1,198 @@
+"""
+Merged LoRA Model Artifact
+
+Loading the test-set model used to mean downloading and quantizing Llama-2-7b and then wrapping it with
+'PeftModel.from_pretrained' on the checkpoint-500 adapter, minutes before the first answer. This module merges the
+adapter into the base weights once and writes the result as a single safetensors file that later runs memory-map.
+
+Key Components:
+- export_merged_model: Load base model + adapter, 'merge_and_unload', and write '<output_dir>/model.safetensors'
+  plus config.json and the tokenizer files. The safetensors file also stores the non-persistent buffers (e.g.
+  rotary embedding frequencies) so the loader never has to run the model's weight initialization.
+- load_merged_model: Build the model skeleton on the 'meta' device (no memory, no random init), memory-map the
+  safetensors file (mmap_safetensors) and assign its tensors to the model without copying them. Returns the
+  model, the tokenizer and a startup-time report.
+
+Usage:
+- python 08_Lora_and_Rag/merged_model.py export --base-model NousResearch/Llama-2-7b-hf \\
+      --adapter 08_Lora_and_Rag/00_trained_lora_model/lora_finetuning/llama2-7b-AmazonVPC-finetune/checkpoint-500 \\
+      --output 08_Lora_and_Rag/00_trained_lora_model/merged
+- python 08_Lora_and_Rag/merged_model.py load --output 08_Lora_and_Rag/00_trained_lora_model/merged
+
+The adapter is merged into full-precision (float16 by default) base weights: merging into 4-bit quantized weights
+would round the adapter away.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+
+import torch
+from safetensors.torch import save_file
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+
+WEIGHTS_NAME = "model.safetensors"
+BUFFER_PREFIX = "__buffer__."
+DTYPES = {"float16": torch.float16, "bfloat16": torch.bfloat16, "float32": torch.float32}
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def merge_adapter(base_model, adapter_path):
+    """Apply a LoRA adapter to a loaded base model and fold it into the base weights."""
+    from peft import PeftModel
+    return PeftModel.from_pretrained(base_model, adapter_path).merge_and_unload()
+
+
+def save_merged_model(model, tokenizer, output_dir):
+    """Write model weights and buffers to one safetensors file, plus config.json and the tokenizer."""
+    os.makedirs(output_dir, exist_ok=True)
+    tensors = {}
+    aliases = {}
+    seen = {}
+    for name, tensor in model.state_dict().items():
+        # Tied weights share storage; safetensors stores each tensor once and the loader re-ties them
+        key = (tensor.data_ptr(), tensor.shape, tensor.dtype)
+        if tensor.numel() and key in seen:
+            aliases[name] = seen[key]
+            continue
+        seen[key] = name
+        tensors[name] = tensor.detach().contiguous()
+    persistent = set(model.state_dict())
+    for name, buffer in model.named_buffers():
+        if name not in persistent:
+            tensors[BUFFER_PREFIX + name] = buffer.detach().clone().contiguous()
+
+    save_file(tensors, os.path.join(output_dir, WEIGHTS_NAME),
+              metadata={"format": "pt", "aliases": json.dumps(aliases)})
+    model.config.save_pretrained(output_dir)
+    if tokenizer is not None:
+        tokenizer.save_pretrained(output_dir)
+
+
+def export_merged_model(base_model_id, adapter_path, output_dir, dtype=torch.float16):
+    """Load base model + LoRA adapter, merge them and save the merged artifact to output_dir."""
+    start = time.perf_counter()
+    base_model = AutoModelForCausalLM.from_pretrained(base_model_id, torch_dtype=dtype, low_cpu_mem_usage=True)
+    tokenizer = AutoTokenizer.from_pretrained(base_model_id, add_bos_token=True)
+    merged = merge_adapter(base_model, adapter_path)
+    save_merged_model(merged, tokenizer, output_dir)
+    return time.perf_counter() - start
+
+
+def mmap_safetensors(path):
+    """
+    Map a safetensors file and return (tensors, metadata) without reading the tensor data.
+
+    Every tensor is a view of the mapping. The file is mapped copy-on-write, so the pages are shared with the OS page
+    cache (and with other processes that map the same file) until something writes to them.
+    """
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    (header_size,) = struct.unpack_from("<Q", mapping, 0)
+    header = json.loads(mapping[8:8 + header_size])
+    metadata = header.pop("__metadata__", {})
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        if count:
+            tensor = torch.frombuffer(mapping, dtype=dtype, count=count, offset=data_start + begin)
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        tensors[name] = tensor.reshape(info["shape"])
+    return tensors, metadata
+
+
+def _assign(model, name, tensor, buffer=False):
+    module_name, _, attr = name.rpartition(".")
+    module = model.get_submodule(module_name)
+    if buffer:
+        module._buffers[attr] = tensor
+    else:
+        module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+
+
+def load_merged_model(model_dir, device="cpu", load_tokenizer=True):
+    """
+    Memory-map a merged artifact written by save_merged_model.
+
+    On CPU the parameters stay backed by the mmap, so pages are read lazily from the OS page cache; on another
+    device they are copied there once. Returns (model, tokenizer, report), where report holds the time spent on
+    each startup step in seconds.
+    """
+    report = {}
+    start = time.perf_counter()
+    config = AutoConfig.from_pretrained(model_dir)
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config)
+    report["build_skeleton"] = time.perf_counter() - start
+
+    step = time.perf_counter()
+    weights_path = os.path.join(model_dir, WEIGHTS_NAME)
+    tensors, metadata = mmap_safetensors(weights_path)
+    aliases = json.loads(metadata.get("aliases", "{}"))
+    for name, tensor in tensors.items():
+        if name.startswith(BUFFER_PREFIX):
+            _assign(model, name[len(BUFFER_PREFIX):], tensor, buffer=True)
+        else:
+            _assign(model, name, tensor)
+    for name, target in aliases.items():
+        _assign(model, name, tensors[target])
+    report["map_weights"] = time.perf_counter() - step
+
+    missing = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+               if tensor.is_meta]
+    if missing:
+        raise ValueError(f"{weights_path} has no values for: {', '.join(missing)}")
+
+    step = time.perf_counter()
+    model = model.to(device).eval()
+    report["move_to_device"] = time.perf_counter() - step
+
+    tokenizer = None
+    if load_tokenizer:
+        step = time.perf_counter()
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        report["load_tokenizer"] = time.perf_counter() - step
+
+    report["total"] = time.perf_counter() - start
+    report["weights_bytes"] = os.path.getsize(weights_path)
+    return model, tokenizer, report
+
+
+def format_report(report):
+    steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report.items()
+                      if name not in ("total", "weights_bytes"))
+    return (f"Loaded {report['weights_bytes'] / 1e9:.2f} GB in {report['total']:.2f}s ({steps})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or load the merged LoRA model artifact.")
+    parser.add_argument("command", choices=["export", "load"])
+    parser.add_argument("--base-model", default="NousResearch/Llama-2-7b-hf")
+    parser.add_argument("--adapter", default="08_Lora_and_Rag/00_trained_lora_model/lora_finetuning/"
+                                             "llama2-7b-AmazonVPC-finetune/checkpoint-500")
+    parser.add_argument("--output", default="08_Lora_and_Rag/00_trained_lora_model/merged")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        seconds = export_merged_model(args.base_model, args.adapter, args.output, dtype=DTYPES[args.dtype])
+        print(f"Wrote merged model to {args.output} in {seconds:.1f}s")
+    else:
+        _, _, report = load_merged_model(args.output, device=args.device)
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
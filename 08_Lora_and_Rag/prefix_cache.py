@@ -0,0 +1,83 @@
+"""
+Prompt-Prefix KV Cache
+
+Every test-set prompt starts with the same instruction block ('Context: The following API reference information
+...'), so prefilling it again for every question is wasted work. PrefixCachedChatModel runs the model over that
+prefix once, keeps its key/value states and hands a copy of them to 'model.generate' for every bucket, so only the
+retrieved context, the question and the answer are computed per prompt.
+
+Key Components:
+- RAG_PROMPT_PREFIX: The static start of the test-set prompt (everything before the retrieved context).
+- PrefixCachedChatModel: CustomLLMChatModel whose buckets reuse the cached prefix. Batches are laid out as
+  [prefix | padding | rest of prompt], with the padding masked out, so one prefix cache expanded along the batch
+  dimension serves every row.
+
+Caching is exact at the token level: a prompt only uses the cache when its token IDs start with the cached prefix
+tokens, and anything else (including any bucket with such a prompt) is generated the normal way. The last token
+of the prefix string is left out of the cache because it can merge with the text that follows it.
+'bench_prefix_cache.py' checks that cached and uncached generation give the same answers.
+"""
+
+import copy
+
+import torch
+
+from llm_chat_model import RAG_PROMPT_TEMPLATE, CustomLLMChatModel
+
+RAG_PROMPT_PREFIX = RAG_PROMPT_TEMPLATE.split("{context}")[0]
+
+
+def expand_cache(cache, batch_size):
+    """Copy a batch-of-one KV cache and repeat it batch_size times along the batch dimension."""
+    if isinstance(cache, tuple):
+        # Legacy format: one (key, value) pair of [batch, heads, seq, dim] tensors per layer
+        return tuple(tuple(tensor.expand(batch_size, *tensor.shape[1:]).contiguous() for tensor in layer)
+                     for layer in cache)
+    cache = copy.deepcopy(cache)  # generate() appends to Cache objects in place
+    if batch_size > 1:
+        cache.batch_repeat_interleave(batch_size)
+    return cache
+
+
+class PrefixCachedChatModel(CustomLLMChatModel):
+    def __init__(self, model, tokenizer, prefix=RAG_PROMPT_PREFIX, **kwargs):
+        super().__init__(model, tokenizer, **kwargs)
+        self.prefix = prefix
+        prefix_ids = self.tokenizer(prefix)["input_ids"]
+        self.prefix_ids = prefix_ids[:-1]
+        self.prefix_cache = self._compute_prefix_cache()
+        self.stats = {"cached_prompts": 0, "uncached_prompts": 0}
+
+    def _compute_prefix_cache(self):
+        input_ids = torch.tensor([self.prefix_ids], dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            return self.model(input_ids=input_ids, use_cache=True).past_key_values
+
+    def _starts_with_prefix(self, ids):
+        n = len(self.prefix_ids)
+        # At least one token must follow the prefix: generate() needs new input to run the first step
+        return len(ids) > n and ids[:n] == self.prefix_ids
+
+    def _prepare_bucket(self, token_lists):
+        if not all(self._starts_with_prefix(ids) for ids in token_lists):
+            self.stats["uncached_prompts"] += len(token_lists)
+            return super()._prepare_bucket(token_lists)
+
+        n = len(self.prefix_ids)
+        width = max(len(ids) for ids in token_lists)
+        pad_id = self.tokenizer.pad_token_id
+        input_ids = torch.full((len(token_lists), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(token_lists), width), dtype=torch.long)
+        input_ids[:, :n] = torch.tensor(self.prefix_ids, dtype=torch.long)
+        attention_mask[:, :n] = 1
+        for row, ids in enumerate(token_lists):
+            rest = ids[n:]
+            input_ids[row, width - len(rest):] = torch.tensor(rest, dtype=torch.long)
+            attention_mask[row, width - len(rest):] = 1
+
+        self.stats["cached_prompts"] += len(token_lists)
+        return {
+            "input_ids": input_ids.to(self.device),
+            "attention_mask": attention_mask.to(self.device),
+            "past_key_values": expand_cache(self.prefix_cache, len(token_lists)),
+        }
@@ -0,0 +1,202 @@
+"""
+Speculative Decoding
+
+Greedy generation with the fine-tuned model costs one full forward pass of the big model per new token. With
+speculative decoding a small draft model proposes 'num_draft_tokens' tokens one at a time, and the fine-tuned
+(target) model checks all of them in a single forward pass. The longest prefix of the proposal that matches the
+target's own greedy choices is kept, plus the target's next token, so every target pass yields between 1 and
+num_draft_tokens + 1 tokens. The output is the target's greedy output; only the number of target passes changes.
+
+Key Components:
+- SpeculativeDecoder: The draft/verify loop for one prompt. Both models keep a KV cache; after each round the
+  caches are cropped back to the accepted tokens, so no token is ever recomputed.
+- build_layer_skip_draft: A draft that needs no extra weights: the target's embeddings, its first N decoder
+  layers, final norm and LM head, all shared with the target (no copy).
+- SpeculativeChatModel: CustomLLMChatModel whose greedy answers are generated speculatively, one prompt at a
+  time. Sampling requests fall back to the batched path. Acceptance statistics accumulate in 'stats'.
+
+The draft must use the target's tokenizer (for Llama-2-7b: a layer-skip draft, or a small Llama-2-tokenizer model
+such as TinyLlama). Verification runs several tokens through the target at once instead of one, so logits can
+differ from one-token steps in the last floating-point bits; 'bench_speculative_decoding.py' checks that the
+answers match plain greedy generation.
+"""
+
+import copy
+
+import torch
+from torch import nn
+
+from llm_chat_model import CustomLLMChatModel, truncate_at_stop
+
+
+def crop_cache(cache, length):
+    """Drop every cached position from 'length' on."""
+    if hasattr(cache, "crop"):
+        # A negative argument removes that many positions in every transformers version; a positive one meant
+        # "crop to this length" before 5.0 and is rejected since then
+        excess = cache_length(cache) - length
+        if excess > 0:
+            cache.crop(-excess)
+        return cache
+    # Legacy format: one (key, value) pair of [batch, heads, seq, dim] tensors per layer
+    return tuple(tuple(tensor[:, :, :length] for tensor in layer) for layer in cache)
+
+
+def cache_length(cache):
+    if cache is None:
+        return 0
+    if hasattr(cache, "get_seq_length"):
+        return cache.get_seq_length()
+    return cache[0][0].shape[2]
+
+
+def build_layer_skip_draft(model, num_layers):
+    """
+    A draft model made of the target's first num_layers decoder layers.
+
+    Embeddings, layers, final norm and LM head are the target's own modules, so the draft costs no memory; only
+    the module containers and the config are new.
+    """
+    base = model.get_base_model() if hasattr(model, "get_base_model") else model  # unwrap a PeftModel
+    decoder = base.model
+    if not 0 < num_layers < len(decoder.layers):
+        raise ValueError(f"num_layers must be between 1 and {len(decoder.layers) - 1}")
+    config = copy.deepcopy(base.config)
+    config.num_hidden_layers = num_layers
+
+    draft_decoder = copy.copy(decoder)
+    draft_decoder._modules = dict(decoder._modules)
+    draft_decoder._modules["layers"] = nn.ModuleList(list(decoder.layers)[:num_layers])
+    draft_decoder.config = config
+    draft = copy.copy(base)
+    draft._modules = dict(base._modules)
+    draft._modules["model"] = draft_decoder
+    draft.config = config
+    return draft
+
+
+class SpeculativeDecoder:
+    def __init__(self, target, draft, num_draft_tokens=4, device=None):
+        self.target = target
+        self.draft = draft
+        self.num_draft_tokens = num_draft_tokens
+        self.device = device if device is not None else target.device
+
+    def _forward(self, model, token_ids, cache):
+        input_ids = torch.tensor([token_ids], dtype=torch.long, device=self.device)
+        output = model(input_ids=input_ids, past_key_values=cache, use_cache=True)
+        return output.logits[0], output.past_key_values
+
+    @torch.no_grad()
+    def generate(self, prompt_ids, max_new_tokens, eos_token_id=None, should_stop=None):
+        """
+        Greedily generate up to max_new_tokens tokens after prompt_ids.
+
+        Stops after an EOS token or once should_stop(generated_ids) is true. Returns (generated_ids, stats).
+        """
+        stats = {"target_passes": 0, "draft_passes": 0, "proposed": 0, "accepted": 0}
+        tokens = list(prompt_ids)
+        prompt_length = len(tokens)
+
+        # Prefill both models; the target's last logits give the first new token
+        logits, target_cache = self._forward(self.target, tokens, None)
+        stats["target_passes"] += 1
+        _, draft_cache = self._forward(self.draft, tokens, None)
+        stats["draft_passes"] += 1
+        tokens.append(int(logits[-1].argmax()))
+
+        def finished():
+            generated = tokens[prompt_length:]
+            return (len(generated) >= max_new_tokens
+                    or (eos_token_id is not None and generated[-1] == eos_token_id)
+                    or (should_stop is not None and should_stop(generated)))
+
+        while not finished():
+            # Draft: feed whatever the draft has not cached yet, then propose one token per pass
+            k = min(self.num_draft_tokens, max_new_tokens - (len(tokens) - prompt_length))
+            proposal = []
+            pending = tokens[cache_length(draft_cache):]
+            for _ in range(k):
+                draft_logits, draft_cache = self._forward(self.draft, pending, draft_cache)
+                stats["draft_passes"] += 1
+                proposal.append(int(draft_logits[-1].argmax()))
+                pending = proposal[-1:]
+
+            # Verify: one target pass over the last accepted token and the whole proposal
+            base = len(tokens)
+            logits, target_cache = self._forward(self.target, tokens[cache_length(target_cache):] + proposal,
+                                                 target_cache)
+            stats["target_passes"] += 1
+            choices = logits[-(k + 1):].argmax(dim=-1).tolist()
+            accepted = 0
+            while accepted < k and proposal[accepted] == choices[accepted]:
+                if eos_token_id is not None and proposal[accepted] == eos_token_id:
+                    break
+                accepted += 1
+            stats["proposed"] += k
+            stats["accepted"] += accepted
+            # The accepted draft tokens, then the target's own token at the first disagreement (or after the end)
+            tokens.extend(proposal[:accepted])
+            tokens.append(choices[accepted])
+
+            # Keep only the cache entries of tokens that were accepted; the newest token is fed next round
+            target_cache = crop_cache(target_cache, base + accepted)
+            draft_cache = crop_cache(draft_cache, min(cache_length(draft_cache), base + accepted))
+
+        generated = tokens[prompt_length:][:max_new_tokens]
+        if eos_token_id is not None and eos_token_id in generated:
+            generated = generated[:generated.index(eos_token_id) + 1]
+        stats["new_tokens"] = len(generated)
+        return generated, stats
+
+
+class SpeculativeChatModel(CustomLLMChatModel):
+    def __init__(self, model, tokenizer, draft_model=None, draft_layers=None, num_draft_tokens=4, **kwargs):
+        super().__init__(model, tokenizer, **kwargs)
+        if draft_model is None:
+            if draft_layers is None:
+                raise ValueError("Pass a draft_model or the number of target layers to draft with (draft_layers)")
+            draft_model = build_layer_skip_draft(model, draft_layers)
+        draft_model.eval()
+        self.decoder = SpeculativeDecoder(model, draft_model, num_draft_tokens=num_draft_tokens, device=self.device)
+        self.stats = {"answers": 0, "target_passes": 0, "draft_passes": 0, "proposed": 0, "accepted": 0,
+                      "new_tokens": 0}
+
+    def acceptance_rate(self):
+        return self.stats["accepted"] / self.stats["proposed"] if self.stats["proposed"] else 0.0
+
+    def tokens_per_target_pass(self):
+        return self.stats["new_tokens"] / self.stats["target_passes"] if self.stats["target_passes"] else 0.0
+
+    def _stop_check(self, stop_sequences):
+        if not stop_sequences:
+            return None
+        lookback = max(len(self.tokenizer.encode(s, add_special_tokens=False)) for s in stop_sequences) + 4
+
+        def should_stop(generated):
+            # Several tokens can be accepted per round, so look back over the whole round
+            tail = self.tokenizer.decode(generated[-(lookback + self.decoder.num_draft_tokens):],
+                                         skip_special_tokens=True)
+            return truncate_at_stop(tail, stop_sequences) != tail
+
+        return should_stop
+
+    def generate_answers(self, prompts, batch_size=8, max_batch_tokens=None, use_sampling=False, temperature=1.0,
+                         top_p=None, max_new_tokens=None, stop_sequences=None):
+        """Greedy answers are generated speculatively, one prompt at a time; batch_size only applies to sampling."""
+        if use_sampling:
+            return super().generate_answers(prompts, batch_size=batch_size, max_batch_tokens=max_batch_tokens,
+                                            use_sampling=True, temperature=temperature, top_p=top_p,
+                                            max_new_tokens=max_new_tokens, stop_sequences=stop_sequences)
+        stop_sequences = self.stop_sequences if stop_sequences is None else list(stop_sequences)
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        answers = []
+        for ids in self.tokenizer(list(prompts))["input_ids"]:
+            generated, stats = self.decoder.generate(ids, max_new_tokens, eos_token_id=self.tokenizer.eos_token_id,
+                                                     should_stop=self._stop_check(stop_sequences))
+            for key, value in stats.items():
+                self.stats[key] += value
+            self.stats["answers"] += 1
+            self.generated_tokens += len(generated)
+            answers.append(self._decode(torch.tensor(ids + generated), len(ids), stop_sequences))
+        return answers
@@ -0,0 +1,100 @@
+"""
+Tiny Local Models
+
+Small, randomly initialized Llama models and a tokenizer trained on the local chunk corpus. They have the same
+architecture and generation code path as Llama-2-7b but load in milliseconds on a CPU, so the generation code in
+this folder can be benchmarked and checked without downloading weights or owning a GPU. Their answers are noise;
+only speed and equivalence between code paths are meaningful.
+
+Key Components:
+- load_corpus_texts: Chunk texts from the packed chunk archive (or any list of strings).
+- build_tiny_tokenizer: Byte-level BPE tokenizer trained on those texts, wrapped as a PreTrainedTokenizerFast.
+- build_tiny_llama: LlamaForCausalLM with a handful of small layers, seeded so every run builds the same weights.
+- train_tiny_llama: A few hundred next-token steps on the corpus, for benchmarks whose speed depends on what the
+  model predicts (speculative decoding needs a draft that agrees with the target now and then).
+"""
+
+import os
+import sys
+
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ARCHIVE = os.path.join(REPO_ROOT, "06_Data", "Capstone_Data", "chunks.pack")
+
+
+def load_corpus_texts(archive_path=DEFAULT_ARCHIVE, limit=None):
+    """Read chunk texts from the packed chunk archive."""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from retrieval.chunk_archive import ChunkArchive
+
+    with ChunkArchive(archive_path) as archive:
+        count = len(archive) if limit is None else min(limit, len(archive))
+        return [archive[i] for i in range(count)]
+
+
+def build_tiny_tokenizer(texts, vocab_size=2000):
+    """Train a byte-level BPE tokenizer with Llama-style <s>, </s> and <unk> tokens."""
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=vocab_size, special_tokens=["<unk>", "<s>", "</s>"],
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet(), show_progress=False)
+    tokenizer.train_from_iterator(texts, trainer=trainer)
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>",
+                                   unk_token="<unk>")
+
+
+def build_tiny_llama(tokenizer, hidden_size=128, num_layers=4, num_heads=4, intermediate_size=344,
+                     max_position_embeddings=2048, seed=0):
+    """Build a small LlamaForCausalLM for the given tokenizer."""
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=intermediate_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=num_heads,
+        num_key_value_heads=num_heads,
+        max_position_embeddings=max_position_embeddings,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.eos_token_id,
+    )
+    return LlamaForCausalLM(config).eval()
+
+
+def train_tiny_llama(model, tokenizer, texts, steps=300, seq_len=64, batch_size=16, lr=3e-3, early_exit_layer=None,
+                     seed=0):
+    """
+    Train the model as a language model on random windows of the tokenized texts.
+
+    With early_exit_layer, the hidden state after that many decoder layers is also passed through the final norm
+    and LM head and trained on the same targets, so the model's first layers alone make a usable (layer-skip) draft.
+    Returns the model (back in eval mode) and the last step's loss.
+    """
+    token_ids = []
+    for ids in tokenizer(list(texts))["input_ids"]:
+        token_ids.extend(ids + [tokenizer.eos_token_id])
+    data = torch.tensor(token_ids)
+    generator = torch.Generator().manual_seed(seed)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    loss_fn = torch.nn.CrossEntropyLoss()
+
+    model.train()
+    for _ in range(steps):
+        starts = torch.randint(0, len(data) - seq_len - 1, (batch_size,), generator=generator)
+        windows = torch.stack([data[start:start + seq_len + 1] for start in starts])
+        inputs, targets = windows[:, :-1], windows[:, 1:].flatten()
+        output = model(input_ids=inputs, output_hidden_states=early_exit_layer is not None)
+        loss = loss_fn(output.logits.flatten(0, 1), targets)
+        if early_exit_layer is not None:
+            exit_logits = model.lm_head(model.model.norm(output.hidden_states[early_exit_layer]))
+            loss = loss + loss_fn(exit_logits.flatten(0, 1), targets)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    return model.eval(), loss.item()
@@ -0,0 +1,263 @@
+"""
+Scoring Engine
+
+Importable, incremental version of 'score.ipynb'. It scores every model's answers against the reference answers
+with BLEU, ROUGE-L and BERTScore and writes the same 'score_by_answer.csv' and 'score_by_model.csv' files.
+
+Key Components:
+- load_answer_table: Joins the model output CSVs in data/ side by side, as the notebook did.
+- ScoreCache: JSONL file of per-row scores keyed by a hash of (metric settings, prediction, reference). Only rows
+  that are new or whose answers changed are ever scored; everything else is read back from the cache.
+- ScoringEngine: Loads each 'evaluate' metric once. BLEU and ROUGE for the uncached rows run on a process pool
+  (each worker loads the two metrics once in its initializer); BERTScore runs in the main process as one batched
+  call over all uncached rows instead of one model call per row.
+
+Scores are identical to the notebook's, including its argument order: per-answer scores pass the reference answer
+as 'predictions' and the model answer as 'references', while the model-level BLEU and ROUGE use the model answers
+as predictions.
+
+Usage:
+- python 10_Test_and_Score/scoring/scoring.py [--data-dir 10_Test_and_Score/scoring/data --workers 4 --no-bert]
+- To score a new model, add '<name>_output_test.csv' (question, answer, <name>_answer) to data/ and rerun.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CACHE_NAME = "score_cache.jsonl"
+ANSWER_SUFFIX = "_answer"
+BERT_METRICS = ["bert_precision", "bert_recall", "bert_f1"]
+# Display names used in the output files
+MODEL_NAMES = {"llm": "lora", "llm_rag": "rag_lora", "rag": "rag"}
+MODEL_ORDER = ["rag", "lora", "rag_lora"]
+
+
+def _load_metric(name):
+    from evaluate import load
+    return load(name)
+
+
+def load_answer_table(data_dir=DATA_DIR):
+    """Place every model output CSV in data_dir side by side (rows are aligned by position)."""
+    files = sorted(file for file in os.listdir(data_dir) if file.endswith(".csv")
+                   # score files are outputs, samples.csv is the demo subset
+                   and not file.startswith("score_by") and file != "samples.csv")
+    dataframes = [pd.read_csv(os.path.join(data_dir, file)).reset_index(drop=True) for file in files]
+    df = pd.concat(dataframes, axis=1)
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+def model_types_of(df):
+    return [col[:-len(ANSWER_SUFFIX)] for col in df.columns if col.endswith(ANSWER_SUFFIX) and col != "answer"]
+
+
+def _hash(*parts):
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """Append-only JSONL store of scores keyed by a content hash."""
+
+    def __init__(self, path):
+        self.path = path
+        self._scores = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn final line from an interrupted run
+                    self._scores[record["key"]] = record["scores"]
+
+    def get(self, key):
+        return self._scores.get(key)
+
+    def put_many(self, items):
+        """Store an iterable of (key, scores) pairs and append them to the file."""
+        items = list(items)
+        if not items:
+            return
+        with open(self.path, "a", encoding="utf-8") as file:
+            for key, scores in items:
+                self._scores[key] = scores
+                file.write(json.dumps({"key": key, "scores": scores}) + "\n")
+
+    def __len__(self):
+        return len(self._scores)
+
+
+# Per-process metrics for the n-gram pool, loaded once by the initializer
+_worker = {}
+
+
+def _init_ngram_worker():
+    os.environ.setdefault("HF_TQDM", "false")
+    _worker["bleu"] = _load_metric("bleu")
+    _worker["rouge"] = _load_metric("rouge")
+
+
+def _ngram_scores(bleu, rouge, prediction, reference):
+    return {
+        "bleu": bleu.compute(predictions=[prediction], references=[[reference]])["bleu"],
+        "rouge": rouge.compute(predictions=[prediction], references=[reference], rouge_types=["rougeL"])["rougeL"],
+    }
+
+
+def _score_ngram_in_worker(pair):
+    return _ngram_scores(_worker["bleu"], _worker["rouge"], *pair)
+
+
+class ScoringEngine:
+    def __init__(self, cache_path, workers=None, bert=True, bert_batch_size=32,
+                 bert_model_type="distilbert-base-uncased", lang="en", min_rows_for_pool=32):
+        self.cache = ScoreCache(cache_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.bert = bert
+        self.bert_batch_size = bert_batch_size
+        self.bert_model_type = bert_model_type
+        self.lang = lang
+        self.min_rows_for_pool = min_rows_for_pool
+        self._metrics = {}
+        self.stats = {"cached": 0, "scored": 0}
+
+    def metric(self, name):
+        """Load an 'evaluate' metric the first time it is needed and keep it for the life of the engine."""
+        if name not in self._metrics:
+            self._metrics[name] = _load_metric(name)
+        return self._metrics[name]
+
+    def _ngram_key(self, prediction, reference):
+        return _hash("bleu+rougeL", prediction, reference)
+
+    def _bert_key(self, prediction, reference):
+        return _hash("bertscore", self.bert_model_type, self.lang, prediction, reference)
+
+    def _score_ngram_misses(self, pairs):
+        if len(pairs) >= self.min_rows_for_pool and self.workers > 1:
+            with Pool(processes=self.workers, initializer=_init_ngram_worker) as pool:
+                return pool.map(_score_ngram_in_worker, pairs, chunksize=max(1, len(pairs) // (4 * self.workers)))
+        # Too few rows to pay for starting workers that each load the metrics
+        return [_ngram_scores(self.metric("bleu"), self.metric("rouge"), *pair) for pair in pairs]
+
+    def _score_bert_misses(self, pairs):
+        data = self.metric("bertscore").compute(predictions=[p for p, _ in pairs], references=[r for _, r in pairs],
+                                                lang=self.lang, model_type=self.bert_model_type,
+                                                batch_size=self.bert_batch_size)
+        return [{"bert_precision": p, "bert_recall": r, "bert_f1": f}
+                for p, r, f in zip(data["precision"], data["recall"], data["f1"])]
+
+    def _score_with_cache(self, pairs, key_of, score_misses):
+        keys = [key_of(*pair) for pair in pairs]
+        missing = {}
+        for key, pair in zip(keys, pairs):
+            if self.cache.get(key) is None and key not in missing:
+                missing[key] = pair
+        if missing:
+            self.cache.put_many(zip(missing, score_misses(list(missing.values()))))
+        self.stats["scored"] += len(missing)
+        self.stats["cached"] += len(pairs) - len(missing)
+        return [self.cache.get(key) for key in keys]
+
+    def score_pairs(self, pairs):
+        """Score (prediction, reference) pairs; returns one dict of metric -> score per pair."""
+        pairs = [("" if pd.isna(p) else str(p), "" if pd.isna(r) else str(r)) for p, r in pairs]
+        ngram_scores = self._score_with_cache(pairs, self._ngram_key, self._score_ngram_misses)
+        results = [dict(scores) for scores in ngram_scores]
+        if self.bert:
+            for result, scores in zip(results, self._score_with_cache(pairs, self._bert_key,
+                                                                     self._score_bert_misses)):
+                result.update(scores)
+        return results
+
+    def score_answers(self, df, model_types=None):
+        """Per-answer scores: adds '<model>_bleu', '<model>_rouge' and '<model>_bert_*' columns."""
+        df = df.copy()
+        model_types = model_types or model_types_of(df)
+        # Score all models in one batch so the pool and the BERT model are started once
+        pairs = [(answer, model_answer) for mt in model_types
+                 for answer, model_answer in zip(df["answer"], df[f"{mt}{ANSWER_SUFFIX}"])]
+        scores = self.score_pairs(pairs)
+        for i, mt in enumerate(model_types):
+            block = pd.DataFrame(scores[i * len(df):(i + 1) * len(df)], index=df.index)
+            for metric in block.columns:
+                df[f"{mt}_{metric}"] = block[metric]
+        return df
+
+    def _corpus_scores(self, predictions, references):
+        key = _hash("corpus bleu+rougeL", predictions, references)
+        scores = self.cache.get(key)
+        if scores is None:
+            scores = {
+                "bleu": self.metric("bleu").compute(predictions=predictions,
+                                                    references=[[r] for r in references])["bleu"],
+                "rouge": self.metric("rouge").compute(predictions=predictions, references=references,
+                                                      rouge_types=["rougeL"])["rougeL"],
+            }
+            self.cache.put_many([(key, scores)])
+        return scores
+
+    def score_models(self, scored_df, model_types=None):
+        """Model-level scores: corpus BLEU and ROUGE-L, and the mean of the per-answer BERTScores."""
+        model_types = model_types or model_types_of(scored_df)
+        references = scored_df["answer"].fillna("").astype(str).tolist()
+        rows = []
+        for mt in model_types:
+            predictions = scored_df[f"{mt}{ANSWER_SUFFIX}"].fillna("").astype(str).tolist()
+            row = {"model_type": mt, **self._corpus_scores(predictions, references)}
+            for metric in BERT_METRICS:
+                if f"{mt}_{metric}" in scored_df:
+                    row[metric] = scored_df[f"{mt}_{metric}"].mean()
+            rows.append(row)
+        score_df = pd.DataFrame(rows).set_index("model_type")
+        score_df = score_df[sorted(score_df.columns)]
+        score_df.index = [MODEL_NAMES.get(mt, mt) for mt in score_df.index]
+        order = [name for name in MODEL_ORDER if name in score_df.index]
+        order += [name for name in score_df.index if name not in order]
+        return score_df.reindex(order).rename_axis("model_type")
+
+
+def score_directory(data_dir=DATA_DIR, **engine_kwargs):
+    """Score every model output in data_dir and write score_by_answer.csv and score_by_model.csv next to them."""
+    engine = ScoringEngine(os.path.join(data_dir, CACHE_NAME), **engine_kwargs)
+    df = load_answer_table(data_dir)
+    model_types = model_types_of(df)
+    scored = engine.score_answers(df, model_types)
+    score_df = engine.score_models(scored, model_types)
+
+    by_answer = scored.copy()
+    # update column header: replace all llm with lora
+    by_answer.columns = by_answer.columns.str.replace("llm", "lora")
+    by_answer.to_csv(os.path.join(data_dir, "score_by_answer.csv"), index=False)
+    score_df.reset_index().to_csv(os.path.join(data_dir, "score_by_model.csv"), index=False)
+    return scored, score_df, engine.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score model answers with BLEU, ROUGE-L and BERTScore.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Folder with the '<model>_output_test.csv' files")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for BLEU/ROUGE (default: all cores)")
+    parser.add_argument("--bert-batch-size", type=int, default=32)
+    parser.add_argument("--bert-model-type", default="distilbert-base-uncased")
+    parser.add_argument("--no-bert", action="store_true", help="Skip BERTScore")
+    args = parser.parse_args()
+
+    os.environ.setdefault("HF_TQDM", "false")
+    start = time.perf_counter()
+    _, score_df, stats = score_directory(args.data_dir, workers=args.workers, bert=not args.no_bert,
+                                         bert_batch_size=args.bert_batch_size,
+                                         bert_model_type=args.bert_model_type)
+    print(score_df.to_string())
+    print(f"Scored {stats['scored']} new pairs, reused {stats['cached']} cached in "
+          f"{time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
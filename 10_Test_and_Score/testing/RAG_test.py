@@ -1,21 +1,15 @@
+import argparse
+import functools
 import openai
-import pinecone
 from dotenv import load_dotenv
 import os
 
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain.vectorstores import Pinecone
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.chat_models import ChatOpenAI
-
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 
-# Download required NLTK resources
-nltk.download('punkt')
-nltk.download('stopwords')
+from rag_eval_runner import (BackendLimiter, FakeChatModel, FakeEmbedder, FakeVectorStore, RagEvaluationRunner,
+                             RagPipeline, format_summary)
 
 # Load variables
 load_dotenv()
@@ -36,21 +30,42 @@ ans_template = """
 """
 
 
+@functools.lru_cache(maxsize=None)
+def get_backends():
+    """Pinecone session, embeddings, vector store and chat model, created on first use instead of at import."""
+    import pinecone
+    from langchain.vectorstores import Pinecone
+    from langchain.embeddings.openai import OpenAIEmbeddings
+    from langchain.chat_models import ChatOpenAI
+
+    pinecone.init(api_key=pinecone_key, environment=environment)
+    embeddings = OpenAIEmbeddings(openai_api_key=openai.api_key)
+    vector_db = Pinecone.from_existing_index(index_name=index_name, embedding=embeddings)
+    llm = ChatOpenAI(temperature=0, model_name=model_name, openai_api_key=openai.api_key)
+    return embeddings, vector_db, llm
+
 
-# Initialize pinecone session
-pinecone.init(api_key=pinecone_key, environment=environment)
-index = pinecone.Index(index_name)
+@functools.lru_cache(maxsize=None)
+def get_assistant():
+    """LangChain RetrievalQA pipeline, created on first use."""
+    from langchain.chains import RetrievalQA
+    from langchain.prompts import PromptTemplate
 
+    _, vector_db, llm = get_backends()
+    vector_db_retriever = vector_db.as_retriever()
+    prompt_for_chain = PromptTemplate(template = ans_template, input_variables = ["context", "question"])
+    return RetrievalQA.from_chain_type(llm = llm,
+                                       retriever = vector_db_retriever,
+                                       chain_type = "stuff",
+                                       chain_type_kwargs = {"prompt": prompt_for_chain})
 
-# Set up langchain pipeline
-vector_db = Pinecone.from_existing_index(index_name=index_name, embedding=OpenAIEmbeddings(openai_api_key=openai.api_key))
-vector_db_retriever = vector_db.as_retriever()
-prompt_for_chain = PromptTemplate(template = ans_template, input_variables = ["context", "question"])
-llm = ChatOpenAI(temperature=0, model_name=model_name, openai_api_key=openai.api_key)
-assistant = RetrievalQA.from_chain_type(llm = llm,
-                                        retriever = vector_db_retriever,
-                                        chain_type = "stuff",
-                                        chain_type_kwargs = {"prompt": prompt_for_chain})
+
+@functools.lru_cache(maxsize=None)
+def ensure_nltk_resources():
+    # Download required NLTK resources (once per process)
+    nltk.download('punkt', quiet=True)
+    nltk.download('stopwords', quiet=True)
+    return set(stopwords.words('english'))
 
 
 ### TESTING
@@ -66,7 +81,7 @@ def extract_keywords(query):
     list: A list of extracted key terms.
     """
     # Tokenize the query and remove stopwords
-    stop_words = set(stopwords.words('english'))
+    stop_words = ensure_nltk_resources()
     words = word_tokenize(query)
     filtered_words = [word for word in words if word not in stop_words]
 
@@ -104,18 +119,72 @@ def get_assistant_response(user_query):
     refined_query = construct_query(user_query)
 
     # Use the refined query in the assistant's run method
-    return assistant.run(refined_query)
-
-
-import pandas as pd
-
-# Read CSV file
-df = pd.read_csv("test.csv")
-
-print('data length: ', len(df))
-
-# Generate LLM answers for each question
-df['rag_answer'] = df['question'].apply(get_assistant_response)
-
-# Save the new DataFrame to a CSV file
-df.to_csv("rag_output_test.csv", index=False)
+    return get_assistant().run(refined_query)
+
+
+
+def build_pipeline(fake=False, refine=True, llm_rpm=None, embedding_rpm=None, vector_store_rpm=None,
+                   max_llm_calls=None):
+    """RAG pipeline with the same prompt, retriever (top 4) and model as get_assistant, one limiter per backend."""
+    limiters = {
+        "embedding": BackendLimiter(embedding_rpm),
+        "vector_store": BackendLimiter(vector_store_rpm),
+        "llm": BackendLimiter(llm_rpm, max_concurrent=max_llm_calls),
+    }
+    if fake:
+        import pandas as pd
+        texts = pd.read_csv("test.csv")['answer'].tolist()
+        embedder = FakeEmbedder()
+        # Indexing the answers is setup, not part of any question: only the query embeddings pay the latency
+        store = FakeVectorStore(texts, embedder=FakeEmbedder(latency=0, dimensions=embedder.dimensions))
+        backends = (embedder, store, FakeChatModel())
+        config = {"backend": "fake"}
+    else:
+        backends = get_backends()
+        config = {"backend": "openai+pinecone", "index_name": index_name, "model_name": model_name,
+                  "temperature": 0}
+    return RagPipeline(*backends, template=ans_template, config=config,
+                       refine_query=construct_query if refine else None, top_k=4, limiters=limiters)
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Generate RAG answers for the test set.")
+    parser.add_argument("--input", default="test.csv")
+    parser.add_argument("--output", default="rag_output_test.csv")
+    parser.add_argument("--cache", default="rag_eval_cache.jsonl",
+                        help="Answer cache and checkpoint; questions already answered with the same setup are skipped")
+    parser.add_argument("--workers", type=int, default=8, help="Questions in flight")
+    parser.add_argument("--llm-rpm", type=int, default=3500)
+    parser.add_argument("--embedding-rpm", type=int, default=3000)
+    parser.add_argument("--vector-store-rpm", type=int, default=None)
+    parser.add_argument("--max-llm-calls", type=int, default=None, help="Cap on concurrent chat completions")
+    parser.add_argument("--fake", action="store_true", help="Use local fake backends instead of OpenAI and Pinecone")
+    parser.add_argument("--no-refine", action="store_true", help="Skip the NLTK keyword query refinement")
+    args = parser.parse_args()
+
+    # Read CSV file
+    df = pd.read_csv(args.input)
+
+    print('data length: ', len(df))
+
+    # lru_cache does not stop several worker threads from running the first call (and the downloads) at once,
+    # so the NLTK resources are fetched here, before the runner starts its threads
+    if not args.no_refine:
+        ensure_nltk_resources()
+
+    # Generate LLM answers for every question, several at a time
+    pipeline = build_pipeline(fake=args.fake, refine=not args.no_refine, llm_rpm=args.llm_rpm,
+                              embedding_rpm=args.embedding_rpm, vector_store_rpm=args.vector_store_rpm,
+                              max_llm_calls=args.max_llm_calls)
+    runner = RagEvaluationRunner(pipeline, args.cache, max_workers=args.workers)
+    df['rag_answer'], summary = runner.run(df['question'])
+    print(format_summary(summary))
+
+    # Save the new DataFrame to a CSV file
+    df.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
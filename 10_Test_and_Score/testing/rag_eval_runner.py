@@ -0,0 +1,276 @@
+"""
+Concurrent RAG Evaluation Runner
+
+Evaluates the RAG pipeline of 'RAG_test.py' over a whole test set with many questions in flight, instead of one
+blocking 'assistant.run' per row.
+
+Key Components:
+- RagPipeline: The RetrievalQA "stuff" chain split into its three backend calls, each behind its own limiter:
+  embed the (refined) query, search the vector store, fill the prompt with the retrieved documents and ask the
+  chat model. Backends are duck-typed on the LangChain interfaces ('embed_query',
+  'similarity_search_by_vector_with_score', 'predict'), so OpenAI/Pinecone objects and the fakes below are
+  interchangeable. LangChain's Pinecone store only implements the '_with_score' variant of the by-vector search.
+- BackendLimiter: Requests-per-minute token bucket plus a cap on concurrent calls, one per backend.
+- ResultCache: JSONL file of answers keyed by a hash of (question, pipeline configuration). It is also the
+  progress checkpoint: every answer is appended as soon as it is ready, and reruns skip questions whose key is
+  already answered. Changing the model, prompt, top-k, ... changes the key, so those questions are asked again.
+- RagEvaluationRunner: Bounded thread pool over the questions; returns answers in input order and a latency
+  summary (per question and per stage: mean, p50, p90, p99, max).
+- FakeEmbedder / FakeVectorStore / FakeChatModel: Deterministic local backends with configurable latency, for
+  running the whole evaluation offline.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DOCUMENT_SEPARATOR = "\n\n"  # what the RetrievalQA "stuff" chain puts between retrieved documents
+
+
+class BackendLimiter:
+    """Rate limit (requests per minute) and concurrency cap for one backend."""
+
+    def __init__(self, requests_per_minute=None, max_concurrent=None):
+        self.rpm = requests_per_minute
+        self._tokens = float(requests_per_minute or 0)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    def _acquire_token(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rpm, self._tokens + (now - self._last) * self.rpm / 60.0)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * 60.0 / self.rpm
+            time.sleep(wait)
+
+    def call(self, func, *args, **kwargs):
+        if self.rpm:
+            self._acquire_token()
+        if self._slots is None:
+            return func(*args, **kwargs)
+        with self._slots:
+            return func(*args, **kwargs)
+
+
+class RagPipeline:
+    def __init__(self, embedder, vector_store, llm, template, config, refine_query=None, top_k=4, limiters=None):
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.llm = llm
+        self.template = template
+        self.refine_query = refine_query
+        self.top_k = top_k
+        limiters = limiters or {}
+        self.limiters = {name: limiters.get(name) or BackendLimiter() for name in ("embedding", "vector_store", "llm")}
+        # Everything that changes the answer for a given question
+        self.config = dict(config, template=template, top_k=top_k, refine_query=bool(refine_query))
+        self.config_key = hashlib.sha256(json.dumps(self.config, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def answer(self, question):
+        """Return (answer, per-stage latencies in seconds) for one question."""
+        timings = {}
+        query = self.refine_query(question) if self.refine_query else question
+
+        start = time.perf_counter()
+        vector = self.limiters["embedding"].call(self.embedder.embed_query, query)
+        timings["embedding"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = self.limiters["vector_store"].call(self.vector_store.similarity_search_by_vector_with_score, vector,
+                                                  k=self.top_k)
+        documents = [document for document, _ in hits]
+        timings["vector_store"] = time.perf_counter() - start
+
+        # RetrievalQA passes the refined query as the question, so the prompt does too
+        prompt = self.template.format(context=DOCUMENT_SEPARATOR.join(doc.page_content for doc in documents),
+                                      question=query)
+        start = time.perf_counter()
+        answer = self.limiters["llm"].call(self.llm.predict, prompt)
+        timings["llm"] = time.perf_counter() - start
+        return answer, timings
+
+
+class ResultCache:
+    """Answers keyed by (question, pipeline configuration), appended to a JSONL file as they arrive."""
+
+    def __init__(self, path):
+        self.path = path
+        self._records = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn final line from an interrupted run
+                    if record.get("status") == "ok":
+                        self._records[record["key"]] = record
+
+    @staticmethod
+    def key(question, config_key):
+        return hashlib.sha256(f"{config_key}\n{question}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self._records.get(key)
+
+    def append(self, record):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+            if record["status"] == "ok":
+                self._records[record["key"]] = record
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_summary(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": _percentile(values, 50),
+        "p90": _percentile(values, 90),
+        "p99": _percentile(values, 99),
+        "max": max(values),
+    }
+
+
+class RagEvaluationRunner:
+    def __init__(self, pipeline, cache_path, max_workers=8):
+        self.pipeline = pipeline
+        self.cache = ResultCache(cache_path)
+        self.max_workers = max_workers
+
+    def _evaluate(self, key, question):
+        start = time.perf_counter()
+        record = {"key": key, "question": question, "config_key": self.pipeline.config_key}
+        try:
+            answer, timings = self.pipeline.answer(question)
+            record.update(status="ok", answer=answer, stages=timings)
+        except Exception as e:
+            record.update(status="failed", error=f"{type(e).__name__}: {e}")
+        record.update(latency=time.perf_counter() - start, completed_at=time.time())
+        self.cache.append(record)
+        return record
+
+    def run(self, questions):
+        """
+        Answer a list of questions. Returns (answers, summary).
+
+        answers is in the order of questions (None where a question failed); summary holds counts, wall time and
+        latency statistics for the questions answered in this run.
+        """
+        questions = list(questions)
+        keys = [ResultCache.key(question, self.pipeline.config_key) for question in questions]
+        answers = [None] * len(questions)
+        summary = {"answered": 0, "cached": 0, "failed": 0}
+        records = []
+
+        todo = {}
+        for i, (key, question) in enumerate(zip(keys, questions)):
+            cached = self.cache.get(key)
+            if cached is not None:
+                answers[i] = cached["answer"]
+                summary["cached"] += 1
+            else:
+                todo.setdefault(key, (question, []))[1].append(i)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._evaluate, key, question): positions
+                       for key, (question, positions) in todo.items()}
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                records.append(record)
+                if record["status"] == "ok":
+                    summary["answered"] += 1
+                    for i in futures[future]:
+                        answers[i] = record["answer"]
+                else:
+                    summary["failed"] += 1
+                    print(f"Failed: {record['question'][:60]}... ({record['error']})")
+                print(f"[{done}/{len(futures)}] {record['latency']:.2f}s {record['question'][:60]}")
+
+        ok = [record for record in records if record["status"] == "ok"]
+        summary["wall_seconds"] = time.perf_counter() - start
+        summary["latency"] = latency_summary([record["latency"] for record in ok])
+        summary["stages"] = {stage: latency_summary([record["stages"][stage] for record in ok])
+                             for stage in ("embedding", "vector_store", "llm")}
+        return answers, summary
+
+
+def format_summary(summary):
+    lines = [f"Answered {summary['answered']}, reused {summary['cached']} cached, failed {summary['failed']} "
+             f"in {summary['wall_seconds']:.2f}s"]
+    for name, stats in [("question", summary["latency"])] + list(summary["stages"].items()):
+        if stats["count"]:
+            lines.append(f"  {name:12s} mean {stats['mean']:.3f}s  p50 {stats['p50']:.3f}s  "
+                         f"p90 {stats['p90']:.3f}s  p99 {stats['p99']:.3f}s  max {stats['max']:.3f}s")
+    return "\n".join(lines)
+
+
+class _Document:
+    def __init__(self, page_content):
+        self.page_content = page_content
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-words embedding with a fixed delay per call."""
+
+    def __init__(self, latency=0.05, dimensions=64):
+        self.latency = latency
+        self.dimensions = dimensions
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        vector = [0.0] * self.dimensions
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimensions] += 1.0
+        return vector
+
+
+class FakeVectorStore:
+    """In-memory store of texts, searched by dot product with the FakeEmbedder vectors."""
+
+    def __init__(self, texts, latency=0.05, embedder=None):
+        self.latency = latency
+        embedder = embedder or FakeEmbedder(latency=0)
+        self._texts = list(texts)
+        self._vectors = [embedder.embed_query(text) for text in self._texts]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, **kwargs):
+        time.sleep(self.latency)
+        scores = [sum(a * b for a, b in zip(embedding, vector)) for vector in self._vectors]
+        best = sorted(range(len(scores)), key=lambda i: -scores[i])[:k]
+        return [(_Document(self._texts[i]), scores[i]) for i in best]
+
+
+class FakeChatModel:
+    """Chat model stand-in that answers after a fixed delay with a digest of the prompt."""
+
+    def __init__(self, latency=0.5):
+        self.latency = latency
+
+    def predict(self, text):
+        time.sleep(self.latency)
+        return f"Fake answer {hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}"
@@ -0,0 +1,163 @@
+"""
+Admission Control
+
+Keeps the chat service responsive when a backend slows down. Without it every Flask worker blocks inside
+'assistant.run()' with no timeout, requests pile up and latency grows without limit.
+
+Key Components:
+- Deadline: Time budget of one request, checked by every stage.
+- AdmissionController: At most 'max_in_flight' requests are processed at once and at most 'max_queue' more wait
+  for a slot (each no longer than its deadline). Anything beyond that is shed immediately with Overloaded, which
+  carries a Retry-After estimate from the recent service time.
+- BackendGate: Concurrency limit per backend (retriever, LLM). Calls run on the gate's own threads and the caller
+  waits only until its deadline; a call that times out keeps its slot until the backend actually returns, so a
+  hung backend can never have more than 'max_concurrent' calls outstanding.
+- format_degraded_answer: Fast-path reply built from the retrieved documents (snippets and links) for requests
+  whose deadline does not leave time for the LLM ('deadline') or whose LLM call failed ('error').
+
+Usage:
+- admission = AdmissionController(max_in_flight=8, max_queue=16)
+- with admission.admit(deadline): docs = retriever_gate.call(retriever.get_relevant_documents, q, deadline=deadline)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Request shed by admission control; retry_after is in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=8, max_queue=16, min_retry_after=1):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.min_retry_after = min_retry_after
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        # Moving average of how long an admitted request holds its slot
+        self._service_seconds = 1.0
+        self.stats = {"admitted": 0, "shed": 0, "timed_out_in_queue": 0}
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: the queue ahead drained at the current service rate."""
+        backlog = (self._waiting + 1) / max(1, self.max_in_flight)
+        return max(self.min_retry_after, int(round(backlog * self._service_seconds + 0.5)))
+
+    @contextmanager
+    def admit(self, deadline):
+        """Hold a processing slot for the request, waiting in the bounded queue up to its deadline."""
+        with self._condition:
+            if self._in_flight >= self.max_in_flight:
+                if self._waiting >= self.max_queue:
+                    self.stats["shed"] += 1
+                    raise Overloaded("Too many requests in the queue", self.retry_after())
+                self._waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self._in_flight < self.max_in_flight,
+                                                        timeout=deadline.remaining())
+                finally:
+                    self._waiting -= 1
+                if not admitted:
+                    self.stats["timed_out_in_queue"] += 1
+                    raise Overloaded("Request deadline passed while queued", self.retry_after())
+            self._in_flight += 1
+            self.stats["admitted"] += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * (time.monotonic() - start)
+                self._condition.notify()
+
+    def status(self):
+        with self._condition:
+            return dict(self.stats, in_flight=self._in_flight, waiting=self._waiting,
+                        max_in_flight=self.max_in_flight, max_queue=self.max_queue,
+                        service_seconds=round(self._service_seconds, 3))
+
+
+class BackendGate:
+    def __init__(self, name, max_concurrent):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=f"backend-{name}")
+        self.stats = {"calls": 0, "timeouts": 0, "busy": 0, "errors": 0}
+
+    def call(self, func, *args, deadline, **kwargs):
+        """Run func within the deadline; raises DeadlineExceeded if no slot frees up or the call is too slow."""
+        if not self._slots.acquire(timeout=deadline.remaining()):
+            self.stats["busy"] += 1
+            raise DeadlineExceeded(f"No free {self.name} slot before the deadline")
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is returned when the backend call finishes, not when the caller stops waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        self.stats["calls"] += 1
+        try:
+            return future.result(timeout=deadline.remaining())
+        except FutureTimeoutError:
+            self.stats["timeouts"] += 1
+            raise DeadlineExceeded(f"{self.name} did not answer before the deadline") from None
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+
+DEGRADED_REASONS = {
+    "deadline": "The assistant is under heavy load and could not write a full answer in time.",
+    "error": "The assistant's language model is unavailable right now, so it could not write a full answer.",
+}
+
+
+def format_degraded_answer(documents, max_snippets=3, snippet_chars=300, reason="deadline"):
+    """
+    Reply with the top retrieved snippets and their links instead of an LLM answer.
+
+    reason ('deadline' or 'error') picks the explanation given to the user.
+    """
+    if reason not in DEGRADED_REASONS:
+        raise ValueError(f"Unknown reason {reason!r}; expected one of {sorted(DEGRADED_REASONS)}")
+    if not documents:
+        return f"{DEGRADED_REASONS[reason]} No matching documentation was found either. Please try again shortly."
+    lines = [f"{DEGRADED_REASONS[reason]} These documentation passages look most relevant to your question:"]
+    for number, document in enumerate(documents[:max_snippets], start=1):
+        text = document.page_content
+        # Stored chunks look like 'SOURCE LINK: <link> CONTENT: <text>'
+        if "CONTENT: " in text:
+            text = text.split("CONTENT: ", 1)[1]
+        text = " ".join(text.split())
+        if len(text) > snippet_chars:
+            text = text[:snippet_chars].rsplit(" ", 1)[0] + " ..."
+        link = document.metadata.get("link", "")
+        lines.append(f"{number}. {text}" + (f" (Source: {link})" if link else ""))
+    return "\n\n".join(lines)
@@ -1,6 +1,8 @@
 import openai
 import pinecone
 from dotenv import load_dotenv
+import hmac
+import logging
 import os
 
 from langchain.chains import RetrievalQA
@@ -9,6 +11,15 @@ from langchain.vectorstores import Pinecone
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.chat_models import ChatOpenAI
 
+from admission_control import (AdmissionController, BackendGate, Deadline, DeadlineExceeded, Overloaded,
+                               format_degraded_answer)
+from retrieval.adaptive_topk import AdaptiveTopK
+from retrieval.faq_index import DEFAULT_THRESHOLD, FAQIndex, format_faq_answer
+from retrieval.langchain_retriever import ScatterGatherRetriever, ScoredVectorStoreRetriever, SnapshotRetriever
+from retrieval.scatter_gather import DEFAULT_INDEX_DIR, ScatterGatherClient, load_query_embedder
+from retrieval.shards import load_query_router
+from retrieval.snapshots import SnapshotManager
+
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
@@ -31,6 +42,48 @@ openai.api_key = os.getenv("OPENAI_KEY")
 index_name = "document-embeddings"
 environment = "gcp-starter"
 model_name = "gpt-3.5-turbo-16k"
+# Versioned index snapshots (retrieval/snapshots.py). When set, they replace the Pinecone index and new versions
+# can be swapped in at runtime through /admin/index
+snapshot_dir = os.getenv("INDEX_SNAPSHOT_DIR")
+# The /admin routes are disabled unless ADMIN_TOKEN is set
+admin_token = os.getenv("ADMIN_TOKEN")
+# Scatter-gather shard workers (retrieval/scatter_gather.py), as comma-separated host:port addresses. When set,
+# queries fan out to every worker and a shard that does not answer within SHARD_TIMEOUT seconds is left out
+shard_workers = [address for address in os.getenv("SHARD_WORKERS", "").split(",") if address.strip()]
+shard_index_dir = os.getenv("SHARD_INDEX_DIR", DEFAULT_INDEX_DIR)
+shard_timeout = float(os.getenv("SHARD_TIMEOUT", "0.5"))
+# Query router (retrieval/shards.py) for the Pinecone index, from shards built with 'python -m retrieval.shards
+# --embedder openai'. When set, each query only searches the doc type / service partitions it is routed to
+shard_router_dir = os.getenv("SHARD_ROUTER_DIR")
+# Precomputed answers to the generated QA pairs (python -m retrieval.faq_index build); a question this similar to a
+# stored one is answered from the index without retrieval or an LLM call. Off unless FAQ_INDEX_DIR is set (e.g. to
+# 06_Data/Capstone_Data/faq_index), and check the threshold with 'python -m retrieval.faq_index evaluate' first
+faq_index_dir = os.getenv("FAQ_INDEX_DIR")
+faq_threshold = float(os.getenv("FAQ_THRESHOLD", DEFAULT_THRESHOLD))
+# Admission control (admission_control.py): a request gets this many seconds end to end; with less than
+# min_llm_seconds left after retrieval it is answered with the retrieved snippets instead of waiting for the LLM
+request_deadline_seconds = float(os.getenv("REQUEST_DEADLINE_SECONDS", "20"))
+min_llm_seconds = float(os.getenv("MIN_LLM_SECONDS", "3"))
+admission = AdmissionController(max_in_flight=int(os.getenv("MAX_IN_FLIGHT", "8")),
+                                max_queue=int(os.getenv("MAX_QUEUE", "16")))
+backends = {"retriever": BackendGate("retriever", int(os.getenv("RETRIEVER_MAX_CONCURRENT", "8"))),
+            "llm": BackendGate("llm", int(os.getenv("LLM_MAX_CONCURRENT", "4")))}
+# Adaptive top-k (retrieval/adaptive_topk.py): RETRIEVAL_POOL_SIZE candidates are fetched and cut where their scores
+# fall off, keeping between RETRIEVAL_MIN_K and RETRIEVAL_MAX_K chunks within RETRIEVAL_MAX_TOKENS of context. The
+# adaptive defaults (pool of 10, 1 to 4 chunks) are tuned for the local hashing embedder of the snapshot and shard
+# indexes. ada-002 cosine scores sit in a narrow high band, so on Pinecone they would keep all 4 chunks while fetching
+# 10: there the default is a plain top 4 (pool of 4) until 'python -m retrieval.adaptive_topk tune --embedder openai'
+# has been run and its chosen values are set here
+adaptive_defaults = bool(shard_workers or snapshot_dir)
+retrieval_max_k = int(os.getenv("RETRIEVAL_MAX_K", "4"))
+retrieval_max_tokens = os.getenv("RETRIEVAL_MAX_TOKENS")
+retrieval_policy = AdaptiveTopK(min_k=int(os.getenv("RETRIEVAL_MIN_K", 1 if adaptive_defaults else retrieval_max_k)),
+                                max_k=retrieval_max_k,
+                                pool_size=int(os.getenv("RETRIEVAL_POOL_SIZE",
+                                                        10 if adaptive_defaults else retrieval_max_k)),
+                                method=os.getenv("RETRIEVAL_METHOD", "relative"),
+                                threshold=float(os.getenv("RETRIEVAL_THRESHOLD", "0.65")),
+                                max_tokens=int(retrieval_max_tokens) if retrieval_max_tokens else None)
 # ans_template = """
 #     Use the following pieces of context to answer the question at the end.
 #     Pay attention to the tone of the question and use it to determine the 
@@ -54,16 +107,34 @@ ans_template = """
 
 
 
-# Initialize pinecone session
-pinecone.init(api_key=pinecone_key, environment=environment)
-index = pinecone.Index(index_name)
+faq_index = FAQIndex.load(faq_index_dir, threshold=faq_threshold) if faq_index_dir else None
+
+snapshot_manager = None
+if shard_workers:
+    shard_client = ScatterGatherClient(shard_workers, timeout=shard_timeout)
+    vector_db_retriever = ScatterGatherRetriever(client=shard_client, embedder=load_query_embedder(shard_index_dir),
+                                                 k=retrieval_policy.pool_size)
+elif snapshot_dir:
+    snapshot_manager = SnapshotManager(snapshot_dir)
+    snapshot_manager.load(wait=True)
+    vector_db_retriever = SnapshotRetriever(manager=snapshot_manager, k=retrieval_policy.pool_size)
+else:
+    # Initialize pinecone session
+    pinecone.init(api_key=pinecone_key, environment=environment)
+    index = pinecone.Index(index_name)
+
+    vector_db = Pinecone.from_existing_index(index_name=index_name, embedding=OpenAIEmbeddings(openai_api_key=openai.api_key))
+    router = load_query_router(shard_router_dir) if shard_router_dir else None
+    vector_db_retriever = ScoredVectorStoreRetriever(vectorstore=vector_db, k=retrieval_policy.pool_size,
+                                                     router=router)
 
 
 # Set up langchain pipeline
-vector_db = Pinecone.from_existing_index(index_name=index_name, embedding=OpenAIEmbeddings(openai_api_key=openai.api_key))
-vector_db_retriever = vector_db.as_retriever()
 prompt_for_chain = PromptTemplate(template = ans_template, input_variables = ["context", "question"])
-llm = ChatOpenAI(temperature=0, model_name=model_name, openai_api_key=openai.api_key)
+# No client-side retries: a retry after a slow or failed call would outlive the request deadline, and a failed call
+# is answered with the retrieved snippets instead
+llm = ChatOpenAI(temperature=0, model_name=model_name, openai_api_key=openai.api_key,
+                 request_timeout=request_deadline_seconds, max_retries=0)
 assistant = RetrievalQA.from_chain_type(llm = llm,
                                         retriever = vector_db_retriever,
                                         chain_type = "stuff",
@@ -106,21 +177,63 @@ def construct_query(user_query):
     return refined_query
 
 # Function Definitions
-def get_assistant_response(user_query):
+def get_assistant_response(user_query, deadline=None, max_tokens=None):
     """
     Query the chatbot assistant and get a response.
 
     Parameters:
     - user_query (str): The query to pass to the assistant.
+    - deadline (Deadline): Time budget of the request; defaults to REQUEST_DEADLINE_SECONDS from now.
+    - max_tokens (int): Context token limit of this request, on top of RETRIEVAL_MAX_TOKENS.
 
     Returns:
-    str: The assistant's response to the query.
+    dict: 'response' with the assistant's answer and 'degraded', which is True when the answer is the top retrieved
+    snippets (with their links in 'sources') because the LLM could not answer before the deadline or failed; then
+    'reason' is 'deadline' or 'error'.
     """
+    deadline = deadline or Deadline(request_deadline_seconds)
     # Refine the user's query using the construct_query function
     refined_query = construct_query(user_query)
 
-    # Use the refined query in the assistant's run method
-    return assistant.run(refined_query)
+    # The two steps of assistant.run(refined_query), each behind its backend's concurrency limit and the deadline
+    documents = backends["retriever"].call(vector_db_retriever.get_relevant_documents, refined_query,
+                                           deadline=deadline)
+    # Only as many of the candidates as their scores justify go into the prompt
+    documents = retrieval_policy.select_documents(documents, max_tokens=max_tokens)
+    reason = "deadline"
+    if deadline.remaining() >= min_llm_seconds:
+        try:
+            answer = backends["llm"].call(assistant.combine_documents_chain.run, input_documents=documents,
+                                          question=refined_query, deadline=deadline)
+            return {"response": answer, "degraded": False}
+        except DeadlineExceeded:
+            pass
+        except Exception:
+            # Rate limits, API errors, connection resets: the retrieved snippets are still a useful answer
+            logging.exception("LLM call failed; answering with the retrieved snippets")
+            reason = "error"
+    return {"response": format_degraded_answer(documents, reason=reason), "degraded": True, "reason": reason,
+            "sources": [document.metadata.get("link") for document in documents]}
+
+def get_faq_response(user_query):
+    """
+    Answer from the FAQ index if the question closely matches a stored one.
+
+    Returns:
+    dict or None: 'response' with the stored answer and its source link, or None when there is no confident match.
+    """
+    match = faq_index.match(user_query) if faq_index is not None else None
+    if match is None:
+        return None
+    return {"response": format_faq_answer(match), "degraded": False, "faq": True, "sources": [match.url]}
+
+def service_unavailable(retry_after, error):
+    """503 with a Retry-After header; 'response' is shown in the chat window."""
+    response = jsonify(response=f"The assistant is handling too many requests. Please try again in {retry_after} "
+                                f"seconds.", error=error)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
 
 app = Flask(__name__)
 
@@ -128,10 +241,63 @@ app = Flask(__name__)
 def index():
     if request.method == 'POST':
         user_query = request.get_json().get('query')
-        response = get_assistant_response(user_query)
-        return jsonify(response=response)
+        max_tokens = request.get_json().get('max_context_tokens')
+        # FAQ hits take well under a millisecond, so they skip admission control altogether
+        faq_response = get_faq_response(user_query)
+        if faq_response is not None:
+            return jsonify(**faq_response)
+        deadline = Deadline(request_deadline_seconds)
+        try:
+            with admission.admit(deadline):
+                result = get_assistant_response(user_query, deadline,
+                                                max_tokens if isinstance(max_tokens, int) else None)
+        except Overloaded as e:
+            return service_unavailable(e.retry_after, str(e))
+        except DeadlineExceeded as e:
+            # Not even the documents could be retrieved in time
+            return service_unavailable(admission.retry_after(), str(e))
+        return jsonify(**result)
     return render_template('index.html')
 
+def admin_denied():
+    """
+    Error response for an admin call, or None if it may proceed.
+
+    The admin routes are off (404) unless ADMIN_TOKEN is set, and then need a matching X-Admin-Token header (401).
+    """
+    if not admin_token:
+        return jsonify(error='Admin routes are disabled; set ADMIN_TOKEN'), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return jsonify(error='unauthorized'), 401
+    return None
+
+@app.route('/admin/load', methods=['GET'])
+def admin_load():
+    """Report admission control counters (in flight, queued, shed) and per-backend call statistics."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify(admission=admission.status(), backends={name: gate.stats for name, gate in backends.items()})
+
+@app.route('/admin/index', methods=['GET', 'POST'])
+def admin_index():
+    """
+    GET: report the active index snapshot version and any load in progress.
+    POST {"version": optional}: load that version (default: newest) in the background and swap it in when ready.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    if snapshot_manager is None:
+        return jsonify(error='Index snapshots are not enabled; set INDEX_SNAPSHOT_DIR'), 404
+    if request.method == 'POST':
+        version = (request.get_json(silent=True) or {}).get('version')
+        if version and version not in snapshot_manager.versions():
+            return jsonify(error=f'Unknown snapshot version {version}'), 404
+        started = snapshot_manager.load(version)
+        return jsonify(started=started, **snapshot_manager.status()), 202 if started else 409
+    return jsonify(snapshot_manager.status())
+
 if __name__ == "__main__":
     app.run(debug=True)
 
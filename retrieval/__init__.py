@@ -0,0 +1,14 @@
+"""
+Retrieval components shared by the embedding scripts and the chat service.
+
+- chunk_archive: memory-mapped archive of the chunked documentation corpus.
+- embedders: local hashing TF-IDF and OpenAI embedders with a LangChain-style interface.
+- indexes: exact, IVF, BM25, hybrid, hierarchical and cached chunk indexes behind one search interface.
+- shards: per doc type / service index shards and the query router that picks which ones to search.
+- snapshots: versioned index snapshots and the manager that hot-swaps them in the running service.
+- scatter_gather: N shard worker processes and the client that fans queries out to them and merges the results.
+- langchain_retriever: LangChain retrievers over the active snapshot or the shard workers.
+- faq_index: nearest-question index over the generated QA pairs, for answering common questions directly.
+- adaptive_topk: cuts the retrieved candidates where their scores fall off, within min/max k and a token budget.
+- benchmark: recall@k / MRR / latency / memory / build time of every index on the test QA pairs.
+"""
@@ -0,0 +1,245 @@
+"""
+Adaptive Top-k
+
+Retrieval used to hand the LLM a fixed number of chunks (LangChain's default of 4 in the chat service, top_k=3 in
+the LoRA answer generator), so a question with one obviously right chunk paid for context it did not need and a
+vague one got too little. AdaptiveTopK fetches a candidate pool and cuts it where the relevance scores fall off.
+
+Key Components:
+- AdaptiveTopK: The cut policy, one of three methods:
+  - 'relative': keep the chunks scoring at least 'threshold' times the best score (for positive similarity
+    scores such as cosine).
+  - 'gap': keep the chunks before the largest drop between neighbouring scores, if that drop is at least
+    'threshold' of the pool's score range; without such a drop the scores are flat and max_k chunks are kept.
+  - 'elbow': keep the chunks before the point farthest below the straight line from the best to the worst score.
+  'gap' and 'elbow' only look at the shape of the scores, so they also work for BM25 or fused ranks.
+  The cut is kept within [min_k, max_k], then chunks are dropped from the end until their estimated tokens fit
+  'max_tokens' (per policy or per call); the best chunk is always kept.
+- select / select_documents: Apply the policy to any hits with scores, or to LangChain documents carrying a 'score'
+  in their metadata (as returned by the retrievers in 'retrieval.langchain_retriever').
+- evaluate / tune: Offline tuning on QA pairs with a 'URL' column, as in 'retrieval.benchmark': a question counts
+  as covered when a kept chunk comes from its page. Settings are tuned on the generated QA pairs (fewest context
+  tokens with at least the coverage of the fixed k baseline) and then reported on the held-out test pairs next to
+  fixed k. Results are written to '<output-dir>/adaptive_topk_<embedder>.json'. Scores depend on the embedder, so
+  tune with the one the service uses.
+
+Usage:
+- python -m retrieval.adaptive_topk tune   (local hashing embedder, works offline)
+- python -m retrieval.adaptive_topk tune --embedder openai --baseline-k 3
+- policy = AdaptiveTopK(max_tokens=1500); documents = policy.select_documents(documents)
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from retrieval.benchmark import DEFAULT_OUTPUT_DIR, Corpus, make_embedder
+from retrieval.chunk_archive import DEFAULT_DATA_DIR
+from retrieval.embedders import cached_embeddings
+from retrieval.indexes import ExactIndex
+
+QA_DIR = os.path.join(DEFAULT_DATA_DIR, "documentation_qa_datasets")
+DEFAULT_TUNE_CSV = os.path.join(QA_DIR, "Final_Question_Answer_Pairs.csv")
+DEFAULT_EVAL_CSV = os.path.join(QA_DIR, "Final_FILTERED_TEST_Question_Answer_Pairs.csv")
+METHODS = ["relative", "gap", "elbow"]
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+class AdaptiveTopK:
+    def __init__(self, min_k=1, max_k=4, pool_size=10, method="relative", threshold=0.65, max_tokens=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}; expected one of {METHODS}")
+        if not 1 <= min_k <= max_k <= pool_size:
+            raise ValueError("Expected 1 <= min_k <= max_k <= pool_size")
+        self.min_k = min_k
+        self.max_k = max_k
+        self.pool_size = pool_size
+        self.method = method
+        self.threshold = threshold
+        self.max_tokens = max_tokens
+
+    def settings(self):
+        return {"min_k": self.min_k, "max_k": self.max_k, "pool_size": self.pool_size, "method": self.method,
+                "threshold": self.threshold, "max_tokens": self.max_tokens}
+
+    def cut(self, scores):
+        """Number of hits to keep from scores sorted best first, before the token budget."""
+        scores = np.asarray(scores, dtype=np.float64)[:self.pool_size]
+        n = len(scores)
+        if n <= self.min_k:
+            return n
+        upper = min(self.max_k, n)
+        spread = scores[0] - scores[-1]
+        if spread <= 0:
+            return upper
+        if self.method == "relative":
+            return int(np.clip((scores >= self.threshold * scores[0]).sum(), self.min_k, upper))
+        normalized = (scores - scores[-1]) / spread
+        if self.method == "gap":
+            # drops[k] is the drop right after the k-th hit; keeping k hits cuts there
+            drops = np.concatenate([[0.0], normalized[:-1] - normalized[1:]])
+            k = self.min_k + int(np.argmax(drops[self.min_k:min(upper, n - 1) + 1]))
+            return k if drops[k] >= self.threshold else upper
+        # Elbow: the first hit of the flat tail is the one farthest below the best-to-worst line
+        distance = (1.0 - np.arange(n) / (n - 1)) - normalized
+        return int(np.clip(np.argmax(distance), self.min_k, upper))
+
+    def select(self, hits, scores, token_counts=None, max_tokens=None):
+        """
+        The hits to keep, best first.
+
+        hits and scores are sorted best first. The token budget (the smaller of max_tokens and the policy's own)
+        needs token_counts, one per hit.
+        """
+        k = self.cut(scores)
+        budgets = [budget for budget in (max_tokens, self.max_tokens) if budget is not None]
+        if budgets and token_counts is not None:
+            used = 0
+            for i, count in enumerate(token_counts[:k]):
+                used += count
+                if used > min(budgets) and i > 0:
+                    k = i
+                    break
+        return list(hits[:k])
+
+    def select_documents(self, documents, max_tokens=None):
+        """Cut LangChain documents with a 'score' in their metadata."""
+        return self.select(documents, [document.metadata["score"] for document in documents],
+                           [estimate_tokens(document.page_content) for document in documents], max_tokens=max_tokens)
+
+
+def load_questions(qa_csv, corpus, exclude=()):
+    """Questions whose page is in the corpus (minus the excluded ones), with the chunk IDs of their page."""
+    qa = pd.read_csv(qa_csv).dropna(subset=["Question", "URL"])
+    qa = qa[qa["URL"].isin(corpus.chunks_by_link) & ~qa["Question"].isin(set(exclude))]
+    qa = qa.drop_duplicates("Question")
+    return qa["Question"].astype(str).tolist(), [corpus.chunks_by_link[url] for url in qa["URL"]]
+
+
+def search_pools(index, embedder, questions, pool_size):
+    """(chunk IDs, scores) of the best pool_size chunks per question."""
+    return [index.search(vector, pool_size, query_text=question)
+            for question, vector in zip(questions, embedder.embed_documents(questions))]
+
+
+def evaluate(policy, pools, relevant, token_counts, max_tokens=None):
+    """
+    Metrics of one policy (or a fixed k, given as an int) over precomputed pools:
+    - coverage: share of questions with at least one kept chunk from their page.
+    - mean_k / mean_tokens / p90_tokens: chunks kept and their estimated context tokens per question.
+    """
+    kept_counts, tokens, covered = [], [], 0
+    for (ids, scores), targets in zip(pools, relevant):
+        ids = [int(chunk_id) for chunk_id in ids]
+        if isinstance(policy, int):
+            kept = ids[:policy]
+        else:
+            kept = policy.select(ids, scores, [token_counts[i] for i in ids], max_tokens=max_tokens)
+        kept_counts.append(len(kept))
+        tokens.append(sum(token_counts[i] for i in kept))
+        covered += any(chunk_id in targets for chunk_id in kept)
+    return {"coverage": covered / len(pools), "mean_k": float(np.mean(kept_counts)),
+            "mean_tokens": float(np.mean(tokens)), "p90_tokens": float(np.percentile(tokens, 90))}
+
+
+def candidate_policies(pool_size, max_ks, thresholds):
+    """Every combination of min_k (1 or 2), max_k, method and that method's thresholds."""
+    for max_k in max_ks:
+        for min_k in range(1, min(max_k, 2) + 1):
+            yield AdaptiveTopK(min_k, max_k, pool_size, method="elbow")
+            for method in ("relative", "gap"):
+                for threshold in thresholds[method]:
+                    yield AdaptiveTopK(min_k, max_k, pool_size, method=method, threshold=threshold)
+
+
+def tune(corpus, vectors, embedder, tune_csv, eval_csv, baseline_k=4, pool_size=10, max_ks=(3, 4, 5, 6, 8),
+         thresholds=None, max_tokens=None):
+    """
+    Grid-search policies on the tune_csv questions and report the chosen one on the eval_csv questions.
+
+    The chosen policy has the fewest mean context tokens among those covering at least as many tune questions as a
+    fixed baseline_k (or, if none does, the best coverage). Returns the results dict written by 'main'.
+    """
+    thresholds = thresholds or {"relative": (0.5, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9),
+                                "gap": (0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5)}
+    index = ExactIndex(vectors)
+    token_counts = np.asarray([estimate_tokens(text) for text in corpus.texts])
+    eval_questions, eval_relevant = load_questions(eval_csv, corpus)
+    tune_questions, tune_relevant = load_questions(tune_csv, corpus, exclude=eval_questions)
+    tune_pools = search_pools(index, embedder, tune_questions, pool_size)
+    eval_pools = search_pools(index, embedder, eval_questions, pool_size)
+
+    baseline = evaluate(baseline_k, tune_pools, tune_relevant, token_counts)
+    grid = []
+    for policy in candidate_policies(pool_size, max_ks, thresholds):
+        grid.append({**policy.settings(), **evaluate(policy, tune_pools, tune_relevant, token_counts, max_tokens)})
+    eligible = [row for row in grid if row["coverage"] >= baseline["coverage"]]
+    if eligible:
+        best = min(eligible, key=lambda row: (row["mean_tokens"], -row["coverage"]))
+    else:
+        # Nothing keeps the baseline's coverage (e.g. under a tight token budget): lose as little as possible
+        best = max(grid, key=lambda row: (row["coverage"], -row["mean_tokens"]))
+    chosen = AdaptiveTopK(best["min_k"], best["max_k"], pool_size, best["method"], best["threshold"], max_tokens)
+
+    held_out = {f"fixed k={k}": evaluate(k, eval_pools, eval_relevant, token_counts)
+                for k in range(1, max(max_ks) + 1)}
+    held_out["adaptive"] = evaluate(chosen, eval_pools, eval_relevant, token_counts)
+    return {
+        "settings": {"embedder": embedder.name, "tune_csv": tune_csv, "eval_csv": eval_csv,
+                     "tune_questions": len(tune_questions), "eval_questions": len(eval_questions),
+                     "baseline_k": baseline_k, "pool_size": pool_size, "max_tokens": max_tokens},
+        "tune_baseline": baseline,
+        "chosen": chosen.settings(),
+        "held_out": held_out,
+        "grid": grid,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune and evaluate the adaptive top-k policy on the QA pairs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("tune", help="Grid-search cut settings and compare them with fixed k")
+    run.add_argument("--pack", default=os.path.join(DEFAULT_DATA_DIR, "chunks.pack"))
+    run.add_argument("--tune-csv", default=DEFAULT_TUNE_CSV, help="QA pairs the settings are chosen on")
+    run.add_argument("--eval-csv", default=DEFAULT_EVAL_CSV, help="Held-out QA pairs the result is reported on")
+    run.add_argument("--embedder", choices=["hashing", "openai"], default="hashing")
+    run.add_argument("--dimensions", type=int, default=1024, help="Hashing embedder dimensions")
+    run.add_argument("--baseline-k", type=int, default=4, help="Fixed k whose coverage must be kept")
+    run.add_argument("--pool-size", type=int, default=10)
+    run.add_argument("--max-tokens", type=int, default=None, help="Context token budget applied to every policy")
+    run.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.pack)
+    embedder = make_embedder(args.embedder, args.dimensions)
+    embedder.fit(corpus.texts)
+    vectors = cached_embeddings(embedder, corpus.texts, os.path.join(args.output_dir, "embeddings"))
+    start = time.perf_counter()
+    results = tune(corpus, vectors, embedder, args.tune_csv, args.eval_csv, args.baseline_k, args.pool_size,
+                   max_tokens=args.max_tokens)
+    settings = results["settings"]
+    print(f"Tuned on {settings['tune_questions']} questions, evaluated on {settings['eval_questions']} held-out "
+          f"questions ({settings['embedder']}) in {time.perf_counter() - start:.1f}s")
+    print(f"Fixed k={args.baseline_k} on the tuning set: coverage {results['tune_baseline']['coverage']:.3f}, "
+          f"{results['tune_baseline']['mean_tokens']:.0f} context tokens")
+    print(f"Chosen: {results['chosen']}")
+    rows = pd.DataFrame([{"retrieval": name, **metrics} for name, metrics in results["held_out"].items()])
+    print(rows.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+
+    path = os.path.join(args.output_dir, f"adaptive_topk_{settings['embedder']}.json")
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Retrieval Benchmark
+
+Scores every retrieval index in 'retrieval.indexes' on the test QA pairs, so retrieval changes can be judged on
+numbers. Each question's 'URL' column names the documentation page its answer came from, and the chunk archive
+maps every chunk to its page link; a retrieved chunk is relevant when its page link equals the question's URL.
+
+Metrics per index configuration:
+- recall@k: share of questions with at least one chunk of the right page among the top k results.
+- mrr: mean reciprocal rank of the first relevant chunk within the top max(k) results (0 when none).
+- latency_ms: p50 / p99 / mean search time per query. Query embedding is timed once, separately, since all the
+  dense indexes share it. Every question is searched 'passes' times, so the cached index shows its hit path.
+- memory_mb: numpy arrays and containers held by the index (vectors shared with the corpus matrix are counted).
+- build_seconds: time to build the index from the corpus vectors and texts.
+
+Results are written to '<output-dir>/results_<embedder>.json' (settings and all metrics) and '.csv' (one row per
+configuration). Chunk embeddings are cached under '<output-dir>/embeddings'.
+
+Usage:
+- python -m retrieval.benchmark   (local hashing embedder, works offline)
+- python -m retrieval.benchmark --embedder openai --k 1 3 5 10 --indexes exact ivf-16 hybrid
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from retrieval.chunk_archive import DEFAULT_DATA_DIR, ChunkArchive
+from retrieval.embedders import HashingEmbedder, OpenAIEmbedder, cached_embeddings
+from retrieval.indexes import BM25Index, CachedIndex, ExactIndex, HierarchicalIndex, HybridIndex, IVFIndex
+from retrieval.shards import Shard, ShardedIndex, partition_chunks
+
+DEFAULT_QA_CSV = os.path.join(DEFAULT_DATA_DIR, "documentation_qa_datasets",
+                              "Final_FILTERED_TEST_Question_Answer_Pairs.csv")
+DEFAULT_OUTPUT_DIR = os.path.join(DEFAULT_DATA_DIR, "retrieval_benchmark")
+INDEX_NAMES = ["exact", "ivf-4", "ivf-16", "bm25", "hybrid", "hierarchical", "cached-exact", "sharded"]
+
+
+class Corpus:
+    """Chunk texts, their page links and page numbers, read once from the chunk archive."""
+
+    def __init__(self, pack_path):
+        with ChunkArchive(pack_path) as archive:
+            self.texts, self.links, page_ids = [], [], []
+            page_numbers = {}
+            for _, key, link, text in archive.iter_chunks():
+                self.texts.append(text)
+                self.links.append(link)
+                page_ids.append(page_numbers.setdefault(key, len(page_numbers)))
+        self.page_ids = np.asarray(page_ids, dtype=np.int64)
+        self.chunks_by_link = {}
+        for chunk_id, link in enumerate(self.links):
+            self.chunks_by_link.setdefault(link, set()).add(chunk_id)
+
+
+def index_builders(corpus, vectors):
+    """Name -> zero-argument builder for every configuration the benchmark knows."""
+    return {
+        "exact": lambda: ExactIndex(vectors),
+        "ivf-4": lambda: IVFIndex(vectors, n_probe=4),
+        "ivf-16": lambda: IVFIndex(vectors, n_probe=16),
+        "bm25": lambda: BM25Index(corpus.texts),
+        "hybrid": lambda: HybridIndex(ExactIndex(vectors), BM25Index(corpus.texts)),
+        "hierarchical": lambda: HierarchicalIndex(vectors, corpus.page_ids, n_pages=10),
+        "cached-exact": lambda: CachedIndex(ExactIndex(vectors)),
+        "sharded": lambda: ShardedIndex([Shard(name, ids, vectors[ids])
+                                         for name, ids in partition_chunks(corpus.links).items()]),
+    }
+
+
+def footprint_bytes(obj, seen=None):
+    """Bytes held by an index: numpy buffers plus the Python containers that hold them."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        base = obj if obj.base is None else obj.base
+        if base is not obj and id(base) in seen:
+            return 0
+        seen.add(id(base))
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(footprint_bytes(key, seen) + footprint_bytes(value, seen)
+                                        for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(footprint_bytes(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        return footprint_bytes(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def evaluate_index(index, questions, query_vectors, relevant, ks, passes=2):
+    """Search every question 'passes' times; returns the metrics dict for one index."""
+    max_k = max(ks)
+    latencies = []
+    ranks = []
+    for pass_number in range(passes):
+        for question, vector, targets in zip(questions, query_vectors, relevant):
+            start = time.perf_counter()
+            ids, _ = index.search(vector, max_k, query_text=question)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if pass_number == 0:
+                hits = [rank for rank, chunk_id in enumerate(ids, start=1) if int(chunk_id) in targets]
+                ranks.append(hits[0] if hits else None)
+
+    metrics = {f"recall@{k}": sum(rank is not None and rank <= k for rank in ranks) / len(ranks) for k in ks}
+    metrics["mrr"] = sum(1.0 / rank for rank in ranks if rank is not None) / len(ranks)
+    metrics["latency_ms"] = {"p50": _percentile(latencies, 50), "p99": _percentile(latencies, 99),
+                             "mean": float(np.mean(latencies))}
+    if isinstance(index, CachedIndex):
+        metrics["cache_hit_rate"] = index.hits / max(1, index.hits + index.misses)
+    if isinstance(index, ShardedIndex):
+        queries = max(1, index.stats["queries"])
+        metrics["fallback_rate"] = index.stats["fallbacks"] / queries
+        metrics["shards_per_query"] = index.stats["shards_searched"] / queries
+        metrics["chunks_per_query"] = index.stats["chunks_searched"] / queries
+    return metrics
+
+
+def make_embedder(name, dimensions):
+    if name == "openai":
+        from dotenv import load_dotenv
+        load_dotenv()
+        return OpenAIEmbedder()
+    return HashingEmbedder(dimensions=dimensions)
+
+
+def run_benchmark(pack_path, qa_csv, embedder, ks, index_names=None, passes=2, cache_dir=None):
+    """Build and score each index configuration. Returns the results dict written by 'main'."""
+    corpus = Corpus(pack_path)
+    qa = pd.read_csv(qa_csv)
+    answerable = qa["URL"].isin(corpus.chunks_by_link)
+    questions = qa.loc[answerable, "Question"].astype(str).tolist()
+    relevant = [corpus.chunks_by_link[url] for url in qa.loc[answerable, "URL"]]
+
+    start = time.perf_counter()
+    embedder.fit(corpus.texts)
+    vectors = cached_embeddings(embedder, corpus.texts, cache_dir) if cache_dir \
+        else embedder.embed_documents(corpus.texts)
+    corpus_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query_vectors = embedder.embed_documents(questions)
+    query_embed_ms = (time.perf_counter() - start) * 1000 / max(1, len(questions))
+
+    results = {
+        "settings": {"embedder": embedder.name, "qa_csv": qa_csv, "k": list(ks), "passes": passes,
+                     "chunks": len(corpus.texts), "questions": len(questions),
+                     "questions_without_page": int((~answerable).sum()),
+                     "corpus_embedding_seconds": corpus_seconds, "query_embedding_ms": query_embed_ms},
+        "indexes": {},
+    }
+    builders = index_builders(corpus, vectors)
+    for name in index_names or INDEX_NAMES:
+        start = time.perf_counter()
+        index = builders[name]()
+        build_seconds = time.perf_counter() - start
+        metrics = evaluate_index(index, questions, query_vectors, relevant, ks, passes=passes)
+        metrics["build_seconds"] = build_seconds
+        metrics["memory_mb"] = footprint_bytes(index) / 1e6
+        results["indexes"][name] = metrics
+        print(format_row(name, metrics, ks))
+    return results
+
+
+def format_row(name, metrics, ks):
+    recalls = "  ".join(f"R@{k} {metrics[f'recall@{k}']:.3f}" for k in ks)
+    latency = metrics["latency_ms"]
+    return (f"{name:14s} {recalls}  MRR {metrics['mrr']:.3f}  p50 {latency['p50']:.3f}ms  "
+            f"p99 {latency['p99']:.3f}ms  {metrics['memory_mb']:.1f} MB  built in {metrics['build_seconds']:.2f}s")
+
+
+def write_results(results, output_dir):
+    """Write results_<embedder>.json and .csv; returns the two paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, f"results_{results['settings']['embedder']}")
+    with open(stem + ".json", "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    rows = []
+    for name, metrics in results["indexes"].items():
+        row = {"index": name, "embedder": results["settings"]["embedder"]}
+        for key, value in metrics.items():
+            if isinstance(value, dict):
+                row.update({f"{key}_{inner}": inner_value for inner, inner_value in value.items()})
+            else:
+                row[key] = value
+        rows.append(row)
+    pd.DataFrame(rows).to_csv(stem + ".csv", index=False)
+    return stem + ".json", stem + ".csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall@k, MRR, latency, memory and build time per index.")
+    parser.add_argument("--pack", default=os.path.join(DEFAULT_DATA_DIR, "chunks.pack"))
+    parser.add_argument("--qa-csv", default=DEFAULT_QA_CSV, help="QA pairs with 'Question' and 'URL' columns")
+    parser.add_argument("--embedder", choices=["hashing", "openai"], default="hashing")
+    parser.add_argument("--dimensions", type=int, default=1024, help="Hashing embedder dimensions")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--indexes", nargs="+", choices=INDEX_NAMES, default=None,
+                        help="Subset of configurations (default: all)")
+    parser.add_argument("--passes", type=int, default=2, help="Times each question is searched")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    embedder = make_embedder(args.embedder, args.dimensions)
+    results = run_benchmark(args.pack, args.qa_csv, embedder, sorted(args.k), args.indexes, args.passes,
+                            cache_dir=os.path.join(args.output_dir, "embeddings"))
+    settings = results["settings"]
+    print(f"{settings['questions']} questions over {settings['chunks']} chunks ({settings['embedder']}); "
+          f"query embedding {settings['query_embedding_ms']:.2f}ms")
+    for path in write_results(results, args.output_dir):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Packed Chunk Archive
+
+The chunked corpus is thousands of small '<DESC>_<j>.txt' files (with leading spaces in their names) plus a
+'chunking.yml' manifest. Every consumer had to walk the directory, open each file and parse the YAML. This module
+packs the corpus into two files that are memory-mapped instead:
+
+- chunks.pack: header, offset table and one UTF-8 blob holding every chunk back to back.
+    header       8s magic 'VPCCHNK1' | uint64 chunk count
+    offsets      (count + 1) x uint64, relative to the start of the blob
+    blob         chunk texts
+- chunks.manifest: page key -> link, summary file name and contiguous range of chunk IDs.
+    header       8s magic 'VPCMANI1' | uint64 page count
+    per page     uint64 first chunk ID | uint32 chunk count | key, link, summary as uint32-length-prefixed UTF-8
+
+Chunk IDs are assigned in sorted page-key order and chunk order within a page, so chunk j of a page is always
+'first_chunk_id + j'. Reading a chunk is a slice of the mmap at offsets[i]:offsets[i + 1].
+
+Usage:
+- python -m retrieval.chunk_archive   (converts 06_Data/Capstone_Data/chunks + chunking.yml)
+- with ChunkArchive('06_Data/Capstone_Data/chunks.pack') as archive: archive[42], archive.page_chunks(key)
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import time
+
+DEFAULT_DATA_DIR = "06_Data/Capstone_Data"
+
+PACK_MAGIC = b"VPCCHNK1"
+MANIFEST_MAGIC = b"VPCMANI1"
+_HEADER = struct.Struct("<8sQ")
+_PAGE = struct.Struct("<QI")
+_LENGTH = struct.Struct("<I")
+
+
+def default_manifest_path(pack_path):
+    return os.path.splitext(pack_path)[0] + ".manifest"
+
+
+def _write_string(file, value):
+    data = value.encode("utf-8")
+    file.write(_LENGTH.pack(len(data)))
+    file.write(data)
+
+
+def write_archive(pages, pack_path, manifest_path=None):
+    """
+    Write an archive from an iterable of (key, link, summary, chunk_texts) tuples.
+
+    Pages are sorted by key before chunk IDs are assigned. Returns (page count, chunk count).
+    """
+    manifest_path = manifest_path or default_manifest_path(pack_path)
+    pages = sorted(pages, key=lambda page: page[0])
+
+    encoded = [text.encode("utf-8") for _, _, _, texts in pages for text in texts]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    with open(pack_path, "wb") as f:
+        f.write(_HEADER.pack(PACK_MAGIC, len(encoded)))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for data in encoded:
+            f.write(data)
+
+    with open(manifest_path, "wb") as f:
+        f.write(_HEADER.pack(MANIFEST_MAGIC, len(pages)))
+        first_chunk_id = 0
+        for key, link, summary, texts in pages:
+            f.write(_PAGE.pack(first_chunk_id, len(texts)))
+            _write_string(f, key)
+            _write_string(f, link or "")
+            _write_string(f, summary or "")
+            first_chunk_id += len(texts)
+
+    return len(pages), len(encoded)
+
+
+def convert_chunk_directory(chunks_dir, chunking_yml, pack_path, manifest_path=None):
+    """Pack an existing 'chunks/' directory and its 'chunking.yml' manifest into an archive."""
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(chunking_yml, "r") as f:
+        manifest = yaml.load(f, Loader=loader)
+
+    def read_pages():
+        for key, entry in manifest.items():
+            texts = []
+            for name in entry["chunks"]:
+                with open(os.path.join(chunks_dir, name), "r", encoding="utf-8") as chunk_file:
+                    texts.append(chunk_file.read())
+            yield key, entry.get("link"), entry.get("summary"), texts
+
+    return write_archive(read_pages(), pack_path, manifest_path)
+
+
+class ChunkArchive:
+    """Read-only, memory-mapped view of a packed chunk archive."""
+
+    def __init__(self, pack_path, manifest_path=None):
+        self.pack_path = pack_path
+        self.manifest_path = manifest_path or default_manifest_path(pack_path)
+
+        self._file = open(pack_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{pack_path} is not a chunk archive")
+        self._count = count
+        self._offsets = memoryview(self._mmap)[_HEADER.size:_HEADER.size + 8 * (count + 1)].cast("Q")
+        self._blob_start = _HEADER.size + 8 * (count + 1)
+
+        self._pages = {}
+        self._keys = []
+        self._first_ids = []
+        with open(self.manifest_path, "rb") as f:
+            data = f.read()
+        magic, n_pages = _HEADER.unpack_from(data, 0)
+        if magic != MANIFEST_MAGIC:
+            raise ValueError(f"{self.manifest_path} is not a chunk archive manifest")
+        pos = _HEADER.size
+        for _ in range(n_pages):
+            first_chunk_id, n_chunks = _PAGE.unpack_from(data, pos)
+            pos += _PAGE.size
+            fields = []
+            for _ in range(3):
+                (length,) = _LENGTH.unpack_from(data, pos)
+                pos += _LENGTH.size
+                fields.append(data[pos:pos + length].decode("utf-8"))
+                pos += length
+            key, link, summary = fields
+            self._pages[key] = (link, summary, range(first_chunk_id, first_chunk_id + n_chunks))
+            self._keys.append(key)
+            self._first_ids.append(first_chunk_id)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, chunk_id):
+        return self.get(chunk_id)
+
+    def get(self, chunk_id):
+        """Return the text of a chunk by ID in O(1)."""
+        if not 0 <= chunk_id < self._count:
+            raise IndexError(f"chunk ID {chunk_id} out of range")
+        start = self._blob_start + self._offsets[chunk_id]
+        end = self._blob_start + self._offsets[chunk_id + 1]
+        return self._mmap[start:end].decode("utf-8")
+
+    def pages(self):
+        """Page keys in archive order."""
+        return list(self._keys)
+
+    def chunk_ids(self, key):
+        return self._pages[key][2]
+
+    def page_chunks(self, key):
+        return [self.get(chunk_id) for chunk_id in self.chunk_ids(key)]
+
+    def link(self, key):
+        return self._pages[key][0]
+
+    def summary_name(self, key):
+        return self._pages[key][1]
+
+    def page_of(self, chunk_id):
+        """Return the page key that owns a chunk."""
+        if not 0 <= chunk_id < self._count:
+            raise IndexError(f"chunk ID {chunk_id} out of range")
+        return self._keys[bisect.bisect_right(self._first_ids, chunk_id) - 1]
+
+    def link_of(self, chunk_id):
+        return self.link(self.page_of(chunk_id))
+
+    def chunk_name(self, chunk_id):
+        """Original '<DESC>_<j>.txt' file name of a chunk."""
+        key = self.page_of(chunk_id)
+        return f"{key}_{chunk_id - self._pages[key][2].start}.txt"
+
+    def iter_chunks(self):
+        """Yield (chunk_id, page key, link, text) for the whole corpus in ID order."""
+        for key in self._keys:
+            link, _, ids = self._pages[key]
+            for chunk_id in ids:
+                yield chunk_id, key, link, self.get(chunk_id)
+
+    def close(self):
+        self._offsets.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack chunks/ and chunking.yml into a memory-mappable archive.")
+    parser.add_argument("--chunks-dir", default=os.path.join(DEFAULT_DATA_DIR, "chunks"))
+    parser.add_argument("--chunking-yml", default=os.path.join(DEFAULT_DATA_DIR, "chunking.yml"))
+    parser.add_argument("--output", default=os.path.join(DEFAULT_DATA_DIR, "chunks.pack"),
+                        help="Archive path; the manifest is written next to it with a '.manifest' suffix")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n_pages, n_chunks = convert_chunk_directory(args.chunks_dir, args.chunking_yml, args.output)
+    print(f"Packed {n_chunks} chunks from {n_pages} pages into {args.output} in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    with ChunkArchive(args.output) as archive:
+        total = sum(len(text) for _, _, _, text in archive.iter_chunks())
+    print(f"Reloaded {total} characters in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
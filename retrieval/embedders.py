@@ -0,0 +1,120 @@
+"""
+Embedders
+
+Text -> vector functions for the retrieval indexes. They follow the LangChain embeddings interface ('embed_documents'
+for lists, 'embed_query' for one string) but return float32 numpy arrays, L2-normalized, so a dot product is the
+cosine similarity.
+
+Key Components:
+- tokenize: Lowercased word tokens; CamelCase API names such as 'CreateVpcEndpoint' are also split into their parts.
+- HashingEmbedder: Local TF-IDF embedding with the hashing trick (unigrams and bigrams hashed into a fixed number
+  of dimensions). Needs no network or model download, so the benchmark runs offline; call 'fit' on the corpus to
+  learn IDF weights.
+- OpenAIEmbedder: The embeddings used by the chat service (LangChain 'OpenAIEmbeddings', text-embedding-ada-002),
+  batched. Needs OPENAI_KEY.
+- cached_embeddings: Embed a list of texts once per (embedder, texts) and keep the matrix as a .npy file, so reruns
+  do not pay for the corpus again.
+"""
+
+import hashlib
+import math
+import os
+import re
+import zlib
+
+import numpy as np
+
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def tokenize(text):
+    tokens = []
+    for word in _WORD.findall(text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = _CAMEL.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    def __init__(self, dimensions=1024, bigrams=True):
+        self.dimensions = dimensions
+        self.bigrams = bigrams
+        self.idf = np.ones(dimensions, dtype=np.float32)
+
+    @property
+    def name(self):
+        return f"hashing-{self.dimensions}{'-bigrams' if self.bigrams else ''}"
+
+    def _features(self, text):
+        tokens = tokenize(text)
+        features = tokens + ([f"{a} {b}" for a, b in zip(tokens, tokens[1:])] if self.bigrams else [])
+        counts = {}
+        for feature in features:
+            bucket = zlib.crc32(feature.encode("utf-8"))
+            # The sign bit keeps colliding features from only ever adding up
+            index, sign = bucket % self.dimensions, 1.0 if bucket & 0x80000000 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign
+        return counts
+
+    def fit(self, texts):
+        """Learn smoothed IDF weights per hashed dimension from a corpus. Returns self."""
+        document_frequency = np.zeros(self.dimensions, dtype=np.float64)
+        for text in texts:
+            document_frequency[list(self._features(text))] += 1
+        self.idf = np.log((1 + len(texts)) / (1 + document_frequency)).astype(np.float32) + 1.0
+        return self
+
+    def embed_documents(self, texts):
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for index, count in self._features(text).items():
+                # Sublinear term frequency, keeping the hash sign
+                matrix[row, index] = math.copysign(1.0 + math.log(abs(count)), count) if count else 0.0
+        return normalize_rows(matrix * self.idf)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class OpenAIEmbedder:
+    def __init__(self, api_key=None, model="text-embedding-ada-002", batch_size=500):
+        from langchain.embeddings.openai import OpenAIEmbeddings
+
+        self.model = model
+        self._embeddings = OpenAIEmbeddings(openai_api_key=api_key or os.getenv("OPENAI_KEY"), model=model,
+                                            chunk_size=batch_size)
+
+    @property
+    def name(self):
+        return f"openai-{self.model}"
+
+    def fit(self, texts):
+        return self
+
+    def embed_documents(self, texts):
+        return normalize_rows(np.asarray(self._embeddings.embed_documents(list(texts)), dtype=np.float32))
+
+    def embed_query(self, text):
+        return normalize_rows(np.asarray([self._embeddings.embed_query(text)], dtype=np.float32))[0]
+
+
+def cached_embeddings(embedder, texts, cache_dir):
+    """Return embedder.embed_documents(texts), reading and writing '<cache_dir>/<embedder>-<hash>.npy'."""
+    digest = hashlib.sha256("\0".join(texts).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{embedder.name}-{digest}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+    matrix = embedder.embed_documents(texts)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(path, matrix)
+    return matrix
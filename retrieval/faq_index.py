@@ -0,0 +1,269 @@
+"""
+FAQ Answer Index
+
+Answers common questions from the vetted QA pairs that the ingestion pipeline already produced
+('Final_Question_Answer_Pairs.csv'), instead of paying for retrieval and a full LLM call.
+
+Key Components:
+- build_faq_index: Offline build. Drops rows without a question or with 'NOT ENOUGH INFORMATION', embeds the
+  questions and writes a compact index: float16 question vectors ('faq.npz'), the questions, answers and source
+  URLs ('faq.json'), and the hashing embedder's IDF weights.
+- FAQIndex: Loads the index and matches a user question against the stored questions by cosine similarity. Only a
+  match at or above 'threshold' counts; below that the caller falls through to the normal RAG path. Word vectors
+  cannot tell "create an endpoint service" from "delete an endpoint service", so a stored question is only a
+  candidate when it asks for the same actions (intent_actions: create/delete, enable/disable, ...) as the user.
+- format_faq_answer: The stored answer with its source link appended, which is the only adaptation made.
+- evaluate: Picks the threshold. Reports how often lightly rephrased FAQ questions still match their own entry, how
+  often held-out questions (default: the filtered test pairs, which are not in the FAQ) are answered anyway, and
+  how often an opposite-intent near miss (the FAQ question with 'create' swapped for 'delete' and so on) is
+  answered with the original entry. A threshold with any near-miss match is rejected, and 'evaluate' exits with
+  status 1 if the threshold it checks ('--threshold', default 0.7) is one of them. The default index (hashing
+  embedder with word pairs, threshold 0.7) matches 97% of the rephrasings and none of the held-out questions or
+  near misses.
+
+The FAQ path is off in the chat service unless FAQ_INDEX_DIR is set.
+
+Usage:
+- python -m retrieval.faq_index build
+- python -m retrieval.faq_index evaluate [--thresholds 0.5 0.6 0.7 --threshold 0.7]
+- faq = FAQIndex.load('06_Data/Capstone_Data/faq_index'); match = faq.match(question)
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from retrieval.chunk_archive import DEFAULT_DATA_DIR
+from retrieval.embedders import HashingEmbedder, OpenAIEmbedder
+
+QA_DIR = os.path.join(DEFAULT_DATA_DIR, "documentation_qa_datasets")
+DEFAULT_QA_CSV = os.path.join(QA_DIR, "Final_Question_Answer_Pairs.csv")
+DEFAULT_EVAL_CSV = os.path.join(QA_DIR, "Final_FILTERED_TEST_Question_Answer_Pairs.csv")
+DEFAULT_FAQ_DIR = os.path.join(DEFAULT_DATA_DIR, "faq_index")
+NO_ANSWER = "NOT ENOUGH INFORMATION"
+DEFAULT_THRESHOLD = 0.7
+
+FAQMatch = namedtuple("FAQMatch", ["question", "answer", "url", "score"])
+
+# Actions a question can ask for, with their synonyms; pairs of opposites make the near misses in 'evaluate'
+ACTIONS = {
+    "create": ["create", "add", "make", "launch", "provision", "establish", "build", "set"],
+    "delete": ["delete", "remove", "terminate", "destroy", "deregister", "deprovision", "clean"],
+    "enable": ["enable", "activate", "turn"],
+    "disable": ["disable", "deactivate"],
+    "attach": ["attach"],
+    "detach": ["detach"],
+    "associate": ["associate"],
+    "disassociate": ["disassociate"],
+    "accept": ["accept", "approve"],
+    "reject": ["reject", "decline", "deny"],
+    "allow": ["allow", "permit", "grant", "open"],
+    "block": ["block", "restrict", "revoke", "close"],
+    "start": ["start", "begin", "resume"],
+    "stop": ["stop", "pause"],
+    "share": ["share"],
+    "unshare": ["unshare"],
+    "modify": ["modify", "update", "change", "edit", "configure", "rename", "resize", "replace"],
+    "view": ["view", "describe", "list", "find", "check", "see", "show", "monitor", "get", "retrieve"],
+    "move": ["move", "migrate", "transfer", "copy"],
+    "troubleshoot": ["troubleshoot", "fix", "resolve", "debug"],
+}
+OPPOSITES = {"create": "delete", "enable": "disable", "attach": "detach", "associate": "disassociate",
+             "accept": "reject", "allow": "block", "start": "stop", "share": "unshare"}
+OPPOSITES.update({opposite: action for action, opposite in OPPOSITES.items()})
+
+
+def _word_forms(verb):
+    stem = verb[:-1] if verb.endswith("e") else verb
+    return {verb, verb + "s", stem + "ed", stem + "ing", verb + "d" if verb.endswith("e") else verb + "ed"}
+
+
+_ACTION_OF_WORD = {form: action for action, verbs in ACTIONS.items() for verb in verbs for form in _word_forms(verb)}
+
+
+def intent_actions(question):
+    """The set of actions (ACTIONS keys) a question asks for; empty for 'what is' style questions."""
+    # Whole words only: the parts of CamelCase names ('PrivateLink') are not actions
+    words = (word.lower() for word in re.findall(r"[A-Za-z]+", question))
+    return frozenset(_ACTION_OF_WORD[word] for word in words if word in _ACTION_OF_WORD)
+
+
+def load_qa_pairs(qa_csv):
+    """Usable (question, answer, URL) rows of a QA CSV, one per distinct question."""
+    df = pd.read_csv(qa_csv)
+    df = df.dropna(subset=["Question", "Answer"])
+    df = df[df["Answer"].str.strip() != NO_ANSWER]
+    df = df.assign(_key=df["Question"].str.strip().str.lower()).drop_duplicates("_key")
+    return df[["Question", "Answer", "URL"]].reset_index(drop=True)
+
+
+def build_faq_index(qa_csv, embedder, output_dir):
+    """Embed the questions of qa_csv and write the index to output_dir. Returns the number of entries."""
+    pairs = load_qa_pairs(qa_csv)
+    questions = pairs["Question"].tolist()
+    embedder.fit(questions)
+    vectors = embedder.embed_documents(questions)
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.savez_compressed(os.path.join(output_dir, "faq.npz"), vectors=vectors.astype(np.float16))
+    info = {"embedder": embedder.name, "source": os.path.basename(qa_csv), "questions": questions,
+            "answers": pairs["Answer"].tolist(), "urls": pairs["URL"].tolist()}
+    if isinstance(embedder, HashingEmbedder):
+        info["hashing"] = {"dimensions": embedder.dimensions, "bigrams": embedder.bigrams}
+        np.save(os.path.join(output_dir, "idf.npy"), embedder.idf)
+    with open(os.path.join(output_dir, "faq.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    return len(questions)
+
+
+class FAQIndex:
+    def __init__(self, vectors, questions, answers, urls, embedder, threshold=DEFAULT_THRESHOLD):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.questions = questions
+        self.answers = answers
+        self.urls = urls
+        self.embedder = embedder
+        self.threshold = threshold
+        self.intents = [intent_actions(question) for question in questions]
+
+    @classmethod
+    def load(cls, faq_dir, threshold=DEFAULT_THRESHOLD):
+        with open(os.path.join(faq_dir, "faq.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        if "hashing" in info:
+            embedder = HashingEmbedder(**info["hashing"])
+            embedder.idf = np.load(os.path.join(faq_dir, "idf.npy"))
+        else:
+            embedder = OpenAIEmbedder()
+        with np.load(os.path.join(faq_dir, "faq.npz")) as data:
+            vectors = data["vectors"]
+        return cls(vectors, info["questions"], info["answers"], info["urls"], embedder, threshold=threshold)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def best(self, question):
+        """The closest stored question asking for the same actions, whatever its score; None if there is none."""
+        intent = intent_actions(question)
+        candidates = np.asarray([stored == intent for stored in self.intents], dtype=bool)
+        if not candidates.any():
+            return None
+        scores = np.where(candidates, self.vectors @ self.embedder.embed_query(question), -np.inf)
+        i = int(np.argmax(scores))
+        return FAQMatch(self.questions[i], self.answers[i], self.urls[i], float(scores[i]))
+
+    def match(self, question, threshold=None):
+        """The closest stored question if its similarity reaches the threshold, else None."""
+        if not question or not question.strip() or not len(self):
+            return None
+        best = self.best(question)
+        if best is None:
+            return None
+        return best if best.score >= (self.threshold if threshold is None else threshold) else None
+
+
+def format_faq_answer(match):
+    return f"{match.answer}\n\n(Source: {match.url})"
+
+
+def question_variant(question):
+    """A light rephrasing: no parentheticals, no 'Amazon'/'AWS' prefixes, lowercase, no question mark."""
+    variant = re.sub(r"\s*\([^)]*\)", "", question)
+    variant = re.sub(r"\b(?:Amazon|AWS)\s+", "", variant)
+    return variant.rstrip("?").lower()
+
+
+def opposite_variant(question):
+    """The question with its first action verb swapped for the opposite one ('create' -> 'delete'), or None."""
+    for word in re.findall(r"[A-Za-z]+", question):
+        action = _ACTION_OF_WORD.get(word.lower())
+        if action in OPPOSITES:
+            return re.sub(rf"\b{word}\b", ACTIONS[OPPOSITES[action]][0], question, count=1)
+    return None
+
+
+def evaluate(faq, eval_csv, thresholds):
+    """
+    Per threshold:
+    - variant_recall: share of the FAQ's own questions, rephrased with question_variant, matched to themselves.
+    - held_out_answered / held_out_same_page: share of the held-out questions that get an FAQ answer, and that get
+      one from their own page. Held-out questions are not in the FAQ, so most of their answers are false matches.
+    - near_miss_matches: opposite-intent near misses answered with the entry they were made from (must be 0).
+    """
+    held_out = load_qa_pairs(eval_csv)
+    start = time.perf_counter()
+    variants = [(faq.best(question_variant(question)), question) for question in faq.questions]
+    latency_ms = (time.perf_counter() - start) * 1000 / max(1, len(variants))
+    held_out_best = [(faq.best(question), url) for question, url in zip(held_out["Question"], held_out["URL"])]
+    near_misses = [(faq.best(variant), question) for question, variant in
+                   ((question, opposite_variant(question)) for question in faq.questions) if variant is not None]
+
+    def score_of(match):
+        return match.score if match is not None else -np.inf
+
+    rows = []
+    for threshold in thresholds:
+        rows.append({
+            "threshold": threshold,
+            "variant_recall": sum(score_of(match) >= threshold and match.question == question
+                                  for match, question in variants) / len(variants),
+            "held_out_answered": sum(score_of(match) >= threshold
+                                     for match, _ in held_out_best) / len(held_out_best),
+            "held_out_same_page": sum(score_of(match) >= threshold and match.url == url
+                                      for match, url in held_out_best) / len(held_out_best),
+            "near_misses": len(near_misses),
+            "near_miss_matches": sum(score_of(match) >= threshold and match.question == question
+                                     for match, question in near_misses),
+            "latency_ms": latency_ms,
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the FAQ answer index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Embed the QA pairs into an FAQ index")
+    build.add_argument("--qa-csv", default=DEFAULT_QA_CSV)
+    build.add_argument("--embedder", choices=["hashing", "openai"], default="hashing")
+    build.add_argument("--dimensions", type=int, default=1024, help="Hashing embedder dimensions")
+    build.add_argument("--unigrams", action="store_true",
+                       help="Hash single words only (looser matching; word order is ignored entirely)")
+    build.add_argument("--output-dir", default=DEFAULT_FAQ_DIR)
+    check = subparsers.add_parser("evaluate", help="Answered share and precision per threshold on held-out pairs")
+    check.add_argument("--faq-dir", default=DEFAULT_FAQ_DIR)
+    check.add_argument("--eval-csv", default=DEFAULT_EVAL_CSV)
+    check.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    check.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="Threshold the service uses; exit with status 1 if any near miss matches at it")
+    args = parser.parse_args()
+
+    if args.command == "evaluate":
+        faq = FAQIndex.load(args.faq_dir)
+        report = evaluate(faq, args.eval_csv, sorted(set(args.thresholds) | {args.threshold}))
+        print(report.to_string(index=False))
+        rejected = report.loc[report["near_miss_matches"] > 0, "threshold"].tolist()
+        if rejected:
+            print(f"Thresholds answering opposite-intent near misses: {rejected}")
+        if args.threshold in rejected:
+            sys.exit(1)
+        return
+
+    if args.embedder == "openai":
+        from retrieval.benchmark import make_embedder
+        embedder = make_embedder("openai", args.dimensions)
+    else:
+        embedder = HashingEmbedder(dimensions=args.dimensions, bigrams=not args.unigrams)
+    start = time.perf_counter()
+    count = build_faq_index(args.qa_csv, embedder, args.output_dir)
+    print(f"Indexed {count} questions into {args.output_dir} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
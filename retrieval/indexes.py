@@ -0,0 +1,178 @@
+"""
+Retrieval Indexes
+
+In-memory chunk indexes with one search interface, so the benchmark (and later the service) can swap them freely:
+
+    index.search(query_vector, k, query_text=None) -> (chunk_ids, scores), best first
+
+Vectors are the L2-normalized rows produced by 'retrieval.embedders', so scores are cosine similarities for the
+dense indexes.
+
+Key Components:
+- ExactIndex: Brute-force dot product against every chunk; the recall reference.
+- IVFIndex: Approximate inverted-file index. K-means splits the chunks into n_lists clusters; a query scans only the
+  chunks of its n_probe closest clusters.
+- BM25Index: Keyword index (Okapi BM25) over the chunk texts, using the query text instead of the vector.
+- HybridIndex: Runs a dense and a keyword index and merges their candidate lists by reciprocal rank fusion.
+- HierarchicalIndex: Two-stage search: rank pages by the mean of their chunk vectors, then rank only the chunks of
+  the best n_pages pages.
+- CachedIndex: LRU cache of results per (query, k) in front of any index, for repeated questions.
+"""
+
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from retrieval.embedders import normalize_rows, tokenize
+
+
+def top_k(scores, k):
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class ExactIndex:
+    def __init__(self, vectors):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def search(self, query_vector, k, query_text=None):
+        scores = self.vectors @ query_vector
+        best = top_k(scores, k)
+        return best, scores[best]
+
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Spherical k-means. Returns (unit-length centroids, cluster of each vector)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=n_clusters) == 0
+        # Re-seed clusters that lost all their members
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class IVFIndex:
+    def __init__(self, vectors, n_lists=None, n_probe=8, iterations=10, seed=0):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.n_lists = min(n_lists or max(1, int(4 * np.sqrt(len(vectors)))), len(vectors))
+        self.n_probe = min(n_probe, self.n_lists)
+        self.centroids, assignment = kmeans(vectors, self.n_lists, iterations=iterations, seed=seed)
+        # Store the vectors grouped by list so a probe reads one contiguous block
+        order = np.argsort(assignment, kind="stable")
+        self.ids = order
+        self.vectors = vectors[order]
+        self.list_starts = np.searchsorted(assignment[order], np.arange(self.n_lists + 1))
+
+    def search(self, query_vector, k, query_text=None):
+        lists = top_k(self.centroids @ query_vector, self.n_probe)
+        blocks = [np.arange(self.list_starts[i], self.list_starts[i + 1]) for i in lists]
+        rows = np.concatenate(blocks)
+        scores = self.vectors[rows] @ query_vector
+        best = top_k(scores, k)
+        return self.ids[rows[best]], scores[best]
+
+
+class BM25Index:
+    def __init__(self, texts, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_documents = len(texts)
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            lengths[doc_id] = sum(counts.values())
+            for token, count in counts.items():
+                postings[token][0].append(doc_id)
+                postings[token][1].append(count)
+        average_length = float(lengths.mean()) if len(texts) else 0.0
+        self.length_norm = k1 * (1 - b + b * lengths / max(average_length, 1e-9))
+        self.postings = {token: (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+                         for token, (ids, tfs) in postings.items()}
+
+    def search(self, query_vector, k, query_text=None):
+        if query_text is None:
+            raise ValueError("BM25Index searches by query text")
+        scores = np.zeros(self.n_documents, dtype=np.float32)
+        for token in set(tokenize(query_text)):
+            if token not in self.postings:
+                continue
+            ids, tfs = self.postings[token]
+            idf = np.log(1 + (self.n_documents - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self.length_norm[ids])
+        best = top_k(scores, k)
+        best = best[scores[best] > 0]
+        return best, scores[best]
+
+
+class HybridIndex:
+    def __init__(self, dense, sparse, candidates=50, rrf_k=60, dense_weight=1.0):
+        self.dense = dense
+        self.sparse = sparse
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.dense_weight = dense_weight
+
+    def search(self, query_vector, k, query_text=None):
+        fused = defaultdict(float)
+        depth = max(k, self.candidates)
+        for index, weight in ((self.dense, self.dense_weight), (self.sparse, 1.0)):
+            ids, _ = index.search(query_vector, depth, query_text=query_text)
+            for rank, chunk_id in enumerate(ids):
+                fused[int(chunk_id)] += weight / (self.rrf_k + rank + 1)
+        ranked = sorted(fused.items(), key=lambda item: -item[1])[:k]
+        return (np.array([chunk_id for chunk_id, _ in ranked], dtype=np.int64),
+                np.array([score for _, score in ranked], dtype=np.float32))
+
+
+class HierarchicalIndex:
+    def __init__(self, vectors, page_of_chunk, n_pages=10):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        page_of_chunk = np.asarray(page_of_chunk)
+        self.n_pages = n_pages
+        order = np.argsort(page_of_chunk, kind="stable")
+        _, starts = np.unique(page_of_chunk[order], return_index=True)
+        self.chunk_ids = order
+        self.page_starts = np.append(starts, len(order))
+        sums = np.add.reduceat(self.vectors[order], starts, axis=0)
+        self.page_vectors = normalize_rows(sums)
+
+    def search(self, query_vector, k, query_text=None):
+        pages = top_k(self.page_vectors @ query_vector, self.n_pages)
+        candidates = np.concatenate([self.chunk_ids[self.page_starts[p]:self.page_starts[p + 1]] for p in pages])
+        scores = self.vectors[candidates] @ query_vector
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+class CachedIndex:
+    def __init__(self, index, maxsize=1024):
+        self.index = index
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, query_vector, k, query_text=None):
+        key = (query_text if query_text is not None else np.asarray(query_vector).tobytes(), k)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        result = self.index.search(query_vector, k, query_text=query_text)
+        self._cache[key] = result
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return result
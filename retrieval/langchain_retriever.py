@@ -0,0 +1,72 @@
+"""
+LangChain Retrievers over the Local Indexes
+
+Plug the retrieval package into LangChain chains (e.g. RetrievalQA) in place of a vector store retriever:
+- SnapshotRetriever: searches a 'SnapshotManager'. Every call uses whichever snapshot is active at that moment, so a
+  hot swap never requires rebuilding the chain.
+- ScatterGatherRetriever: embeds the query once and searches every shard worker through a 'ScatterGatherClient'.
+  When some shards time out or are down, the documents of the other shards are returned and marked 'partial'.
+- ScoredVectorStoreRetriever: a LangChain vector store (the Pinecone index) searched with scores, which the plain
+  'as_retriever()' drops. 'retrieval.adaptive_topk' needs them to cut the candidate pool. With a 'router'
+  ('retrieval.shards.QueryRouter'), the search is limited to the routed doc type / service partitions by a
+  metadata filter; a query the router is unsure of searches the whole index.
+
+Documents look like the ones the Pinecone vector store returned: page_content is 'SOURCE LINK: <link> CONTENT:
+<chunk>' as uploaded by '04_Embedding_Storage/01_embed.py', with the link, chunk ID, score and snapshot version (or
+partial-result flag) in the metadata.
+"""
+
+import logging
+from typing import Any, List
+
+import numpy as np
+from langchain.schema import BaseRetriever, Document
+
+
+class SnapshotRetriever(BaseRetriever):
+    manager: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        with self.manager.acquire() as snapshot:
+            hits = snapshot.search(query, self.k)
+            version = snapshot.version
+        return [Document(page_content="SOURCE LINK: " + hit.link + " " + "CONTENT: " + hit.text,
+                         metadata={"link": hit.link, "chunk_id": hit.chunk_id, "score": hit.score,
+                                   "index_version": version})
+                for hit in hits]
+
+
+class ScatterGatherRetriever(BaseRetriever):
+    client: Any
+    embedder: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        hits, report = self.client.search(self.embedder.embed_query(query), self.k)
+        if report["partial"]:
+            logging.warning(f"Partial retrieval: {report['answered']}/{report['shards']} shards answered "
+                            f"(timed out: {report['timed_out']}, failed: {report['failed']})")
+        return [Document(page_content="SOURCE LINK: " + hit.link + " " + "CONTENT: " + hit.text,
+                         metadata={"link": hit.link, "chunk_id": hit.chunk_id, "score": hit.score,
+                                   "partial": report["partial"]})
+                for hit in hits]
+
+
+class ScoredVectorStoreRetriever(BaseRetriever):
+    vectorstore: Any
+    k: int = 4
+    router: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        # The query is embedded once, for both the router and the search
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        metadata_filter = None
+        if self.router is not None:
+            metadata_filter = self.router.metadata_filter(np.asarray(embedding, dtype=np.float32))
+        documents = []
+        for document, score in self.vectorstore.similarity_search_by_vector_with_score(embedding, k=self.k,
+                                                                                        filter=metadata_filter):
+            documents.append(Document(page_content=document.page_content,
+                                      metadata={**document.metadata, "score": float(score)}))
+        return documents
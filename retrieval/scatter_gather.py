@@ -0,0 +1,441 @@
+"""
+Scatter-Gather Retrieval over Shard Worker Processes
+
+Spreads the chunk index over N shard workers so that no single process has to hold or search the whole corpus.
+Each worker owns one shard (vectors, chunk texts and links) and answers searches over a
+multiprocessing.connection socket; the coordinator embeds the query once, sends it to every shard in parallel and
+merges the per-shard top-k lists. Workers can run on one machine (one per core) or on several hosts.
+
+Layout written by the offline build:
+
+    <index_dir>/
+        shards.json                   shard count, embedder, chunk count per shard
+        idf.npy                       hashing embedder IDF weights (the coordinator embeds the queries)
+        shard-000/                    chunks.pack / chunks.manifest (see 'chunk_archive'), vectors.npy and
+        shard-001/ ...                chunk_ids.npy (global chunk IDs of the shard's rows)
+
+Pages are never split: all chunks of a page go to the same shard, and pages are dealt out largest first to the
+shard with the fewest chunks so the shards stay balanced.
+
+Protocol: pickled dicts over an authenticated connection ('SHARD_AUTHKEY').
+    {'op': 'search', 'vector': float32 array, 'k': int}  ->  {'hits': [(chunk_id, score, text, link), ...]}
+    {'op': 'info'}                                       ->  {'shard': name, 'chunks': int}
+Unpickling runs code, so the key is what stands between the port and code execution on a worker: 'serve' and
+'launch' refuse to listen on anything but a loopback address unless SHARD_AUTHKEY is set (to a secret value).
+Both sides bound the authentication handshake by a timeout, so a frozen peer whose socket still accepts
+connections cannot hang a client thread or the worker's accept loop.
+
+Key Components:
+- build_worker_shards: Offline build of the N shards.
+- ShardWorker / serve_shard: One worker process serving one shard.
+- ScatterGatherClient: Fans a query out to every worker, waits at most 'timeout' seconds per shard and returns the
+  merged top-k plus a report of shards that timed out or were unreachable (those results are simply missing).
+  Connections are pooled per shard; a timed-out connection is dropped so a late reply is never read by the next
+  query, and a shard that is unreachable or stalls while connecting is retried after 'retry_after' seconds.
+- start_local_workers: Start one worker process per shard on this machine, for testing and single-box serving.
+
+Usage:
+- python -m retrieval.scatter_gather build --shards 4
+- python -m retrieval.scatter_gather launch --base-port 6100        (all shards on this machine)
+- python -m retrieval.scatter_gather serve --shard 2 --port 6102    (one shard, e.g. on another host)
+- python -m retrieval.scatter_gather query "How do I create a transit gateway?" --workers localhost:6100 ...
+"""
+
+import argparse
+import ipaddress
+import json
+import os
+import queue
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Connection, answer_challenge, deliver_challenge
+
+import numpy as np
+
+from retrieval.chunk_archive import DEFAULT_DATA_DIR, ChunkArchive, write_archive
+from retrieval.embedders import HashingEmbedder, OpenAIEmbedder, cached_embeddings
+from retrieval.indexes import ExactIndex
+
+DEFAULT_INDEX_DIR = os.path.join(DEFAULT_DATA_DIR, "worker_shards")
+MANIFEST_NAME = "shards.json"
+DEFAULT_AUTHKEY = "vpc-assistant-shards"  # loopback only; see require_private_authkey
+HANDSHAKE_TIMEOUT = 5.0
+
+Hit = namedtuple("Hit", ["chunk_id", "score", "text", "link"])
+
+
+def shard_dir_name(number):
+    return f"shard-{number:03d}"
+
+
+def assign_pages(page_sizes, n_shards):
+    """Shard number per page: largest pages first, each to the shard with the fewest chunks so far."""
+    totals = [0] * n_shards
+    assignment = {}
+    for key, size in sorted(page_sizes.items(), key=lambda item: (-item[1], item[0])):
+        shard = min(range(n_shards), key=lambda number: (totals[number], number))
+        assignment[key] = shard
+        totals[shard] += size
+    return assignment
+
+
+def build_worker_shards(pack_path, embedder, output_dir, n_shards, cache_dir=None):
+    """Embed the archive and write n_shards worker shards to output_dir. Returns the manifest dict."""
+    with ChunkArchive(pack_path) as archive:
+        pages = [(key, archive.link(key), archive.summary_name(key), list(archive.chunk_ids(key)))
+                 for key in archive.pages()]
+        texts = [text for _, _, _, text in archive.iter_chunks()]
+    embedder.fit(texts)
+    vectors = cached_embeddings(embedder, texts, cache_dir) if cache_dir else embedder.embed_documents(texts)
+
+    assignment = assign_pages({key: len(ids) for key, _, _, ids in pages}, n_shards)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"embedder": embedder.name, "chunks": len(texts), "shards": []}
+    for number in range(n_shards):
+        shard_pages = [page for page in pages if assignment[page[0]] == number]
+        # write_archive sorts pages by key, which is also the order of the chunk IDs below
+        shard_pages.sort(key=lambda page: page[0])
+        chunk_ids = np.asarray([chunk_id for _, _, _, ids in shard_pages for chunk_id in ids], dtype=np.int64)
+        shard_dir = os.path.join(output_dir, shard_dir_name(number))
+        os.makedirs(shard_dir, exist_ok=True)
+        write_archive([(key, link, summary, [texts[chunk_id] for chunk_id in ids])
+                       for key, link, summary, ids in shard_pages], os.path.join(shard_dir, "chunks.pack"))
+        np.save(os.path.join(shard_dir, "vectors.npy"), vectors[chunk_ids])
+        np.save(os.path.join(shard_dir, "chunk_ids.npy"), chunk_ids)
+        manifest["shards"].append({"name": shard_dir_name(number), "chunks": len(chunk_ids)})
+    if isinstance(embedder, HashingEmbedder):
+        manifest["hashing"] = {"dimensions": embedder.dimensions, "bigrams": embedder.bigrams}
+        np.save(os.path.join(output_dir, "idf.npy"), embedder.idf)
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_query_embedder(index_dir):
+    """The embedder the shards were built with, for the coordinator's 'embed_query'."""
+    with open(os.path.join(index_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if "hashing" in manifest:
+        embedder = HashingEmbedder(**manifest["hashing"])
+        embedder.idf = np.load(os.path.join(index_dir, "idf.npy"))
+        return embedder
+    return OpenAIEmbedder()
+
+
+def _authkey(authkey=None):
+    return (authkey or os.getenv("SHARD_AUTHKEY", DEFAULT_AUTHKEY)).encode("utf-8")
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_private_authkey(host, authkey=None):
+    """Refuse to listen beyond this machine with the authkey that is published in this file."""
+    if not is_loopback(host) and not (authkey or os.getenv("SHARD_AUTHKEY")):
+        raise SystemExit(f"Refusing to serve on {host}: set SHARD_AUTHKEY to a secret shared with the service "
+                         f"(the default key is public and requests are unpickled)")
+
+
+def _set_socket_timeout(sock, seconds):
+    """Kernel-level send/receive timeout on a blocking socket (None: block forever)."""
+    seconds = max(seconds, 0.001) if seconds is not None else 0
+    value = struct.pack("ll", int(seconds), int(seconds % 1 * 1_000_000))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, value)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, value)
+
+
+def _authenticate(sock, authkey, timeout, server_side):
+    """Run the multiprocessing.connection challenge on sock within timeout seconds; returns a Connection."""
+    _set_socket_timeout(sock, timeout)
+    connection = Connection(sock.detach())
+    try:
+        if server_side:
+            deliver_challenge(connection, authkey)
+            answer_challenge(connection, authkey)
+        else:
+            answer_challenge(connection, authkey)
+            deliver_challenge(connection, authkey)
+    except BlockingIOError as e:
+        connection.close()
+        raise TimeoutError("authentication handshake timed out") from e
+    except BaseException:
+        connection.close()
+        raise
+    with socket.socket(fileno=os.dup(connection.fileno())) as view:
+        _set_socket_timeout(view, None)
+    return connection
+
+
+def connect(address, authkey, timeout=HANDSHAKE_TIMEOUT):
+    """Connect and authenticate to a worker, giving up after timeout seconds (TimeoutError)."""
+    deadline = time.monotonic() + timeout
+    try:
+        sock = socket.create_connection(address, timeout=timeout)
+    except socket.timeout as e:
+        raise TimeoutError(f"{address} did not accept the connection in time") from e
+    sock.settimeout(None)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return _authenticate(sock, authkey, deadline - time.monotonic(), server_side=False)
+
+
+class ShardWorker:
+    def __init__(self, shard_dir):
+        self.name = os.path.basename(os.path.normpath(shard_dir))
+        self.archive = ChunkArchive(os.path.join(shard_dir, "chunks.pack"))
+        self.chunk_ids = np.load(os.path.join(shard_dir, "chunk_ids.npy"))
+        self.index = ExactIndex(np.load(os.path.join(shard_dir, "vectors.npy")))
+
+    def handle(self, request):
+        if request.get("op") == "search":
+            ids, scores = self.index.search(np.asarray(request["vector"], dtype=np.float32), request["k"])
+            return {"hits": [(int(self.chunk_ids[i]), float(score), self.archive[int(i)],
+                              self.archive.link_of(int(i))) for i, score in zip(ids, scores)]}
+        if request.get("op") == "info":
+            return {"shard": self.name, "chunks": len(self.chunk_ids)}
+        return {"error": f"unknown op {request.get('op')!r}"}
+
+    def _serve_connection(self, sock, authkey):
+        try:
+            connection = _authenticate(sock, authkey, HANDSHAKE_TIMEOUT, server_side=True)
+        except Exception:
+            return  # wrong authkey, garbled challenge or a stalled client; the accept loop was never held up
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = self.handle(request)
+                except Exception as e:
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                response["id"] = request.get("id")
+                connection.send(response)
+
+
+def serve_shard(shard_dir, host="127.0.0.1", port=6100, authkey=None):
+    """
+    Serve one shard until the process is stopped.
+
+    Every client connection gets its own thread, which also runs the authentication handshake.
+    """
+    require_private_authkey(host, authkey)
+    worker = ShardWorker(shard_dir)
+    key = _authkey(authkey)
+    with socket.create_server((host, port), backlog=64) as server:
+        print(f"{worker.name}: {len(worker.chunk_ids)} chunks on {host}:{port}", flush=True)
+        while True:
+            try:
+                sock, _ = server.accept()
+            except OSError:
+                continue
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=worker._serve_connection, args=(sock, key), daemon=True).start()
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class _ShardConnections:
+    """Pool of open connections to one worker, plus when it was last found unreachable."""
+
+    def __init__(self, address, authkey, retry_after):
+        self.address = address
+        self.authkey = authkey
+        self.retry_after = retry_after
+        self.idle = queue.SimpleQueue()
+        self.down_since = None
+
+    def get(self, deadline):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self.down_since is not None and time.monotonic() - self.down_since < self.retry_after:
+            raise ConnectionRefusedError(f"{self.address} unreachable, retrying later")
+        try:
+            # Bounded by the query's deadline: a frozen worker whose kernel still accepts connections would
+            # otherwise hold this thread in the handshake forever
+            connection = connect(self.address, self.authkey, max(0.0, deadline - time.monotonic()))
+        except (OSError, EOFError):
+            self.down_since = time.monotonic()
+            raise
+        self.down_since = None
+        return connection
+
+    def put(self, connection):
+        self.idle.put(connection)
+
+
+class ScatterGatherClient:
+    def __init__(self, addresses, timeout=0.5, authkey=None, retry_after=5.0, max_workers=None):
+        self.addresses = [parse_address(a) if isinstance(a, str) else tuple(a) for a in addresses]
+        self.timeout = timeout
+        self._shards = [_ShardConnections(address, _authkey(authkey), retry_after) for address in self.addresses]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or 4 * len(self.addresses),
+                                            thread_name_prefix="scatter")
+        self._ids = iter(range(1, sys.maxsize))
+        self._lock = threading.Lock()
+
+    def _next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+    def _ask(self, shard, request, deadline):
+        connection = shard.get(deadline)
+        try:
+            connection.send(request)
+            if not connection.poll(max(0.0, deadline - time.monotonic())):
+                raise TimeoutError(f"{shard.address} did not answer in time")
+            response = connection.recv()
+        except BaseException:
+            # The connection may still receive the late reply; never reuse it
+            connection.close()
+            raise
+        shard.put(connection)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def search(self, query_vector, k, timeout=None):
+        """
+        Search every shard in parallel. Returns (hits, report).
+
+        hits are the merged top-k Hit tuples of the shards that answered in time; report lists the shards that
+        timed out or failed, so callers can tell a partial result from a complete one.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        request = {"op": "search", "vector": np.asarray(query_vector, dtype=np.float32), "k": k,
+                   "id": self._next_id()}
+        futures = {self._executor.submit(self._ask, shard, request, deadline): shard for shard in self._shards}
+        # A small grace period over the deadline for threads that are just reading a reply
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()) + 0.05)
+        hits, report = [], {"shards": len(self._shards), "answered": 0, "timed_out": [], "failed": []}
+        for future, shard in futures.items():
+            address = f"{shard.address[0]}:{shard.address[1]}"
+            if future not in done:
+                report["timed_out"].append(address)
+                continue
+            try:
+                hits.extend(Hit(*hit) for hit in future.result()["hits"])
+                report["answered"] += 1
+            except TimeoutError:
+                report["timed_out"].append(address)
+            except Exception as e:
+                report["failed"].append(f"{address} ({type(e).__name__})")
+        report["partial"] = report["answered"] < report["shards"]
+        hits.sort(key=lambda hit: (-hit.score, hit.chunk_id))
+        return hits[:k], report
+
+    def info(self):
+        return [self._ask(shard, {"op": "info", "id": self._next_id()}, time.monotonic() + 5.0)
+                for shard in self._shards]
+
+
+def start_local_workers(index_dir, base_port=6100, host="127.0.0.1", authkey=None, wait_seconds=30.0):
+    """Start one worker process per shard of index_dir on consecutive ports. Returns (processes, addresses)."""
+    require_private_authkey(host, authkey)
+    with open(os.path.join(index_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    env = dict(os.environ, SHARD_AUTHKEY=authkey or os.getenv("SHARD_AUTHKEY", DEFAULT_AUTHKEY))
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [repo_root, env.get("PYTHONPATH")]))
+    processes, addresses = [], []
+    for number, entry in enumerate(manifest["shards"]):
+        port = base_port + number
+        processes.append(subprocess.Popen([sys.executable, "-m", "retrieval.scatter_gather", "serve",
+                                           "--shard-dir", os.path.join(index_dir, entry["name"]),
+                                           "--host", host, "--port", str(port)], env=env))
+        addresses.append(f"{host}:{port}")
+
+    # Wait until every worker accepts connections
+    deadline = time.monotonic() + wait_seconds
+    for address in addresses:
+        while True:
+            try:
+                connect(parse_address(address), _authkey(env["SHARD_AUTHKEY"])).close()
+                break
+            except (OSError, EOFError):
+                if time.monotonic() > deadline:
+                    for process in processes:
+                        process.terminate()
+                    raise TimeoutError(f"Shard worker at {address} did not start")
+                time.sleep(0.1)
+    return processes, addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, serve and query scatter-gather shard workers.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Partition the corpus into N worker shards")
+    build.add_argument("--pack", default=os.path.join(DEFAULT_DATA_DIR, "chunks.pack"))
+    build.add_argument("--embedder", choices=["hashing", "openai"], default="hashing")
+    build.add_argument("--dimensions", type=int, default=1024, help="Hashing embedder dimensions")
+    build.add_argument("--shards", type=int, default=4)
+    build.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    serve = subparsers.add_parser("serve", help="Serve one shard")
+    serve.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    serve.add_argument("--shard", type=int, default=0, help="Shard number in --index-dir")
+    serve.add_argument("--shard-dir", default=None, help="Shard folder (overrides --index-dir/--shard)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=6100)
+    launch = subparsers.add_parser("launch", help="Serve every shard on this machine, one process each")
+    launch.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    launch.add_argument("--host", default="127.0.0.1")
+    launch.add_argument("--base-port", type=int, default=6100)
+    query = subparsers.add_parser("query", help="Search running workers")
+    query.add_argument("question")
+    query.add_argument("--workers", nargs="+", required=True, help="host:port of every shard worker")
+    query.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="Build folder (for the query embedder)")
+    query.add_argument("--k", type=int, default=4)
+    query.add_argument("--timeout", type=float, default=0.5, help="Seconds to wait for each shard")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from retrieval.benchmark import DEFAULT_OUTPUT_DIR, make_embedder
+        start = time.perf_counter()
+        manifest = build_worker_shards(args.pack, make_embedder(args.embedder, args.dimensions), args.index_dir,
+                                       args.shards, cache_dir=os.path.join(DEFAULT_OUTPUT_DIR, "embeddings"))
+        sizes = ", ".join(str(entry["chunks"]) for entry in manifest["shards"])
+        print(f"Wrote {args.shards} shards ({sizes} chunks) to {args.index_dir} in "
+              f"{time.perf_counter() - start:.2f}s")
+    elif args.command == "serve":
+        shard_dir = args.shard_dir or os.path.join(args.index_dir, shard_dir_name(args.shard))
+        serve_shard(shard_dir, args.host, args.port)
+    elif args.command == "launch":
+        processes, addresses = start_local_workers(args.index_dir, args.base_port, args.host)
+        print(f"Workers: {' '.join(addresses)} (Ctrl+C to stop)")
+        try:
+            for process in processes:
+                process.wait()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+    else:
+        client = ScatterGatherClient(args.workers, timeout=args.timeout)
+        start = time.perf_counter()
+        hits, report = client.search(load_query_embedder(args.index_dir).embed_query(args.question), args.k)
+        seconds = time.perf_counter() - start
+        print(f"{report['answered']}/{report['shards']} shards answered in {seconds * 1000:.1f}ms"
+              + (f"; timed out: {report['timed_out']}" if report["timed_out"] else "")
+              + (f"; failed: {report['failed']}" if report["failed"] else ""))
+        for hit in hits:
+            print(f"  {hit.score:.3f}  {hit.link}")
+
+
+if __name__ == "__main__":
+    main()
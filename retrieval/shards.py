@@ -0,0 +1,259 @@
+"""
+Partitioned Shards and Query Router
+
+Splits the chunk index into shards by doc type ('API' for APIReference links, otherwise 'text-based') and by
+service (the documentation set of the page, e.g. 'ec2' API reference, 'ipam' or 'tgw' guides), and routes each
+query to the few shards that are likely to hold its answer instead of searching every chunk.
+
+Key Components:
+- partition_of: (doc type, service) of a page from its link alone, so the offline shards and the 'doc_type' /
+  'service' metadata that '04_Embedding_Storage/01_embed.py' stores in Pinecone always agree.
+- build_shards: Offline build. Writes one '<shard>.npz' (chunk IDs and vectors) per partition, a 'shards.json'
+  manifest and, for the hashing embedder, its IDF weights so queries are embedded the same way.
+- QueryRouter: Lightweight nearest-centroid classifier. Every shard is summarized by a few k-means centroids of its
+  vectors; a query's shard probabilities are a softmax over its best centroid similarity per shard. Shards are
+  taken in order of probability until 'coverage' of the probability mass or 'max_shards' is reached. When the
+  selected shards cover less than 'min_confidence', the query falls back to all shards. 'metadata_filter' turns
+  the routed shards into a Pinecone metadata filter on the 'doc_type' / 'service' fields that
+  '04_Embedding_Storage/01_embed.py' stores, so the same routing applies to the Pinecone index (through
+  'retrieval.langchain_retriever.ScoredVectorStoreRetriever' in app.py, with SHARD_ROUTER_DIR set).
+- ShardedIndex: Searches the routed shards and merges their results; same search interface as
+  'retrieval.indexes', so 'python -m retrieval.benchmark --indexes sharded' measures it.
+
+Usage:
+- python -m retrieval.shards   (build into 06_Data/Capstone_Data/shards/<embedder>)
+- index, embedder = load_sharded_index('06_Data/Capstone_Data/shards/hashing-1024-bigrams')
+- python -m retrieval.shards --embedder openai   (router for the Pinecone index: SHARD_ROUTER_DIR=<that folder>)
+"""
+
+import argparse
+import json
+import os
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from retrieval.chunk_archive import DEFAULT_DATA_DIR, ChunkArchive
+from retrieval.embedders import HashingEmbedder, cached_embeddings, normalize_rows
+from retrieval.indexes import ExactIndex, kmeans, top_k
+
+DEFAULT_SHARD_DIR = os.path.join(DEFAULT_DATA_DIR, "shards")
+MANIFEST_NAME = "shards.json"
+IDF_NAME = "idf.npy"
+# Documentation sets whose guide name says nothing about the service; the product part of the URL is used instead
+GENERIC_GUIDES = {"userguide", "APIReference", "reference", "latest"}
+
+
+def doc_type_of(link):
+    """
+    'API' or 'text-based' from the link.
+
+    The QA dataset's link classifier also looks for 'API' in the page name, but the Pinecone metadata is labelled
+    from the link only (a chunk does not carry its page name there), so the shards must not use it either.
+    """
+    return "API" if "APIReference" in link else "text-based"
+
+
+def partition_of(link):
+    """Return (doc type, service) of a page, e.g. ('API', 'ec2') or ('text-based', 'ipam')."""
+    parts = [part for part in urlparse(link).path.split("/") if part]
+    product = parts[0] if parts else "unknown"
+    guide = parts[2] if len(parts) > 2 else ""
+    service = guide if guide and guide not in GENERIC_GUIDES else product
+    service = service.lower()
+    if service.startswith("aws"):
+        service = service[3:]
+    return doc_type_of(link), service.replace("-", "")
+
+
+def shard_name(doc_type, service):
+    return f"{'api' if doc_type == 'API' else 'text'}-{service}"
+
+
+def partition_filter(names):
+    """Pinecone metadata filter matching the chunks of the given shard names."""
+    clauses = []
+    for name in names:
+        prefix, service = name.split("-", 1)
+        clauses.append({"doc_type": "API" if prefix == "api" else "text-based", "service": service})
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def partition_chunks(links):
+    """Shard name -> array of chunk IDs, for per-chunk links."""
+    shards = {}
+    for chunk_id, link in enumerate(links):
+        shards.setdefault(shard_name(*partition_of(link)), []).append(chunk_id)
+    return {name: np.asarray(ids, dtype=np.int64) for name, ids in sorted(shards.items())}
+
+
+class Shard:
+    def __init__(self, name, chunk_ids, vectors):
+        self.name = name
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        self.index = ExactIndex(vectors)
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def search(self, query_vector, k, query_text=None):
+        ids, scores = self.index.search(query_vector, k)
+        return self.chunk_ids[ids], scores
+
+
+class QueryRouter:
+    def __init__(self, shards, centroids_per_shard=8, temperature=0.02, coverage=0.9, max_shards=3,
+                 min_confidence=0.8):
+        self.names = [shard.name for shard in shards]
+        self.temperature = temperature
+        self.coverage = coverage
+        self.max_shards = max_shards
+        self.min_confidence = min_confidence
+        centroids, owners = [], []
+        for number, shard in enumerate(shards):
+            vectors = shard.index.vectors
+            n_clusters = max(1, min(centroids_per_shard, len(vectors) // 50))
+            shard_centroids, _ = kmeans(vectors, n_clusters, iterations=5) if n_clusters > 1 \
+                else (normalize_rows(vectors.mean(axis=0, keepdims=True)), None)
+            centroids.append(shard_centroids)
+            owners += [number] * len(shard_centroids)
+        self.centroids = np.vstack(centroids).astype(np.float32)
+        self.owners = np.asarray(owners)
+
+    def probabilities(self, query_vector):
+        similarity = self.centroids @ query_vector
+        best = np.full(len(self.names), -np.inf, dtype=np.float32)
+        np.maximum.at(best, self.owners, similarity)
+        logits = (best - best.max()) / self.temperature
+        weights = np.exp(logits)
+        return weights / weights.sum()
+
+    def route(self, query_vector):
+        """Return (shard numbers to search, probability mass they cover, whether it fell back to all shards)."""
+        probabilities = self.probabilities(query_vector)
+        order = np.argsort(-probabilities)
+        selected, covered = [], 0.0
+        for number in order[:self.max_shards]:
+            selected.append(int(number))
+            covered += float(probabilities[number])
+            if covered >= self.coverage:
+                break
+        if covered < self.min_confidence:
+            return list(range(len(self.names))), covered, True
+        return selected, covered, False
+
+    def metadata_filter(self, query_vector):
+        """Pinecone metadata filter for the routed shards, or None when the query falls back to all shards."""
+        selected, _, fallback = self.route(query_vector)
+        return None if fallback else partition_filter([self.names[number] for number in selected])
+
+
+class ShardedIndex:
+    def __init__(self, shards, router=None, **router_kwargs):
+        self.shards = list(shards)
+        self.router = router or QueryRouter(self.shards, **router_kwargs)
+        self.stats = {"queries": 0, "fallbacks": 0, "shards_searched": 0, "chunks_searched": 0}
+
+    def search(self, query_vector, k, query_text=None):
+        selected, _, fallback = self.router.route(query_vector)
+        ids, scores = [], []
+        for number in selected:
+            shard_ids, shard_scores = self.shards[number].search(query_vector, k)
+            ids.append(shard_ids)
+            scores.append(shard_scores)
+            self.stats["chunks_searched"] += len(self.shards[number])
+        self.stats["queries"] += 1
+        self.stats["fallbacks"] += fallback
+        self.stats["shards_searched"] += len(selected)
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        best = top_k(scores, k)
+        return ids[best], scores[best]
+
+
+def build_shards(pack_path, embedder, output_dir, cache_dir=None):
+    """Embed the corpus and write one shard file per partition plus the manifest. Returns the manifest dict."""
+    with ChunkArchive(pack_path) as archive:
+        links, texts = [], []
+        for _, _, link, text in archive.iter_chunks():
+            links.append(link)
+            texts.append(text)
+    embedder.fit(texts)
+    vectors = cached_embeddings(embedder, texts, cache_dir) if cache_dir else embedder.embed_documents(texts)
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"embedder": embedder.name, "chunks": len(texts), "shards": []}
+    if isinstance(embedder, HashingEmbedder):
+        manifest["hashing"] = {"dimensions": embedder.dimensions, "bigrams": embedder.bigrams}
+        np.save(os.path.join(output_dir, IDF_NAME), embedder.idf)
+    for name, chunk_ids in partition_chunks(links).items():
+        file_name = f"{name}.npz"
+        np.savez(os.path.join(output_dir, file_name), chunk_ids=chunk_ids, vectors=vectors[chunk_ids])
+        manifest["shards"].append({"name": name, "file": file_name, "chunks": len(chunk_ids)})
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_shards(shard_dir):
+    """Return (list of Shard, manifest) from a directory written by build_shards."""
+    with open(os.path.join(shard_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    shards = []
+    for entry in manifest["shards"]:
+        with np.load(os.path.join(shard_dir, entry["file"])) as data:
+            shards.append(Shard(entry["name"], data["chunk_ids"], data["vectors"]))
+    return shards, manifest
+
+
+def load_query_embedder(shard_dir, manifest):
+    """The embedder the shards were built with, ready for 'embed_query'."""
+    if "hashing" in manifest:
+        embedder = HashingEmbedder(**manifest["hashing"])
+        embedder.idf = np.load(os.path.join(shard_dir, IDF_NAME))
+        return embedder
+    from retrieval.embedders import OpenAIEmbedder
+    return OpenAIEmbedder()
+
+
+def load_sharded_index(shard_dir, **router_kwargs):
+    """Return (ShardedIndex, query embedder) for a shard directory."""
+    shards, manifest = load_shards(shard_dir)
+    return ShardedIndex(shards, **router_kwargs), load_query_embedder(shard_dir, manifest)
+
+
+def load_query_router(shard_dir, **router_kwargs):
+    """
+    QueryRouter over a shard directory, for routing queries to a vector store built from the same embedder.
+
+    The Pinecone index holds text-embedding-ada-002 vectors, so its router must come from shards built with
+    '--embedder openai'; the centroids of any other embedder live in a different vector space.
+    """
+    shards, manifest = load_shards(shard_dir)
+    if "hashing" in manifest:
+        raise ValueError(f"{shard_dir} was built with {manifest['embedder']}; build the router shards with "
+                         f"'python -m retrieval.shards --embedder openai'")
+    return QueryRouter(shards, **router_kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write per-partition index shards (doc type x service).")
+    parser.add_argument("--pack", default=os.path.join(DEFAULT_DATA_DIR, "chunks.pack"))
+    parser.add_argument("--embedder", choices=["hashing", "openai"], default="hashing")
+    parser.add_argument("--dimensions", type=int, default=1024, help="Hashing embedder dimensions")
+    parser.add_argument("--output-dir", default=DEFAULT_SHARD_DIR, help="Shards go in <output-dir>/<embedder>")
+    args = parser.parse_args()
+
+    from retrieval.benchmark import DEFAULT_OUTPUT_DIR, make_embedder
+    embedder = make_embedder(args.embedder, args.dimensions)
+    start = time.perf_counter()
+    shard_dir = os.path.join(args.output_dir, embedder.name)
+    manifest = build_shards(args.pack, embedder, shard_dir, cache_dir=os.path.join(DEFAULT_OUTPUT_DIR, "embeddings"))
+    for entry in manifest["shards"]:
+        print(f"  {entry['name']:36s} {entry['chunks']:6d} chunks")
+    print(f"Wrote {len(manifest['shards'])} shards of {manifest['chunks']} chunks to {shard_dir} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Versioned Index Snapshots and Hot Swap
+
+Lets the chat service pick up a re-embedded corpus without a restart. A snapshot is a self-contained directory:
+
+    <root>/<version>/
+        snapshot.json                 version, embedder, index type, chunk count, creation time
+        chunks.pack / chunks.manifest chunk text and page links (see 'chunk_archive')
+        vectors.npy                   L2-normalized chunk vectors, in chunk ID order
+        idf.npy                       hashing embedder IDF weights (hashing snapshots only)
+
+Snapshots are written to a hidden temporary directory and renamed into place, so a half-written version is never
+visible to the service.
+
+Key Components:
+- write_snapshot: Offline build of a new version from a chunk archive and an embedder.
+- Snapshot: One loaded version: query embedder, vectors, chunk archive and the search index built over them
+  ('exact', 'hybrid' with BM25, or 'sharded' with the query router).
+- SnapshotManager: Holds the active snapshot behind a pointer. 'load' builds and warms a version on a background
+  thread while requests keep using the current one, then swaps the pointer under a lock. Each request pins the
+  snapshot it started on ('acquire'), so in-flight requests finish on the old version; the old snapshot is closed
+  when its last request releases it.
+
+Usage:
+- python -m retrieval.snapshots build [--embedder hashing --index exact --version 2024-01-31]
+- python -m retrieval.snapshots list
+- manager = SnapshotManager('06_Data/Capstone_Data/snapshots'); manager.load(wait=True); manager.search(q, k=4)
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from retrieval.chunk_archive import DEFAULT_DATA_DIR, ChunkArchive, default_manifest_path
+from retrieval.embedders import HashingEmbedder, OpenAIEmbedder, cached_embeddings
+from retrieval.indexes import BM25Index, ExactIndex, HybridIndex
+from retrieval.shards import Shard, ShardedIndex, partition_chunks
+
+DEFAULT_SNAPSHOT_ROOT = os.path.join(DEFAULT_DATA_DIR, "snapshots")
+SNAPSHOT_FILE = "snapshot.json"
+INDEX_TYPES = ["exact", "hybrid", "sharded"]
+
+Hit = namedtuple("Hit", ["chunk_id", "score", "text", "link"])
+
+
+def write_snapshot(pack_path, embedder, root=DEFAULT_SNAPSHOT_ROOT, version=None, index_type="exact",
+                   cache_dir=None):
+    """Embed the archive and publish it as '<root>/<version>'. Returns the snapshot directory."""
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(root, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"Snapshot {version} already exists in {root}")
+    with ChunkArchive(pack_path) as archive:
+        texts = [text for _, _, _, text in archive.iter_chunks()]
+    embedder.fit(texts)
+    vectors = cached_embeddings(embedder, texts, cache_dir) if cache_dir else embedder.embed_documents(texts)
+
+    staging = os.path.join(root, f".tmp-{version}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    shutil.copyfile(pack_path, os.path.join(staging, "chunks.pack"))
+    shutil.copyfile(default_manifest_path(pack_path), os.path.join(staging, "chunks.manifest"))
+    np.save(os.path.join(staging, "vectors.npy"), vectors)
+    info = {"version": version, "embedder": embedder.name, "index": index_type, "chunks": len(texts),
+            "created_at": time.time()}
+    if isinstance(embedder, HashingEmbedder):
+        info["hashing"] = {"dimensions": embedder.dimensions, "bigrams": embedder.bigrams}
+        np.save(os.path.join(staging, "idf.npy"), embedder.idf)
+    with open(os.path.join(staging, SNAPSHOT_FILE), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(staging, target)
+    return target
+
+
+def list_versions(root):
+    """Published snapshot versions in root, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if not name.startswith(".") and os.path.exists(os.path.join(root, name, SNAPSHOT_FILE)))
+
+
+class Snapshot:
+    def __init__(self, path, index_type=None):
+        self.path = path
+        with open(os.path.join(path, SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        self.version = self.info["version"]
+        if "hashing" in self.info:
+            self.embedder = HashingEmbedder(**self.info["hashing"])
+            self.embedder.idf = np.load(os.path.join(path, "idf.npy"))
+        else:
+            self.embedder = OpenAIEmbedder()
+        # Read fully into memory (not mmap) so the first queries after the swap do not page-fault
+        self.vectors = np.load(os.path.join(path, "vectors.npy"))
+        self.archive = ChunkArchive(os.path.join(path, "chunks.pack"))
+        self.index_type = index_type or self.info.get("index", "exact")
+        self.index = self._build_index()
+        # Requests currently using this snapshot, and whether the manager has swapped it out
+        self.refs = 0
+        self.retired = False
+
+    def _build_index(self):
+        if self.index_type == "exact":
+            return ExactIndex(self.vectors)
+        links, texts = [], []
+        for _, _, link, text in self.archive.iter_chunks():
+            links.append(link)
+            texts.append(text)
+        if self.index_type == "hybrid":
+            return HybridIndex(ExactIndex(self.vectors), BM25Index(texts))
+        if self.index_type == "sharded":
+            return ShardedIndex([Shard(name, ids, self.vectors[ids])
+                                 for name, ids in partition_chunks(links).items()])
+        raise ValueError(f"Unknown index type {self.index_type!r}")
+
+    def search(self, query, k=4):
+        ids, scores = self.index.search(self.embedder.embed_query(query), k, query_text=query)
+        return [Hit(int(chunk_id), float(score), self.archive[int(chunk_id)], self.archive.link_of(int(chunk_id)))
+                for chunk_id, score in zip(ids, scores)]
+
+    def close(self):
+        self.archive.close()
+        self.index = None
+        self.vectors = None
+
+
+class SnapshotManager:
+    def __init__(self, root=DEFAULT_SNAPSHOT_ROOT, index_type=None, warmup_queries=("How do I create a VPC?",)):
+        self.root = root
+        self.index_type = index_type
+        self.warmup_queries = warmup_queries
+        self._active = None
+        self._lock = threading.Lock()
+        self._loading = None
+        self._last_error = None
+        self._loaded_at = None
+        self._retired_in_use = []
+
+    def versions(self):
+        return list_versions(self.root)
+
+    def load(self, version=None, wait=False):
+        """
+        Load a version (default: the newest) on a background thread and swap it in when it is ready.
+
+        Returns False if another load is still running, True otherwise. With wait=True, blocks until the swap and
+        re-raises a load error.
+        """
+        with self._lock:
+            if self._loading is not None:
+                return False
+            versions = self.versions()
+            version = version or (versions[-1] if versions else None)
+            if version is None:
+                raise FileNotFoundError(f"No index snapshots in {self.root}")
+            self._loading = version
+        thread = threading.Thread(target=self._load_and_swap, args=(version,), name=f"snapshot-{version}",
+                                  daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+            if self._last_error and self._last_error["version"] == version:
+                raise RuntimeError(f"Loading snapshot {version} failed: {self._last_error['error']}")
+        return True
+
+    def _load_and_swap(self, version):
+        try:
+            snapshot = Snapshot(os.path.join(self.root, version), index_type=self.index_type)
+            for query in self.warmup_queries:
+                snapshot.search(query)
+        except Exception as e:
+            with self._lock:
+                self._loading = None
+                self._last_error = {"version": version, "error": f"{type(e).__name__}: {e}", "at": time.time()}
+            return
+        with self._lock:
+            old, self._active = self._active, snapshot
+            self._loading = None
+            self._last_error = None
+            self._loaded_at = time.time()
+            if old is not None:
+                old.retired = True
+                if old.refs == 0:
+                    old.close()
+                else:
+                    self._retired_in_use.append(old)
+
+    @contextmanager
+    def acquire(self):
+        """Pin the active snapshot for the duration of a request."""
+        with self._lock:
+            snapshot = self._active
+            if snapshot is None:
+                raise RuntimeError("No index snapshot loaded yet")
+            snapshot.refs += 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                snapshot.refs -= 1
+                if snapshot.retired and snapshot.refs == 0:
+                    # Last request on a swapped-out version: release its memory now
+                    self._retired_in_use.remove(snapshot)
+                    snapshot.close()
+
+    def search(self, query, k=4):
+        with self.acquire() as snapshot:
+            return snapshot.search(query, k)
+
+    def status(self):
+        with self._lock:
+            active = self._active
+            return {
+                "active_version": active.version if active else None,
+                "index": active.index_type if active else None,
+                "embedder": active.info["embedder"] if active else None,
+                "chunks": active.info["chunks"] if active else None,
+                "in_flight": active.refs if active else 0,
+                "loaded_at": self._loaded_at,
+                "loading_version": self._loading,
+                "draining_versions": [snapshot.version for snapshot in self._retired_in_use],
+                "last_error": self._last_error,
+                "available_versions": self.versions(),
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and list versioned index snapshots.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Embed the chunk archive into a new snapshot version")
+    build.add_argument("--pack", default=os.path.join(DEFAULT_DATA_DIR, "chunks.pack"))
+    build.add_argument("--embedder", choices=["hashing", "openai"], default="hashing")
+    build.add_argument("--dimensions", type=int, default=1024, help="Hashing embedder dimensions")
+    build.add_argument("--index", choices=INDEX_TYPES, default="exact", help="Index the service builds on load")
+    build.add_argument("--version", default=None, help="Version name (default: current time)")
+    build.add_argument("--root", default=DEFAULT_SNAPSHOT_ROOT)
+    listing = subparsers.add_parser("list", help="Show the published versions")
+    listing.add_argument("--root", default=DEFAULT_SNAPSHOT_ROOT)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for version in list_versions(args.root):
+            with open(os.path.join(args.root, version, SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+                info = json.load(f)
+            print(f"{version}  {info['embedder']}  {info['index']}  {info['chunks']} chunks")
+        return
+
+    from retrieval.benchmark import DEFAULT_OUTPUT_DIR, make_embedder
+    start = time.perf_counter()
+    path = write_snapshot(args.pack, make_embedder(args.embedder, args.dimensions), args.root, args.version,
+                          args.index, cache_dir=os.path.join(DEFAULT_OUTPUT_DIR, "embeddings"))
+    print(f"Wrote snapshot {path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()